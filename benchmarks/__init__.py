@@ -0,0 +1,4 @@
+"""Benchmarks for CLI commands against a synthetic Proxmox cluster.
+
+Run with 'python -m benchmarks --help' from the project root.
+"""
@@ -0,0 +1,244 @@
+"""Benchmark CLI commands against a synthetic Proxmox cluster.
+
+The database is a copy of the shipped SQLite database, and Proxmox is a local
+HTTPS server. Both are filled with a synthetic cluster.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from benchmarks.cluster import SyntheticCluster
+from benchmarks.server import MockProxmoxServer
+
+COMMANDS = [["run"], ["nodes", "list"], ["zones", "list"]]
+
+DATABASE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "virtualisation-resource-distributor.sqlite3",
+)
+
+
+def get_args() -> argparse.Namespace:
+    """Get args."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+
+    parser.add_argument("--zones", type=int, default=3)
+    parser.add_argument("--nodes", type=int, default=30)
+    parser.add_argument("--pools", type=int, default=500)
+    parser.add_argument("--members-per-pool", type=int, default=4)
+    parser.add_argument(
+        "--cluster-resources",
+        action="store_true",
+        help="Get members of all pools with one call (PROXMOX_USE_CLUSTER_RESOURCES), instead of one call per pool",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="Set PROXMOX_MAX_CONCURRENCY",
+    )
+    parser.add_argument(
+        "--connection-pool-size",
+        type=int,
+        help="Set PROXMOX_CONNECTION_POOL_SIZE",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Milliseconds that the Proxmox server waits before responding, like a remote cluster",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Report best wall time of this many runs",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Output JSON instead of table"
+    )
+
+    return parser.parse_args()
+
+
+def call_main(main: Callable[[], None], command: List[str]) -> None:
+    """Call CLI main with command, discarding output and exit code."""
+    sys.argv = ["virtualisation-resource-distributor", *command]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            main()
+        except SystemExit:
+            pass
+
+
+def benchmark(
+    cluster: SyntheticCluster, server: MockProxmoxServer, repeat: int
+) -> List[Dict[str, Any]]:
+    """Run commands, and get metrics per command.
+
+    The package is imported here, as settings are read on import.
+    """
+    from sqlalchemy import event
+
+    from virtualisation_resource_distributor import CLI, crud
+    from virtualisation_resource_distributor.database import (
+        DatabaseSession,
+        engine,
+        read_only_engine,
+    )
+    from virtualisation_resource_distributor.schemas import (
+        DatabaseNodeCreate,
+        DatabaseZoneCreate,
+    )
+
+    # Fill database
+
+    database_session = DatabaseSession()
+
+    zones_ids = {
+        zone.name: zone.id
+        for zone in crud.database_zone.create_multiple(
+            database_session,
+            objs_in=[
+                DatabaseZoneCreate(name=name) for name in cluster.zones_names
+            ],
+        )
+    }
+
+    crud.database_node.create_multiple(
+        database_session,
+        objs_in=[
+            DatabaseNodeCreate(name=node_name, zone_id=zones_ids[zone_name])
+            for node_name, zone_name in cluster.nodes_zones_names.items()
+        ],
+    )
+
+    database_session.close()
+
+    # Count queries
+
+    queries_counter = {"count": 0}
+
+    def count_query(*args: Any) -> None:
+        queries_counter["count"] += 1
+
+    for counted_engine in (engine, read_only_engine):
+        event.listen(counted_engine, "before_cursor_execute", count_query)
+
+    results = []
+
+    for command in COMMANDS:
+        wall_times = []
+
+        for _ in range(repeat):
+            server.reset_counters()
+            queries_counter["count"] = 0
+
+            start_time = time.perf_counter()
+
+            call_main(CLI.main, command)
+
+            wall_times.append(time.perf_counter() - start_time)
+
+        # Counters are those of the last run; runs are identical
+
+        counters = server.reset_counters()
+        queries_count = queries_counter["count"]
+
+        # Tracing slows down, so measure memory in a separate run
+
+        tracemalloc.start()
+
+        call_main(CLI.main, command)
+
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.append(
+            {
+                "command": " ".join(command),
+                "wall_time": min(wall_times),
+                "api_calls_count": counters["requests"],
+                "api_connections_count": counters["connections"],
+                "sql_queries_count": queries_count,
+                "peak_memory": peak_memory,
+            }
+        )
+
+    return results
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    """Print results as table."""
+    print(
+        f"{'command':<12} {'wall time (ms)':>15} {'API calls':>10} "
+        f"{'API conns':>10} {'SQL queries':>12} {'peak mem (KiB)':>15}"
+    )
+
+    for result in results:
+        print(
+            f"{result['command']:<12} {result['wall_time'] * 1000:>15.1f} "
+            f"{result['api_calls_count']:>10} "
+            f"{result['api_connections_count']:>10} "
+            f"{result['sql_queries_count']:>12} "
+            f"{result['peak_memory'] / 1024:>15.1f}"
+        )
+
+
+def main() -> None:
+    """Generate cluster, serve it, and benchmark commands."""
+    args = get_args()
+
+    cluster = SyntheticCluster(
+        zones_count=args.zones,
+        nodes_count=args.nodes,
+        pools_count=args.pools,
+        members_per_pool_count=args.members_per_pool,
+    )
+
+    with tempfile.TemporaryDirectory() as directory, MockProxmoxServer(
+        cluster, latency=args.latency / 1000
+    ) as server:
+        database_path = os.path.join(directory, "database.sqlite3")
+
+        shutil.copyfile(DATABASE_PATH, database_path)
+
+        os.environ.update(
+            {
+                "DATABASE_PATH": database_path,
+                "PROXMOX_HOST": server.host,
+                "PROXMOX_VERIFY_SSL": "false",
+                "PROXMOX_USE_CLUSTER_RESOURCES": str(args.cluster_resources),
+                "DAEMON_RESULT_PATH": os.path.join(directory, "result.json"),
+            }
+        )
+
+        # Unset settings keep their defaults
+
+        if args.max_concurrency is not None:
+            os.environ["PROXMOX_MAX_CONCURRENCY"] = str(args.max_concurrency)
+
+        if args.connection_pool_size is not None:
+            os.environ["PROXMOX_CONNECTION_POOL_SIZE"] = str(
+                args.connection_pool_size
+            )
+
+        results = benchmark(cluster, server, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Synthetic cluster generator."""
+
+import random
+from typing import Any, Dict, List
+
+
+class SyntheticCluster:
+    """Zones, nodes, and pools with members, as Proxmox and the database see them.
+
+    Nodes are spread over zones round-robin. Members are placed on random
+    nodes, so some pools have members to migrate. The seed makes clusters
+    reproducible.
+    """
+
+    def __init__(
+        self,
+        *,
+        zones_count: int,
+        nodes_count: int,
+        pools_count: int,
+        members_per_pool_count: int,
+        seed: int = 0,
+    ) -> None:
+        """Generate cluster."""
+        randomiser = random.Random(seed)
+
+        self.zones_names = [f"zone{i}" for i in range(zones_count)]
+        self.nodes_zones_names = {
+            f"node{i}": self.zones_names[i % zones_count]
+            for i in range(nodes_count)
+        }
+        self.pools_names = [f"pool{i}" for i in range(pools_count)]
+        self.members: List[Dict[str, Any]] = []
+
+        nodes_names = list(self.nodes_zones_names)
+        vm_id = 100
+
+        for pool_name in self.pools_names:
+            for _ in range(members_per_pool_count):
+                self.members.append(
+                    {
+                        "id": f"qemu/{vm_id}",
+                        "maxcpu": 4,
+                        "maxdisk": 34359738368,
+                        "maxmem": 8589934592,
+                        "name": f"vm{vm_id}.example.com",
+                        "node": randomiser.choice(nodes_names),
+                        "pool": pool_name,
+                        "status": (
+                            "running"
+                            if randomiser.random() < 0.9
+                            else "stopped"
+                        ),
+                        "template": 0,
+                        "type": "qemu",
+                        "vmid": vm_id,
+                    }
+                )
+
+                vm_id += 1
+
+    def get_pools(self) -> List[Dict[str, Any]]:
+        """Get response data of '/pools'."""
+        return [{"poolid": pool_name} for pool_name in self.pools_names]
+
+    def get_pool(self, pool_name: str) -> Dict[str, Any]:
+        """Get response data of '/pools/{poolid}'."""
+        return {
+            "members": [
+                member
+                for member in self.members
+                if member["pool"] == pool_name
+            ]
+        }
+
+    def get_cluster_resources(self) -> List[Dict[str, Any]]:
+        """Get response data of '/cluster/resources?type=vm'."""
+        return self.members
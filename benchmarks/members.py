@@ -0,0 +1,163 @@
+"""Benchmark the cost per member of evaluating pools, without I/O.
+
+Members are added to a cluster snapshot directly, so only representing and
+evaluating members is measured.
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from benchmarks.cluster import SyntheticCluster
+
+
+def get_args() -> argparse.Namespace:
+    """Get args."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.members")
+
+    parser.add_argument("--zones", type=int, default=3)
+    parser.add_argument("--nodes", type=int, default=30)
+    parser.add_argument("--members", type=int, default=100000)
+    parser.add_argument("--members-per-pool", type=int, default=4)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Report best time of this many runs",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="Output JSON instead of table"
+    )
+
+    return parser.parse_args()
+
+
+def get_best_time(function: Callable[[], Any], repeat: int) -> float:
+    """Call function, and get the best wall time of all calls."""
+    times = []
+
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+
+        function()
+
+        times.append(time.perf_counter() - start_time)
+
+    return min(times)
+
+
+def benchmark(cluster: SyntheticCluster, repeat: int) -> List[Dict[str, Any]]:
+    """Time operations over all pools, and get time per member per operation.
+
+    'get_spreads' uses NumPy when the 'numpy' extra is installed.
+
+    The package is imported here, as settings are read on import.
+    """
+    from virtualisation_resource_distributor import crud
+    from virtualisation_resource_distributor.proxmox import ClusterSnapshot
+    from virtualisation_resource_distributor.schemas import (
+        DatabaseTopology,
+        DatabaseZone,
+        ProxmoxMemberWeightEnum,
+    )
+
+    cluster_snapshot = ClusterSnapshot()
+    cluster_snapshot.add_pools(cluster.get_pools())
+    cluster_snapshot.add_members(cluster.get_cluster_resources())
+
+    now = datetime.utcnow()
+    zones = {
+        zone_name: DatabaseZone(
+            id=index, name=zone_name, created_at=now, updated_at=now
+        )
+        for index, zone_name in enumerate(cluster.zones_names, start=1)
+    }
+    database_topology = DatabaseTopology(
+        zones=list(zones.values()),
+        nodes_zones={
+            node_name: zones[zone_name]
+            for node_name, zone_name in cluster.nodes_zones_names.items()
+        },
+    )
+
+    pools_names = cluster.pools_names
+    operations: Dict[str, Callable[[], Any]] = {
+        "get_by_pool": lambda: [
+            crud.proxmox_member.get_by_pool(cluster_snapshot, pool_name)
+            for pool_name in pools_names
+        ],
+        "get_models_by_pool": lambda: [
+            crud.proxmox_member.get_models_by_pool(cluster_snapshot, pool_name)
+            for pool_name in pools_names
+        ],
+        "get_spread": lambda: [
+            crud.proxmox_pool.get_spread(
+                database_topology, cluster_snapshot, pool_name
+            )
+            for pool_name in pools_names
+        ],
+        "get_spreads": lambda: crud.proxmox_pool.get_spreads(
+            database_topology, cluster_snapshot, pools_names
+        ),
+        "get_weighted_spread": lambda: [
+            crud.proxmox_pool.get_weighted_spread(
+                database_topology,
+                cluster_snapshot,
+                pool_name,
+                ProxmoxMemberWeightEnum.MAXMEM,
+            )
+            for pool_name in pools_names
+        ],
+    }
+
+    results = []
+
+    for operation_name, operation in operations.items():
+        total_time = get_best_time(operation, repeat)
+
+        results.append(
+            {
+                "operation": operation_name,
+                "members_count": len(cluster.members),
+                "total_time": total_time,
+                "time_per_member": total_time / len(cluster.members),
+            }
+        )
+
+    return results
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    """Print results as table."""
+    print(f"{'operation':<20} {'total (ms)':>11} {'per member (us)':>16}")
+
+    for result in results:
+        print(
+            f"{result['operation']:<20} {result['total_time'] * 1000:>11.1f} "
+            f"{result['time_per_member'] * 1000000:>16.2f}"
+        )
+
+
+def main() -> None:
+    """Generate cluster, and benchmark operations."""
+    args = get_args()
+
+    cluster = SyntheticCluster(
+        zones_count=args.zones,
+        nodes_count=args.nodes,
+        pools_count=max(1, args.members // args.members_per_pool),
+        members_per_pool_count=args.members_per_pool,
+    )
+
+    results = benchmark(cluster, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+
+if __name__ == "__main__":
+    main()
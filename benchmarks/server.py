@@ -0,0 +1,175 @@
+"""Local mock Proxmox server."""
+
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import TracebackType
+from typing import Any, Dict, Optional, Tuple, Type
+from urllib.parse import unquote, urlsplit
+
+from benchmarks.cluster import SyntheticCluster
+
+API_PREFIX = "/api2/json/"
+
+
+class MockProxmoxHandler(BaseHTTPRequestHandler):
+    """Serve synthetic cluster like the Proxmox API does."""
+
+    protocol_version = "HTTP/1.1"
+
+    server: "MockProxmoxServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Don't log requests."""
+        pass
+
+    def setup(self) -> None:
+        """Count connection."""
+        super().setup()
+
+        self.server.count("connections")
+
+    def _respond(self, status: int, data: Any) -> None:
+        """Send JSON response, after latency of server."""
+        time.sleep(self.server.latency)
+
+        body = json.dumps({"data": data}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        """Log in."""
+        self.server.count("requests")
+
+        self.rfile.read(int(self.headers["Content-Length"]))
+
+        self._respond(
+            200,
+            {
+                "ticket": "ticket",
+                "CSRFPreventionToken": "CSRFPreventionToken",
+                "username": "benchmark@pve",
+            },
+        )
+
+    def do_GET(self) -> None:
+        """Get pools, pool or cluster resources."""
+        self.server.count("requests")
+
+        path = unquote(urlsplit(self.path).path).replace(API_PREFIX, "", 1)
+        cluster = self.server.cluster
+
+        if path == "pools":
+            self._respond(200, cluster.get_pools())
+        elif path.startswith("pools/"):
+            self._respond(200, cluster.get_pool(path.replace("pools/", "", 1)))
+        elif path == "cluster/resources":
+            self._respond(200, cluster.get_cluster_resources())
+        else:
+            self._respond(404, None)
+
+
+class MockProxmoxServer(ThreadingHTTPServer):
+    """HTTPS server in a thread, that counts connections and requests.
+
+    A self-signed certificate is generated with 'openssl'. Use as a context
+    manager.
+
+    Every response is delayed by latency (in seconds), so that concurrent
+    calls pay off like they do against a remote cluster.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, cluster: SyntheticCluster, latency: float = 0) -> None:
+        """Set attributes."""
+        super().__init__(("127.0.0.1", 0), MockProxmoxHandler)
+
+        self.cluster = cluster
+        self.latency = latency
+        self.counters: Dict[str, int] = {"connections": 0, "requests": 0}
+
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self.serve_forever, args=(0.01,), daemon=True
+        )
+
+    @property
+    def host(self) -> str:
+        """Get host, including port, for PROXMOX_HOST."""
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    def count(self, name: str) -> None:
+        """Increase counter."""
+        with self._lock:
+            self.counters[name] += 1
+
+    def reset_counters(self) -> Dict[str, int]:
+        """Reset counters, and return their previous values."""
+        with self._lock:
+            counters = self.counters
+            self.counters = {"connections": 0, "requests": 0}
+
+        return counters
+
+    def __enter__(self) -> "MockProxmoxServer":
+        """Enable TLS, and start serving."""
+        with tempfile.TemporaryDirectory() as directory:
+            certificate_path, key_path = generate_certificate(directory)
+
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certificate_path, key_path)
+
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+
+        self._thread.start()
+
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Stop serving."""
+        self.shutdown()
+        self.server_close()
+
+
+def generate_certificate(directory: str) -> Tuple[str, str]:
+    """Generate self-signed certificate, and return paths to certificate and key."""
+    certificate_path = os.path.join(directory, "certificate.pem")
+    key_path = os.path.join(directory, "key.pem")
+
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=127.0.0.1",
+            "-keyout",
+            key_path,
+            "-out",
+            certificate_path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+    return certificate_path, key_path
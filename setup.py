@@ -11,7 +11,7 @@ setup(
     description="Virtualisation Resource Distributor ensures that virtual machines and resources in pools are spread as much as possible.",
     long_description=long_description,
     long_description_content_type="text/markdown",
-    python_requires=">=3.6",
+    python_requires=">=3.7",
     author="William Edwards",
     author_email="support@cyberfusion.nl",
     url="https://github.com/CyberfusionIO/Virtualisation-Resource-Distributor",
@@ -36,6 +36,11 @@ setup(
         "schema==0.7.2",
         "requests==2.28.1",
     ],
+    extras_require={
+        "async": ["httpx==0.23.3"],
+        "yaml": ["PyYAML==6.0"],
+        "numpy": ["numpy==1.24.4"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -1,22 +1,32 @@
 import os
 import shutil
-from typing import Generator, List
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Generator, Iterator, List
 
 import pytest
 import requests_mock
 from proxmoxer import ProxmoxAPI
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
 from requests_mock.mocker import Mocker
+from sqlalchemy import event
 
 from virtualisation_resource_distributor.config import settings
 from virtualisation_resource_distributor.crud import (
     database_node,
+    database_topology,
     database_zone,
 )
-from virtualisation_resource_distributor.database import DatabaseSession
-from virtualisation_resource_distributor.proxmox import API
+from virtualisation_resource_distributor.database import (
+    DatabaseSession,
+    engine,
+    read_only_engine,
+)
+from virtualisation_resource_distributor.profiling import Profiler
+from virtualisation_resource_distributor.proxmox import API, ClusterSnapshot
 from virtualisation_resource_distributor.schemas import (
     DatabaseNode,
     DatabaseNodeCreate,
+    DatabaseTopology,
     DatabaseZone,
     DatabaseZoneCreate,
     ProxmoxMember,
@@ -26,7 +36,7 @@ from virtualisation_resource_distributor.schemas import (
 
 
 @pytest.fixture(autouse=True)
-def database() -> Generator[None, None, None]:
+def database(mocker: MockerFixture) -> Generator[None, None, None]:
     """Create database and override database path in settings."""
     shutil.copyfile(
         "virtualisation-resource-distributor.sqlite3",
@@ -35,10 +45,20 @@ def database() -> Generator[None, None, None]:
         ],  # Must be run from project root, where source file is located
     )
 
+    # The topology cache can't detect that the database was replaced
+
+    mocker.patch.object(database_topology, "_cache", None)
+
     yield
 
     os.unlink(os.environ["DATABASE_PATH"])
 
+    # Don't apply the write-ahead log of this test to the next test's database
+
+    for suffix in ["-wal", "-shm"]:
+        if os.path.exists(os.environ["DATABASE_PATH"] + suffix):
+            os.unlink(os.environ["DATABASE_PATH"] + suffix)
+
 
 @pytest.fixture
 def database_session() -> DatabaseSession:
@@ -50,6 +70,48 @@ def proxmox_connection() -> ProxmoxAPI:
     return API()
 
 
+@pytest.fixture
+def record_queries() -> Callable[[], ContextManager[List[str]]]:
+    """Get context manager that records SQL statements, of both engines."""
+
+    @contextmanager
+    def record_queries() -> Iterator[List[str]]:
+        statements: List[str] = []
+
+        def before_cursor_execute(*args: Any) -> None:
+            statements.append(args[2])
+
+        for recorded_engine in (engine, read_only_engine):
+            event.listen(
+                recorded_engine, "before_cursor_execute", before_cursor_execute
+            )
+
+        try:
+            yield statements
+        finally:
+            for recorded_engine in (engine, read_only_engine):
+                event.remove(
+                    recorded_engine,
+                    "before_cursor_execute",
+                    before_cursor_execute,
+                )
+
+    return record_queries
+
+
+@pytest.fixture
+def profiler(mocker: MockerFixture) -> Profiler:
+    """Replace shared profiler, so recordings don't leak between tests."""
+    profiler = Profiler()
+
+    mocker.patch("virtualisation_resource_distributor.CLI.profiler", profiler)
+    mocker.patch(
+        "virtualisation_resource_distributor.proxmox.profiler", profiler
+    )
+
+    return profiler
+
+
 @pytest.fixture
 def database_zones(database_session: DatabaseSession) -> List[DatabaseZone]:
     results = []
@@ -107,6 +169,13 @@ def database_nodes(
     return results
 
 
+@pytest.fixture(name="database_topology")
+def database_topology_fixture(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> DatabaseTopology:
+    return database_topology.get(database_session)
+
+
 @pytest.fixture(autouse=True)
 def proxmox_api_mock(requests_mock: Mocker) -> str:
     """Mock Proxmox API by using requests_mock (requests is used by the https backend)."""
@@ -153,6 +222,10 @@ def proxmox_pools(
         f"{proxmox_api_mock}/pools/critical",
         json={"data": {"members": []}},
     )
+    requests_mock.get(
+        f"{proxmox_api_mock}/cluster/resources",
+        json={"data": []},
+    )
 
     return results
 
@@ -177,6 +250,9 @@ def proxmox_members(
         vm_id=100,
         pool_name=proxmox_pools[0].name,
         status=ProxmoxMemberStatusEnum.RUNNING,
+        maxmem=17179869184,
+        maxcpu=16,
+        maxdisk=37580963840,
     )
     results.append(
         member,
@@ -188,14 +264,15 @@ def proxmox_members(
             "diskread": 562901818520,
             "diskwrite": 891997212672,
             "id": f"qemu/{member.vm_id}",
-            "maxcpu": 16,
-            "maxdisk": 37580963840,
-            "maxmem": 17179869184,
+            "maxcpu": member.maxcpu,
+            "maxdisk": member.maxdisk,
+            "maxmem": member.maxmem,
             "mem": 14203925388,
             "name": member.name,
             "netin": 198024469241,
             "netout": 278348107239,
             "node": member.node_name,
+            "pool": member.pool_name,
             "status": "running",
             "template": 0,
             "type": "qemu",
@@ -210,6 +287,9 @@ def proxmox_members(
         vm_id=101,
         pool_name=proxmox_pools[0].name,
         status=ProxmoxMemberStatusEnum.RUNNING,
+        maxmem=17179869184,
+        maxcpu=16,
+        maxdisk=37580963840,
     )
     results.append(
         member,
@@ -221,14 +301,15 @@ def proxmox_members(
             "diskread": 562901818520,
             "diskwrite": 891997212672,
             "id": f"qemu/{member.vm_id}",
-            "maxcpu": 16,
-            "maxdisk": 37580963840,
-            "maxmem": 17179869184,
+            "maxcpu": member.maxcpu,
+            "maxdisk": member.maxdisk,
+            "maxmem": member.maxmem,
             "mem": 14203925388,
             "name": member.name,
             "netin": 198024469241,
             "netout": 278348107239,
             "node": member.node_name,
+            "pool": member.pool_name,
             "status": "running",
             "template": 0,
             "type": "qemu",
@@ -237,11 +318,6 @@ def proxmox_members(
         }
     )
 
-    requests_mock.get(
-        f"{proxmox_api_mock}/pools/{proxmox_pools[0].name}",
-        json={"data": {"members": pool0_data}},
-    )
-
     # Pool 1
 
     member = ProxmoxMember(
@@ -250,6 +326,9 @@ def proxmox_members(
         vm_id=102,
         pool_name=proxmox_pools[1].name,
         status=ProxmoxMemberStatusEnum.RUNNING,
+        maxmem=17179869184,
+        maxcpu=16,
+        maxdisk=37580963840,
     )
     results.append(
         member,
@@ -261,14 +340,15 @@ def proxmox_members(
             "diskread": 562901818520,
             "diskwrite": 891997212672,
             "id": f"qemu/{member.vm_id}",
-            "maxcpu": 16,
-            "maxdisk": 37580963840,
-            "maxmem": 17179869184,
+            "maxcpu": member.maxcpu,
+            "maxdisk": member.maxdisk,
+            "maxmem": member.maxmem,
             "mem": 14203925388,
             "name": member.name,
             "netin": 198024469241,
             "netout": 278348107239,
             "node": member.node_name,
+            "pool": member.pool_name,
             "status": "running",
             "template": 0,
             "type": "qemu",
@@ -283,6 +363,9 @@ def proxmox_members(
         vm_id=103,
         pool_name=proxmox_pools[1].name,
         status=ProxmoxMemberStatusEnum.STOPPED,
+        maxmem=17179869184,
+        maxcpu=16,
+        maxdisk=37580963840,
     )
     results.append(
         member,
@@ -294,14 +377,15 @@ def proxmox_members(
             "diskread": 562901818520,
             "diskwrite": 891997212672,
             "id": f"qemu/{member.vm_id}",
-            "maxcpu": 16,
-            "maxdisk": 37580963840,
-            "maxmem": 17179869184,
+            "maxcpu": member.maxcpu,
+            "maxdisk": member.maxdisk,
+            "maxmem": member.maxmem,
             "mem": 14203925388,
             "name": member.name,
             "netin": 198024469241,
             "netout": 278348107239,
             "node": member.node_name,
+            "pool": member.pool_name,
             "status": "stopped",
             "template": 0,
             "type": "qemu",
@@ -310,9 +394,25 @@ def proxmox_members(
         }
     )
 
+    requests_mock.get(
+        f"{proxmox_api_mock}/pools/{proxmox_pools[0].name}",
+        json={"data": {"members": pool0_data}},
+    )
     requests_mock.get(
         f"{proxmox_api_mock}/pools/{proxmox_pools[1].name}",
         json={"data": {"members": pool1_data}},
     )
+    requests_mock.get(
+        f"{proxmox_api_mock}/cluster/resources",
+        json={"data": pool0_data + pool1_data},
+    )
 
     return results
+
+
+@pytest.fixture
+def cluster_snapshot(
+    proxmox_connection: ProxmoxAPI,
+    proxmox_members: List[ProxmoxMember],
+) -> ClusterSnapshot:
+    return ClusterSnapshot(proxmox_connection)
@@ -1,20 +1,29 @@
-from typing import List
+import csv
+import io
+import json
+from pathlib import Path
+from typing import Callable, ContextManager, List
 
 import docopt
 import pytest
 from _pytest.capture import CaptureFixture
 from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+from requests_mock.mocker import Mocker
 
 from virtualisation_resource_distributor import CLI
+from virtualisation_resource_distributor.config import settings
 from virtualisation_resource_distributor.crud import (
     database_node,
     database_zone,
 )
 from virtualisation_resource_distributor.database import DatabaseSession
+from virtualisation_resource_distributor.profiling import Profiler
 from virtualisation_resource_distributor.schemas import (
     DatabaseNode,
+    DatabaseNodeCreate,
     DatabaseZone,
     ProxmoxMember,
+    ProxmoxMemberWeightEnum,
     ProxmoxPool,
 )
 
@@ -45,6 +54,95 @@ def test_cli_run_has_no_members_to_migrate_without_exclude_pools(
     assert capsys.readouterr().out == ""
 
 
+def test_cli_run_writes_metrics(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    path = tmp_path / "metrics.prom"
+
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["run"]),
+    )
+    mocker.patch.object(settings, "METRICS_PATH", str(path))
+
+    with pytest.raises(SystemExit):
+        CLI.main()
+
+    lines = path.read_text().splitlines()
+
+    assert (
+        f'virtualisation_resource_distributor_pool_members{{pool="{proxmox_pools[0].name}"}} 2'
+        in lines
+    )
+    assert (
+        "virtualisation_resource_distributor_run_duration_seconds_count"
+        in [line.split(" ")[0] for line in lines]
+    )
+
+
+def test_cli_run_with_unknown_node(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    database_session: DatabaseSession,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+    database_nodes: List[DatabaseNode],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["run"]),
+    )
+
+    database_node.delete(database_session, id=database_nodes[0].id)
+
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        CLI.main()
+
+    assert pytest_wrapped_e.value.code == 0
+
+    assert capsys.readouterr().err == (
+        "Node 'proxmox01' is unknown, so its members are left out. Add it with 'nodes create' or 'nodes sync'\n"
+    )
+
+
+def test_cli_run_with_profile_json(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    profiler: Profiler,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(
+            CLI.__doc__, ["run", "--profile", "--profile-format=json"]
+        ),
+    )
+
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        CLI.main()
+
+    assert pytest_wrapped_e.value.code == 78
+
+    captured = capsys.readouterr()
+    summary = json.loads(captured.err)
+
+    assert captured.out.startswith("Pool ")
+    assert list(summary["phases"]) == [
+        "pool listing",
+        "member fetch",
+        "zone resolution",
+        "decision",
+    ]
+    # '/pools', then one call per pool
+
+    assert summary["proxmox_requests"]["count"] == 3
+    assert summary["sql_queries"]["count"] == 1
+
+
 def test_cli_run_has_members_to_migrate_without_exclude_pools(
     mocker: MockerFixture,
     capsys: CaptureFixture,
@@ -61,9 +159,93 @@ def test_cli_run_has_members_to_migrate_without_exclude_pools(
 
     assert pytest_wrapped_e.value.code == 78
 
+    assert capsys.readouterr().out.splitlines() == [
+        f"Pool '{proxmox_pools[0].name}' has members to migrate",
+        f"Pool '{proxmox_pools[0].name}' has members to migrate between nodes",
+    ]
+
+
+def test_cli_run_has_members_to_migrate_without_cluster_resources(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["run"]),
+    )
+
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", False)
+    mocker.patch.object(settings, "PROXMOX_MAX_CONCURRENCY", 2)
+
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        CLI.main()
+
+    assert pytest_wrapped_e.value.code == 78
+
+    assert capsys.readouterr().out.splitlines() == [
+        f"Pool '{proxmox_pools[0].name}' has members to migrate",
+        f"Pool '{proxmox_pools[0].name}' has members to migrate between nodes",
+    ]
+
+
+def test_cli_run_has_members_to_migrate_between_nodes(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    database_session: DatabaseSession,
+    database_zones: List[DatabaseZone],
+    database_nodes: List[DatabaseNode],
+    proxmox_pools: List[ProxmoxPool],
+):
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", True)
+
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["run"]),
+    )
+
+    database_node.create(
+        database_session,
+        obj_in=DatabaseNodeCreate(
+            name="proxmox04", zone_id=database_zones[0].id
+        ),
+    )
+
+    # All zones are used, but 'proxmox04' is not
+
+    requests_mock.get(
+        f"{proxmox_api_mock}/cluster/resources",
+        json={
+            "data": [
+                {
+                    "maxcpu": 4,
+                    "maxdisk": 34359738368,
+                    "maxmem": 8589934592,
+                    "name": f"vm0{vm_id}.example.com",
+                    "node": node_name,
+                    "pool": proxmox_pools[0].name,
+                    "status": "running",
+                    "type": "qemu",
+                    "vmid": vm_id,
+                }
+                for vm_id, node_name in enumerate(
+                    ["proxmox01", "proxmox01", "proxmox02", "proxmox03"]
+                )
+            ]
+        },
+    )
+
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        CLI.main()
+
+    assert pytest_wrapped_e.value.code == 78
+
     assert (
         capsys.readouterr().out
-        == f"Pool '{proxmox_pools[0].name}' has members to migrate\n"
+        == f"Pool '{proxmox_pools[0].name}' has members to migrate between nodes\n"
     )
 
 
@@ -78,7 +260,7 @@ def test_cli_run_has_members_to_migrate_with_exclude_pools(
     )
 
     mocker.patch(
-        "virtualisation_resource_distributor.CLI.get_exclude_pools_names",
+        "virtualisation_resource_distributor.config.get_exclude_pools_names",
         return_value=[proxmox_pools[0].name],
     )
 
@@ -93,6 +275,207 @@ def test_cli_run_has_members_to_migrate_with_exclude_pools(
     )
 
 
+def test_cli_run_format_ndjson(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["run", "--format=ndjson"]),
+    )
+
+    mocker.patch(
+        "virtualisation_resource_distributor.config.get_exclude_pools_names",
+        return_value=[proxmox_pools[1].name],
+    )
+
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        CLI.main()
+
+    assert pytest_wrapped_e.value.code == 78
+
+    records = [
+        json.loads(line) for line in capsys.readouterr().out.splitlines()
+    ]
+
+    assert records[0]["name"] == proxmox_pools[0].name
+    assert records[0]["excluded"] is False
+    assert records[0]["members_count"] == 2
+    assert records[0]["has_members_to_migrate"] is True
+    assert records[1] == {"name": proxmox_pools[1].name, "excluded": True}
+
+
+def test_cli_run_format_csv(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["run", "--format=csv"]),
+    )
+
+    with pytest.raises(SystemExit):
+        CLI.main()
+
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+
+    assert [row["name"] for row in rows] == [
+        proxmox_pools[0].name,
+        proxmox_pools[1].name,
+    ]
+    assert json.loads(rows[0]["zones_members_counts"]) == {"BIT-1": 2}
+    assert rows[0]["excluded"] == "False"
+
+
+def test_cli_run_spread_weight(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch.object(
+        settings, "SPREAD_WEIGHT", ProxmoxMemberWeightEnum.MAXMEM
+    )
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["run", "--format=csv"]),
+    )
+
+    with pytest.raises(SystemExit) as pytest_wrapped_e:
+        CLI.main()
+
+    assert pytest_wrapped_e.value.code == 78
+
+    rows = list(csv.DictReader(io.StringIO(capsys.readouterr().out)))
+
+    assert rows[0]["weight"] == "maxmem"
+    assert json.loads(rows[0]["zones_members_weights"]) == {
+        "BIT-1": proxmox_members[0].maxmem + proxmox_members[1].maxmem
+    }
+    assert rows[0]["has_members_to_migrate"] == "True"
+
+
+# Plan
+
+
+def test_cli_plan(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["plan"]),
+    )
+
+    CLI.main()
+
+    assert json.loads(capsys.readouterr().out) == [
+        {
+            "vm_id": proxmox_members[1].vm_id,
+            "name": proxmox_members[1].name,
+            "pool_name": proxmox_pools[0].name,
+            "source_node_name": "proxmox01",
+            "source_zone_name": "BIT-1",
+            "destination_node_name": "proxmox02",
+            "destination_zone_name": "BIT-2A",
+        }
+    ]
+
+
+def test_cli_plan_with_exclude_pools(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["plan"]),
+    )
+    mocker.patch(
+        "virtualisation_resource_distributor.config.get_exclude_pools_names",
+        return_value=[proxmox_pools[0].name],
+    )
+
+    CLI.main()
+
+    assert json.loads(capsys.readouterr().out) == []
+
+
+def test_cli_plan_with_profile(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    profiler: Profiler,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["plan", "--profile"]),
+    )
+
+    CLI.main()
+
+    captured = capsys.readouterr()
+
+    assert len(json.loads(captured.out)) == 1
+    assert captured.err.splitlines()[0].startswith("Phase")
+    assert "Proxmox API requests" in captured.err
+
+
+# Daemon
+
+
+def test_cli_daemon(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["daemon"]),
+    )
+
+    run = mocker.patch(
+        "virtualisation_resource_distributor.daemon.Daemon.run",
+        return_value=None,
+    )
+
+    CLI.main()
+
+    run.assert_called_once_with(settings.DAEMON_INTERVAL)
+
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize(
+    "command, queries_count", [("nodes", 1), ("zones", 2)]
+)
+def test_cli_list_query_count(
+    mocker: MockerFixture,
+    database_nodes: List[DatabaseNode],
+    command: str,
+    queries_count: int,
+    record_queries: Callable[[], ContextManager[List[str]]],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, [command, "list"]),
+    )
+
+    with record_queries() as statements:
+        CLI.main()
+
+    # Doesn't depend on the amount of zones and nodes
+
+    assert len(statements) == queries_count
+
+
 def test_cli_nodes_delete(
     mocker: MockerFixture,
     capsys: CaptureFixture,
@@ -143,6 +526,52 @@ def test_cli_nodes_list(
     ]
 
 
+@pytest.mark.parametrize("format_", ["json", "ndjson"])
+def test_cli_nodes_list_format_json(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    database_nodes: List[DatabaseNode],
+    format_: str,
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(
+            CLI.__doc__, ["nodes", "list", f"--format={format_}"]
+        ),
+    )
+
+    CLI.main()
+
+    out = capsys.readouterr().out
+
+    if format_ == "json":
+        records = json.loads(out)
+    else:
+        records = [json.loads(line) for line in out.splitlines()]
+
+    assert records == [
+        {"id": 1, "name": "proxmox01", "zone_id": 1, "zone_name": "BIT-1"},
+        {"id": 2, "name": "proxmox02", "zone_id": 2, "zone_name": "BIT-2A"},
+        {"id": 3, "name": "proxmox03", "zone_id": 3, "zone_name": "BIT-2C"},
+    ]
+
+
+def test_cli_nodes_list_format_json_without_nodes(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(
+            CLI.__doc__, ["nodes", "list", "--format=json"]
+        ),
+    )
+
+    CLI.main()
+
+    assert capsys.readouterr().out == "[]\n"
+
+
 def test_cli_nodes_delete(
     mocker: MockerFixture,
     capsys: CaptureFixture,
@@ -195,6 +624,86 @@ def test_cli_nodes_create(
     assert len(database_node.get_multiple(database_session)) == 1
 
 
+def test_cli_nodes_sync(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    database_session: DatabaseSession,
+    database_nodes: List[DatabaseNode],
+):
+    requests_mock.get(
+        f"{proxmox_api_mock}/nodes",
+        json={
+            "data": [
+                {"node": "proxmox01", "status": "online"},
+                {"node": "proxmox04", "status": "online"},
+            ]
+        },
+    )
+
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(
+            CLI.__doc__, ["nodes", "sync", "--zone-name", "BIT-3"]
+        ),
+    )
+
+    CLI.main()
+
+    # Existing nodes keep their zone
+
+    assert capsys.readouterr().out.splitlines() == [
+        "Created zone 'BIT-3'",
+        "Created node 'proxmox04'",
+    ]
+
+    assert len(database_node.get_multiple(database_session)) == 4
+
+
+def test_cli_nodes_sync_with_zone_name_regex(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    database_nodes: List[DatabaseNode],
+):
+    requests_mock.get(
+        f"{proxmox_api_mock}/nodes",
+        json={
+            "data": [
+                {"node": "proxmox01", "status": "online"},
+                {"node": "proxmox04", "status": "online"},
+                {"node": "other01", "status": "online"},
+            ]
+        },
+    )
+
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["nodes", "sync"]),
+    )
+    mocker.patch.object(
+        settings,
+        "NODES_ZONE_NAME_REGEX",
+        r"^proxmox0([14])$",
+    )
+
+    CLI.main()
+
+    captured = capsys.readouterr()
+
+    assert captured.out.splitlines() == [
+        "Created zone '1'",
+        "Created zone '4'",
+        "Created node 'proxmox04'",
+        "Moved node 'proxmox01' to other zone",
+    ]
+    assert captured.err == (
+        "Node 'other01' is skipped, as its zone is unknown\n"
+    )
+
+
 # Zones
 
 
@@ -227,6 +736,29 @@ def test_cli_zones_list(
     ]
 
 
+def test_cli_zones_list_format_csv(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    database_zones: List[DatabaseZone],
+    database_nodes: List[DatabaseNode],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(
+            CLI.__doc__, ["zones", "list", "--format=csv"]
+        ),
+    )
+
+    CLI.main()
+
+    assert capsys.readouterr().out.splitlines() == [
+        "id,name,nodes_names",
+        '1,BIT-1,"[""proxmox01""]"',
+        '2,BIT-2A,"[""proxmox02""]"',
+        '3,BIT-2C,"[""proxmox03""]"',
+    ]
+
+
 def test_cli_zones_delete(
     mocker: MockerFixture,
     capsys: CaptureFixture,
@@ -268,3 +800,102 @@ def test_cli_zones_create(
     assert capsys.readouterr().out == ""
 
     assert len(database_zone.get_multiple(database_session)) == 1
+
+
+# Topology
+
+
+def test_cli_topology_export(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    database_nodes: List[DatabaseNode],
+):
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(CLI.__doc__, ["topology", "export"]),
+    )
+
+    CLI.main()
+
+    assert json.loads(capsys.readouterr().out) == {
+        "zones": [
+            {"name": "BIT-1", "nodes_names": ["proxmox01"]},
+            {"name": "BIT-2A", "nodes_names": ["proxmox02"]},
+            {"name": "BIT-2C", "nodes_names": ["proxmox03"]},
+        ]
+    }
+
+
+def test_cli_topology_import_json(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    database_nodes: List[DatabaseNode],
+):
+    path = tmp_path / "topology.json"
+
+    path.write_text(
+        json.dumps(
+            {
+                "zones": [
+                    {"name": "BIT-1", "nodes_names": ["proxmox01"]},
+                    {"name": "BIT-2A", "nodes_names": ["proxmox02"]},
+                    {"name": "BIT-3", "nodes_names": ["proxmox03"]},
+                ]
+            }
+        )
+    )
+
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(
+            CLI.__doc__, ["topology", "import", f"--path={path}"]
+        ),
+    )
+
+    CLI.main()
+
+    assert capsys.readouterr().out.splitlines() == [
+        "Created zone 'BIT-3'",
+        "Moved node 'proxmox03' to other zone",
+        "Deleted zone 'BIT-2C'",
+    ]
+
+    assert [
+        zone.name for zone in database_zone.get_multiple(database_session)
+    ] == ["BIT-1", "BIT-2A", "BIT-3"]
+
+
+def test_cli_topology_import_yaml(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+):
+    path = tmp_path / "topology.yaml"
+
+    path.write_text(
+        "zones:\n"
+        "  - name: BIT-1\n"
+        "    nodes_names:\n"
+        "      - proxmox01\n"
+        "      - proxmox02\n"
+    )
+
+    mocker.patch(
+        "virtualisation_resource_distributor.CLI.get_args",
+        return_value=docopt.docopt(
+            CLI.__doc__, ["topology", "import", f"--path={path}"]
+        ),
+    )
+
+    CLI.main()
+
+    assert capsys.readouterr().out.splitlines() == [
+        "Created zone 'BIT-1'",
+        "Created node 'proxmox01'",
+        "Created node 'proxmox02'",
+    ]
+
+    assert len(database_node.get_multiple(database_session)) == 2
@@ -1,5 +1,7 @@
 from typing import List
 
+import pytest
+
 from virtualisation_resource_distributor.crud import database_node
 from virtualisation_resource_distributor.database import DatabaseSession
 from virtualisation_resource_distributor.schemas import (
@@ -27,6 +29,60 @@ def test_database_node_get_multiple_with_filter_parameters(
     assert len(result) == 1
 
 
+def test_database_node_get_multiple_with_filter_parameters_in(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> None:
+    result = database_node.get_multiple(
+        database_session,
+        filter_parameters=[
+            ("name", [database_nodes[0].name, database_nodes[1].name])
+        ],
+    )
+
+    assert [node.id for node in result] == [
+        database_nodes[0].id,
+        database_nodes[1].id,
+    ]
+
+
+def test_database_node_get_multiple_with_multiple_filter_parameters(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> None:
+    result = database_node.get_multiple(
+        database_session,
+        filter_parameters=[
+            ("name", (database_nodes[0].name, database_nodes[1].name)),
+            ("zone_id", database_nodes[1].zone_id),
+        ],
+    )
+
+    assert [node.id for node in result] == [database_nodes[1].id]
+
+
+@pytest.mark.parametrize(
+    "key,value,index",
+    [
+        ("id", 1, "INTEGER PRIMARY KEY"),
+        ("name", "proxmox01", "INDEX sqlite_autoindex_nodes_1"),
+        ("zone_id", 1, "INDEX ix_nodes_zone_id"),
+    ],
+)
+def test_database_node_get_multiple_with_filter_parameters_uses_index(
+    database_session: DatabaseSession, key: str, value: object, index: str
+) -> None:
+    query = database_node._get_multiple_query(
+        database_session, filter_parameters=[(key, value)]
+    )
+    statement = query.statement.compile(compile_kwargs={"literal_binds": True})
+
+    plan = database_session.execute(
+        f"EXPLAIN QUERY PLAN {statement}"
+    ).fetchall()
+
+    assert len(plan) == 1
+    assert f"USING {index}" in plan[0][-1]
+
+
 def test_database_node_get(
     database_session: DatabaseSession, database_nodes: List[DatabaseNode]
 ) -> None:
@@ -66,3 +122,18 @@ def test_database_node_create(
 
     result = database_node.get_multiple(database_session)
     assert len(result) == 1
+
+
+def test_database_node_get_multiple_with_zone(
+    database_session: DatabaseSession,
+    database_zones: List[DatabaseZone],
+    database_nodes: List[DatabaseNode],
+) -> None:
+    result = list(
+        database_node.get_multiple_with_zone(
+            database_session, filter_parameters=[("name", "proxmox02")]
+        )
+    )
+
+    assert len(result) == 1
+    assert result[0].zone == database_zones[1]
@@ -0,0 +1,244 @@
+from typing import Callable, ContextManager, List
+
+import pytest
+from pydantic import ValidationError
+
+from virtualisation_resource_distributor.crud import (
+    database_node,
+    database_topology,
+    database_zone,
+)
+from virtualisation_resource_distributor.database import (
+    DatabaseSession,
+    engine,
+)
+from virtualisation_resource_distributor.schemas import (
+    DatabaseNode,
+    DatabaseTopologyChanges,
+    DatabaseTopologyDefinition,
+    DatabaseTopologyDefinitionZone,
+    DatabaseZone,
+    DatabaseZoneCreate,
+)
+
+
+def test_database_topology_get(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> None:
+    database_zone.create(
+        database_session, obj_in=DatabaseZoneCreate(name="BIT-3")
+    )
+
+    result = database_topology.get(database_session)
+
+    assert [zone.name for zone in result.zones] == [
+        "BIT-1",
+        "BIT-2A",
+        "BIT-2C",
+        "BIT-3",
+    ]
+    assert {
+        node_name: zone.id for node_name, zone in result.nodes_zones.items()
+    } == {node.name: node.zone_id for node in database_nodes}
+
+
+def test_database_topology_get_query_count(
+    database_session: DatabaseSession,
+    database_nodes: List[DatabaseNode],
+    record_queries: Callable[[], ContextManager[List[str]]],
+) -> None:
+    with record_queries() as statements:
+        database_topology.get(database_session)
+
+    assert len(statements) == 1
+
+
+def test_database_topology_get_definition(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> None:
+    result = database_topology.get_definition(database_session)
+
+    assert result == DatabaseTopologyDefinition(
+        zones=[
+            DatabaseTopologyDefinitionZone(
+                name="BIT-1", nodes_names=["proxmox01"]
+            ),
+            DatabaseTopologyDefinitionZone(
+                name="BIT-2A", nodes_names=["proxmox02"]
+            ),
+            DatabaseTopologyDefinitionZone(
+                name="BIT-2C", nodes_names=["proxmox03"]
+            ),
+        ]
+    )
+
+
+def test_database_topology_update(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> None:
+    definition = DatabaseTopologyDefinition(
+        zones=[
+            DatabaseTopologyDefinitionZone(
+                name="BIT-1", nodes_names=["proxmox01", "proxmox03"]
+            ),
+            DatabaseTopologyDefinitionZone(
+                name="BIT-3", nodes_names=["proxmox04"]
+            ),
+        ]
+    )
+
+    result = database_topology.update(database_session, obj_in=definition)
+
+    assert result == DatabaseTopologyChanges(
+        created_zones_names=["BIT-3"],
+        deleted_zones_names=["BIT-2A", "BIT-2C"],
+        created_nodes_names=["proxmox04"],
+        updated_nodes_names=["proxmox03"],
+        deleted_nodes_names=["proxmox02"],
+    )
+    assert database_topology.get_definition(database_session) == definition
+
+    # Updating with the same definition again changes nothing
+
+    assert (
+        database_topology.update(database_session, obj_in=definition)
+        == DatabaseTopologyChanges()
+    )
+
+
+def test_database_topology_update_query_count(
+    database_session: DatabaseSession,
+    record_queries: Callable[[], ContextManager[List[str]]],
+) -> None:
+    with record_queries() as statements:
+        database_topology.update(
+            database_session,
+            obj_in=DatabaseTopologyDefinition(
+                zones=[
+                    DatabaseTopologyDefinitionZone(
+                        name=f"zone{i}",
+                        nodes_names=[f"node{i}-{j}" for j in range(10)],
+                    )
+                    for i in range(10)
+                ]
+            ),
+        )
+
+    # Get zones, get nodes, insert zones, get zones IDs, insert nodes
+
+    assert len(statements) == 5
+
+
+def test_database_topology_definition_names_must_be_unique() -> None:
+    with pytest.raises(ValidationError):
+        DatabaseTopologyDefinition(
+            zones=[
+                DatabaseTopologyDefinitionZone(name="BIT-1"),
+                DatabaseTopologyDefinitionZone(name="BIT-1"),
+            ]
+        )
+
+    with pytest.raises(ValidationError):
+        DatabaseTopologyDefinition(
+            zones=[
+                DatabaseTopologyDefinitionZone(
+                    name="BIT-1", nodes_names=["proxmox01"]
+                ),
+                DatabaseTopologyDefinitionZone(
+                    name="BIT-2A", nodes_names=["proxmox01"]
+                ),
+            ]
+        )
+
+
+def test_database_topology_update_nodes(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> None:
+    result = database_topology.update_nodes(
+        database_session,
+        nodes_zones_names={"proxmox01": "BIT-2A", "proxmox04": "BIT-3"},
+    )
+
+    assert result == DatabaseTopologyChanges(
+        created_zones_names=["BIT-3"],
+        created_nodes_names=["proxmox04"],
+        updated_nodes_names=["proxmox01"],
+    )
+    assert database_topology.get_definition(
+        database_session
+    ) == DatabaseTopologyDefinition(
+        zones=[
+            DatabaseTopologyDefinitionZone(name="BIT-1"),
+            DatabaseTopologyDefinitionZone(
+                name="BIT-2A", nodes_names=["proxmox01", "proxmox02"]
+            ),
+            DatabaseTopologyDefinitionZone(
+                name="BIT-2C", nodes_names=["proxmox03"]
+            ),
+            DatabaseTopologyDefinitionZone(
+                name="BIT-3", nodes_names=["proxmox04"]
+            ),
+        ]
+    )
+
+
+def test_database_topology_update_nodes_keeps_nodes_in_deleted_zones(
+    database_session: DatabaseSession,
+    database_zones: List[DatabaseZone],
+    database_nodes: List[DatabaseNode],
+) -> None:
+    # Deleting zone leaves its nodes, as SQLite doesn't enforce foreign keys
+
+    database_zone.delete(database_session, id=database_zones[0].id)
+
+    result = database_topology.update_nodes(
+        database_session, nodes_zones_names={"proxmox04": "BIT-3"}
+    )
+
+    assert result == DatabaseTopologyChanges(
+        created_zones_names=["BIT-3"], created_nodes_names=["proxmox04"]
+    )
+    assert database_nodes[0].name in [
+        node.name for node in database_node.get_multiple(database_session)
+    ]
+
+
+def test_database_topology_get_cached(
+    database_session: DatabaseSession,
+    database_nodes: List[DatabaseNode],
+    record_queries: Callable[[], ContextManager[List[str]]],
+) -> None:
+    # Changes in the current second are not cached
+
+    assert database_topology.get(database_session) is not (
+        database_topology.get(database_session)
+    )
+
+    for table in ["zones", "nodes"]:
+        engine.execute(
+            f"UPDATE {table} SET updated_at = '2000-01-01 00:00:00'"
+        )
+
+    result = database_topology.get(database_session)
+
+    with record_queries() as statements:
+        assert database_topology.get(database_session) is result
+
+    assert len(statements) == 1
+
+    # Deleting a node changes the amount of nodes
+
+    database_node.delete(database_session, id=database_nodes[0].id)
+
+    assert (
+        database_nodes[0].name
+        not in database_topology.get(database_session).nodes_zones
+    )
+
+    # Creating a zone changes the latest 'updated_at'
+
+    database_zone.create(
+        database_session, obj_in=DatabaseZoneCreate(name="BIT-3")
+    )
+
+    assert len(database_topology.get(database_session).zones) == 4
@@ -1,8 +1,11 @@
-from typing import List
+from typing import Callable, ContextManager, List
+
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
 
 from virtualisation_resource_distributor.crud import database_zone
 from virtualisation_resource_distributor.database import DatabaseSession
 from virtualisation_resource_distributor.schemas import (
+    DatabaseNode,
     DatabaseZone,
     DatabaseZoneCreate,
 )
@@ -59,3 +62,75 @@ def test_database_zone_create(database_session: DatabaseSession) -> None:
 
     result = database_zone.get_multiple(database_session)
     assert len(result) == 1
+
+
+def test_database_zone_create_multiple(
+    database_session: DatabaseSession,
+    record_queries: Callable[[], ContextManager[List[str]]],
+) -> None:
+    with record_queries() as statements:
+        result = database_zone.create_multiple(
+            database_session,
+            objs_in=[
+                DatabaseZoneCreate(name="BIT-1"),
+                DatabaseZoneCreate(name="BIT-2A"),
+            ],
+        )
+
+    assert [zone.name for zone in result] == ["BIT-1", "BIT-2A"]
+    assert result == database_zone.get_multiple(database_session)
+
+    # Insert per object, and one select instead of a refresh per object
+
+    assert len(statements) == 3
+
+
+def test_database_zone_get_multiple_by_ids(
+    database_session: DatabaseSession, database_zones: List[DatabaseZone]
+) -> None:
+    result = database_zone.get_multiple_by_ids(
+        database_session, ids=[database_zones[2].id, database_zones[0].id, 0]
+    )
+
+    assert result == [database_zones[0], database_zones[2]]
+
+
+def test_database_zone_delete_multiple(
+    database_session: DatabaseSession, database_zones: List[DatabaseZone]
+) -> None:
+    database_zone.delete_multiple(
+        database_session, ids=[database_zones[0].id, database_zones[1].id]
+    )
+
+    assert database_zone.get_multiple(database_session) == [database_zones[2]]
+
+
+def test_database_zone_get_multiple_with_nodes(
+    database_session: DatabaseSession, database_nodes: List[DatabaseNode]
+) -> None:
+    result = database_zone.get_multiple_with_nodes(database_session)
+
+    assert [[node.name for node in zone.nodes] for zone in result] == [
+        ["proxmox01"],
+        ["proxmox02"],
+        ["proxmox03"],
+    ]
+
+
+def test_database_zone_get_multiple_with_nodes_in_batches(
+    mocker: MockerFixture,
+    database_session: DatabaseSession,
+    database_nodes: List[DatabaseNode],
+) -> None:
+    mocker.patch(
+        "virtualisation_resource_distributor.crud.crud_database_zone.YIELD_PER",
+        2,
+    )
+
+    result = database_zone.get_multiple_with_nodes(database_session)
+
+    assert [[node.name for node in zone.nodes] for zone in result] == [
+        ["proxmox01"],
+        ["proxmox02"],
+        ["proxmox03"],
+    ]
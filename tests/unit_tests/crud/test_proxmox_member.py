@@ -1,8 +1,7 @@
 from typing import List
 
-from proxmoxer import ProxmoxAPI
-
 from virtualisation_resource_distributor.crud import proxmox_member
+from virtualisation_resource_distributor.proxmox import ClusterSnapshot
 from virtualisation_resource_distributor.schemas import (
     ProxmoxMember,
     ProxmoxPool,
@@ -10,14 +9,40 @@ from virtualisation_resource_distributor.schemas import (
 
 
 def test_proxmox_member_get_by_pool(
-    proxmox_connection: ProxmoxAPI,
     proxmox_pools: List[ProxmoxPool],
     proxmox_members: List[ProxmoxMember],
+    cluster_snapshot: ClusterSnapshot,
 ) -> None:
     result = proxmox_member.get_by_pool(
-        proxmox_connection, proxmox_pools[0].name
+        cluster_snapshot, proxmox_pools[0].name
     )
 
     assert len(result) == 2
 
     assert result[0].name == proxmox_members[0].name
+    assert result[0].maxmem == proxmox_members[0].maxmem
+
+
+def test_proxmox_member_get_models_by_pool(
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+    cluster_snapshot: ClusterSnapshot,
+) -> None:
+    result = proxmox_member.get_models_by_pool(
+        cluster_snapshot, proxmox_pools[1].name
+    )
+
+    assert [member.name for member in result] == [proxmox_members[2].name]
+
+    # Status is not converted
+
+    assert result[0].status == "running"
+
+    # Same values as objects
+
+    assert [
+        ProxmoxMember(**member._asdict())
+        for member in proxmox_member.get_models_by_pool(
+            cluster_snapshot, proxmox_pools[0].name
+        )
+    ] == proxmox_member.get_by_pool(cluster_snapshot, proxmox_pools[0].name)
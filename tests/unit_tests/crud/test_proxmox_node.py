@@ -0,0 +1,39 @@
+from proxmoxer import ProxmoxAPI
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+from requests_mock.mocker import Mocker
+
+from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.crud import proxmox_node
+
+
+def test_proxmox_node_get_multiple(
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    proxmox_connection: ProxmoxAPI,
+) -> None:
+    requests_mock.get(
+        f"{proxmox_api_mock}/nodes",
+        json={
+            "data": [
+                {"node": "proxmox01", "status": "online"},
+                {"node": "proxmox02", "status": "offline"},
+            ]
+        },
+    )
+
+    result = proxmox_node.get_multiple(proxmox_connection)
+
+    assert [node.name for node in result] == ["proxmox01", "proxmox02"]
+
+
+def test_proxmox_node_get_zone_name_without_regex() -> None:
+    assert proxmox_node.get_zone_name("bit-1-proxmox01") is None
+
+
+def test_proxmox_node_get_zone_name_with_regex(mocker: MockerFixture) -> None:
+    mocker.patch.object(
+        settings, "NODES_ZONE_NAME_REGEX", r"^(bit-[0-9a-z]+)-"
+    )
+
+    assert proxmox_node.get_zone_name("bit-2a-proxmox02") == "bit-2a"
+    assert proxmox_node.get_zone_name("proxmox02") is None
@@ -1,41 +1,50 @@
-from typing import List
+import random
+import sys
+from datetime import datetime
+from typing import Dict, List, Tuple
 
-from proxmoxer import ProxmoxAPI
+import pytest
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
 
 from virtualisation_resource_distributor.crud import proxmox_pool
-from virtualisation_resource_distributor.database import DatabaseSession
+from virtualisation_resource_distributor.proxmox import ClusterSnapshot
 from virtualisation_resource_distributor.schemas import (
+    DatabaseTopology,
     DatabaseZone,
     ProxmoxMember,
+    ProxmoxMemberWeightEnum,
+    ProxmoxMigration,
     ProxmoxPool,
+    ProxmoxPoolSpread,
+    ProxmoxPoolWeightedSpread,
 )
 
 
 def test_proxmox_pool_get_multiple(
-    proxmox_connection: ProxmoxAPI, proxmox_pools: List[ProxmoxPool]
+    proxmox_pools: List[ProxmoxPool], cluster_snapshot: ClusterSnapshot
 ) -> None:
-    result = proxmox_pool.get_multiple(proxmox_connection)
+    result = proxmox_pool.get_multiple(cluster_snapshot)
 
     assert len(result) == 2
 
 
 def test_proxmox_pool_get(
-    proxmox_connection: ProxmoxAPI, proxmox_pools: List[ProxmoxPool]
+    proxmox_pools: List[ProxmoxPool], cluster_snapshot: ClusterSnapshot
 ) -> None:
-    result = proxmox_pool.get(proxmox_connection, name=proxmox_pools[0].name)
+    result = proxmox_pool.get(cluster_snapshot, name=proxmox_pools[0].name)
 
     assert result.name == proxmox_pools[0].name
 
 
 def test_proxmox_pool_get_members_zones(
-    proxmox_connection: ProxmoxAPI,
-    database_session: DatabaseSession,
+    database_topology: DatabaseTopology,
     proxmox_pools: List[ProxmoxPool],
     proxmox_members: List[ProxmoxMember],
     database_zones: List[DatabaseZone],
+    cluster_snapshot: ClusterSnapshot,
 ) -> None:
     result = proxmox_pool.get_members_zones(
-        database_session, proxmox_connection, name=proxmox_pools[0].name
+        database_topology, cluster_snapshot, name=proxmox_pools[0].name
     )
 
     assert len(result) == 1
@@ -44,11 +53,11 @@ def test_proxmox_pool_get_members_zones(
 
 
 def test_proxmox_pool_get_has_members_to_migrate_true(
-    proxmox_connection: ProxmoxAPI,
-    database_session: DatabaseSession,
+    database_topology: DatabaseTopology,
     proxmox_pools: List[ProxmoxPool],
     proxmox_members: List[ProxmoxMember],
     database_zones: List[DatabaseZone],
+    cluster_snapshot: ClusterSnapshot,
 ) -> None:
     # Used zones = 1
     # Unused zones = 2
@@ -57,18 +66,18 @@ def test_proxmox_pool_get_has_members_to_migrate_true(
 
     assert (
         proxmox_pool.get_has_members_to_migrate(
-            database_session, proxmox_connection, name=proxmox_pools[0].name
+            database_topology, cluster_snapshot, name=proxmox_pools[0].name
         )
         is True
     )
 
 
 def test_proxmox_pool_get_has_members_to_migrate_false(
-    proxmox_connection: ProxmoxAPI,
-    database_session: DatabaseSession,
+    database_topology: DatabaseTopology,
     proxmox_pools: List[ProxmoxPool],
     proxmox_members: List[ProxmoxMember],
     database_zones: List[DatabaseZone],
+    cluster_snapshot: ClusterSnapshot,
 ) -> None:
     # Used zones = 1
     # Unused zones = 2
@@ -77,7 +86,426 @@ def test_proxmox_pool_get_has_members_to_migrate_false(
 
     assert (
         proxmox_pool.get_has_members_to_migrate(
-            database_session, proxmox_connection, name=proxmox_pools[1].name
+            database_topology, cluster_snapshot, name=proxmox_pools[1].name
         )
         is False
     )
+
+
+def get_topology_and_snapshot(
+    zones_nodes_names: Dict[str, List[str]],
+    nodes_members_counts: Dict[str, int],
+) -> Tuple[DatabaseTopology, ClusterSnapshot]:
+    zones = []
+    nodes_zones = {}
+
+    for zone_id, (zone_name, nodes_names) in enumerate(
+        zones_nodes_names.items(), start=1
+    ):
+        zone = DatabaseZone(
+            id=zone_id,
+            name=zone_name,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow(),
+        )
+
+        zones.append(zone)
+
+        for node_name in nodes_names:
+            nodes_zones[node_name] = zone
+
+    cluster_snapshot = ClusterSnapshot()
+    cluster_snapshot.add_pools([{"poolid": "important"}])
+
+    vm_id = 100
+
+    for node_name, members_count in nodes_members_counts.items():
+        for _ in range(members_count):
+            cluster_snapshot.add_members(
+                [
+                    {
+                        "maxcpu": 4,
+                        "maxdisk": 34359738368,
+                        "maxmem": 8589934592,
+                        "name": f"vm{vm_id}.example.com",
+                        "node": node_name,
+                        "pool": "important",
+                        "status": "running",
+                        "type": "qemu",
+                        "vmid": vm_id,
+                    }
+                ]
+            )
+
+            vm_id += 1
+
+    return (
+        DatabaseTopology(zones=zones, nodes_zones=nodes_zones),
+        cluster_snapshot,
+    )
+
+
+def test_proxmox_pool_get_migrations(
+    database_topology: DatabaseTopology,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+    cluster_snapshot: ClusterSnapshot,
+) -> None:
+    result = proxmox_pool.get_migrations(
+        database_topology, cluster_snapshot, name=proxmox_pools[0].name
+    )
+
+    assert result == [
+        ProxmoxMigration(
+            vm_id=proxmox_members[1].vm_id,
+            name=proxmox_members[1].name,
+            pool_name=proxmox_pools[0].name,
+            source_node_name="proxmox01",
+            source_zone_name="BIT-1",
+            destination_node_name="proxmox02",
+            destination_zone_name="BIT-2A",
+        )
+    ]
+
+    # Only one member is running
+
+    assert (
+        proxmox_pool.get_migrations(
+            database_topology, cluster_snapshot, name=proxmox_pools[1].name
+        )
+        == []
+    )
+
+
+def test_proxmox_pool_get_migrations_zones_and_nodes() -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1", "a2"], "B": ["b1"], "C": ["c1"]},
+        {"a1": 4},
+    )
+
+    result = proxmox_pool.get_migrations(
+        database_topology, cluster_snapshot, name="important"
+    )
+
+    # Unused zones first, then unused node in same zone
+
+    assert [
+        (migration.source_node_name, migration.destination_node_name)
+        for migration in result
+    ] == [("a1", "b1"), ("a1", "c1"), ("a1", "a2")]
+
+
+def test_proxmox_pool_get_migrations_keeps_used_zones() -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1", "a2"], "B": ["b1", "b2"], "C": ["c1"]},
+        {"a1": 1, "a2": 1, "b1": 2},
+    )
+
+    result = proxmox_pool.get_migrations(
+        database_topology, cluster_snapshot, name="important"
+    )
+
+    # Zone A has multiple members, but taking one from node 'b1' uses another
+    # node as well
+
+    assert [
+        (migration.source_node_name, migration.destination_node_name)
+        for migration in result
+    ] == [("b1", "c1")]
+
+
+def test_proxmox_pool_get_migrations_more_members_than_nodes() -> None:
+    zones_nodes_names = {
+        f"zone{zone}": [f"node{zone}-{node}" for node in range(5)]
+        for zone in range(10)
+    }
+
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        zones_nodes_names, {"node0-0": 500}
+    )
+
+    result = proxmox_pool.get_migrations(
+        database_topology, cluster_snapshot, name="important"
+    )
+
+    # Every other node receives one member
+
+    assert len(result) == 49
+    assert len({migration.destination_node_name for migration in result}) == 49
+    assert len({migration.vm_id for migration in result}) == 49
+
+
+def test_proxmox_pool_get_spread(
+    database_topology: DatabaseTopology,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+    cluster_snapshot: ClusterSnapshot,
+) -> None:
+    result = proxmox_pool.get_spread(
+        database_topology, cluster_snapshot, name=proxmox_pools[0].name
+    )
+
+    assert result == ProxmoxPoolSpread(
+        name=proxmox_pools[0].name,
+        members_count=2,
+        zones_members_counts={"BIT-1": 2},
+        nodes_members_counts={"proxmox01": 2},
+        unused_zones_count=2,
+        unused_nodes_count=2,
+        has_members_to_migrate=True,
+        has_members_to_migrate_between_nodes=True,
+    )
+
+
+def test_proxmox_pool_get_spread_nodes_only() -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1", "a2"], "B": ["b1"]},
+        {"a1": 2, "b1": 1},
+    )
+
+    result = proxmox_pool.get_spread(
+        database_topology, cluster_snapshot, name="important"
+    )
+
+    # All zones are used, but node 'a2' is not
+
+    assert result.has_members_to_migrate is False
+    assert result.has_members_to_migrate_between_nodes is True
+    assert result.unused_nodes_count == 1
+
+
+def test_proxmox_pool_get_spread_more_members_than_nodes() -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1"], "B": ["b1"]},
+        {"a1": 2, "b1": 1},
+    )
+
+    result = proxmox_pool.get_spread(
+        database_topology, cluster_snapshot, name="important"
+    )
+
+    assert result.has_members_to_migrate is False
+    assert result.has_members_to_migrate_between_nodes is False
+
+
+def test_proxmox_pool_get_spread_unknown_nodes() -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1"], "B": ["b1"]},
+        {"a1": 1, "x1": 2},
+    )
+
+    result = proxmox_pool.get_spread(
+        database_topology, cluster_snapshot, name="important"
+    )
+
+    assert result.members_count == 1
+    assert result.unknown_nodes_names == ["x1"]
+    assert result.has_members_to_migrate is False
+
+    assert (
+        proxmox_pool.get_members_zones(
+            database_topology, cluster_snapshot, name="important"
+        )
+        == database_topology.zones[:1]
+    )
+    assert (
+        proxmox_pool.get_migrations(
+            database_topology, cluster_snapshot, name="important"
+        )
+        == []
+    )
+
+
+def test_proxmox_pool_get_spreads(
+    database_topology: DatabaseTopology,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+    cluster_snapshot: ClusterSnapshot,
+) -> None:
+    names = [proxmox_pools[0].name, proxmox_pools[1].name]
+
+    assert proxmox_pool.get_spreads(
+        database_topology, cluster_snapshot, names
+    ) == [
+        proxmox_pool.get_spread(database_topology, cluster_snapshot, name)
+        for name in names
+    ]
+
+
+@pytest.mark.parametrize(
+    "zones_nodes_names",
+    [{"A": ["a1", "a2"], "B": ["b1"], "C": []}, {"A": ["a1"]}, {}],
+)
+def test_proxmox_pool_get_spreads_same_as_get_spread(
+    zones_nodes_names: Dict[str, List[str]]
+) -> None:
+    database_topology, _ = get_topology_and_snapshot(zones_nodes_names, {})
+
+    randomiser = random.Random(0)
+    nodes_names = ["a1", "a2", "b1", "x1"]
+    names = [f"pool{i}" for i in range(20)]
+
+    cluster_snapshot = ClusterSnapshot()
+    cluster_snapshot.add_pools([{"poolid": name} for name in names])
+    cluster_snapshot.add_members(
+        [
+            {
+                "maxcpu": 4,
+                "maxdisk": 34359738368,
+                "maxmem": 8589934592,
+                "name": f"vm{vm_id}.example.com",
+                "node": randomiser.choice(nodes_names),
+                "pool": randomiser.choice(names),
+                "status": randomiser.choice(["running", "stopped"]),
+                "type": "qemu",
+                "vmid": vm_id,
+            }
+            for vm_id in range(100, 200)
+        ]
+    )
+
+    assert proxmox_pool.get_spreads(
+        database_topology, cluster_snapshot, names
+    ) == [
+        proxmox_pool.get_spread(database_topology, cluster_snapshot, name)
+        for name in names
+    ]
+
+
+def test_proxmox_pool_get_spreads_without_numpy(
+    mocker: MockerFixture,
+) -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1"], "B": ["b1"]},
+        {"a1": 2},
+    )
+
+    mocker.patch.dict(sys.modules, {"numpy": None})
+    spy = mocker.spy(proxmox_pool, "get_spread")
+
+    result = proxmox_pool.get_spreads(
+        database_topology, cluster_snapshot, ["important"]
+    )
+
+    assert spy.call_count == 1
+    assert result[0].has_members_to_migrate is True
+
+
+def add_weighted_members(
+    cluster_snapshot: ClusterSnapshot,
+    nodes_members_weights: Dict[str, List[int]],
+) -> None:
+    vm_id = 100
+
+    for node_name, members_weights in nodes_members_weights.items():
+        for member_weight in members_weights:
+            cluster_snapshot.add_members(
+                [
+                    {
+                        "maxcpu": member_weight,
+                        "maxdisk": 0,
+                        "maxmem": member_weight * 1073741824,
+                        "name": f"vm{vm_id}.example.com",
+                        "node": node_name,
+                        "pool": "important",
+                        "status": "running",
+                        "type": "qemu",
+                        "vmid": vm_id,
+                    }
+                ]
+            )
+
+            vm_id += 1
+
+
+def test_proxmox_pool_get_weighted_spread() -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1", "a2"], "B": ["b1"]}, {}
+    )
+    add_weighted_members(cluster_snapshot, {"a1": [64], "a2": [1]})
+
+    result = proxmox_pool.get_weighted_spread(
+        database_topology,
+        cluster_snapshot,
+        "important",
+        ProxmoxMemberWeightEnum.MAXMEM,
+    )
+
+    # Moving the small member to zone 'B' makes zone 'A' lighter, but moving
+    # the big member to another node makes no node lighter
+
+    assert result == ProxmoxPoolWeightedSpread(
+        name="important",
+        members_count=2,
+        zones_members_counts={"A": 2},
+        nodes_members_counts={"a1": 1, "a2": 1},
+        unused_zones_count=1,
+        unused_nodes_count=1,
+        has_members_to_migrate=True,
+        has_members_to_migrate_between_nodes=False,
+        weight="maxmem",
+        members_weight=65 * 1073741824,
+        zones_members_weights={"A": 65 * 1073741824},
+        nodes_members_weights={"a1": 64 * 1073741824, "a2": 1073741824},
+    )
+
+
+@pytest.mark.parametrize(
+    "weight, nodes_members_weights, has_members_to_migrate",
+    [
+        (
+            ProxmoxMemberWeightEnum.MAXCPU,
+            {"a1": [8], "b1": [1], "c1": [1]},
+            False,
+        ),
+        (ProxmoxMemberWeightEnum.MAXCPU, {"a1": [4], "b1": [2, 2]}, True),
+        (ProxmoxMemberWeightEnum.MAXCPU, {"a1": [4, 2], "b1": [1]}, True),
+        # Moving a member from zone 'A' makes zone 'B' (or 'C') heavier than
+        # zone 'A' was
+        (
+            ProxmoxMemberWeightEnum.MAXCPU,
+            {"a1": [2, 2], "b1": [3], "c1": [3]},
+            False,
+        ),
+        (ProxmoxMemberWeightEnum.MAXCPU, {"x1": [4, 2]}, False),
+        (ProxmoxMemberWeightEnum.MAXCPU, {}, False),
+        # Members without weight
+        (ProxmoxMemberWeightEnum.MAXDISK, {"a1": [4, 2], "b1": [1]}, False),
+    ],
+)
+def test_proxmox_pool_get_weighted_spread_has_members_to_migrate(
+    weight: ProxmoxMemberWeightEnum,
+    nodes_members_weights: Dict[str, List[int]],
+    has_members_to_migrate: bool,
+) -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1"], "B": ["b1"], "C": ["c1"]}, {}
+    )
+    add_weighted_members(cluster_snapshot, nodes_members_weights)
+
+    result = proxmox_pool.get_weighted_spread(
+        database_topology, cluster_snapshot, "important", weight
+    )
+
+    assert result.has_members_to_migrate is has_members_to_migrate
+
+
+def test_proxmox_pool_get_spreads_weighted() -> None:
+    database_topology, cluster_snapshot = get_topology_and_snapshot(
+        {"A": ["a1"], "B": ["b1"]}, {}
+    )
+    add_weighted_members(cluster_snapshot, {"a1": [4, 2], "b1": [1]})
+
+    assert proxmox_pool.get_spreads(
+        database_topology,
+        cluster_snapshot,
+        ["important"],
+        ProxmoxMemberWeightEnum.MAXCPU,
+    ) == [
+        proxmox_pool.get_weighted_spread(
+            database_topology,
+            cluster_snapshot,
+            "important",
+            ProxmoxMemberWeightEnum.MAXCPU,
+        )
+    ]
@@ -0,0 +1,92 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("pools_count", [5, 20])
+def test_benchmarks_run_api_calls_count_constant(pools_count: int) -> None:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks",
+            "--zones=2",
+            "--nodes=4",
+            f"--pools={pools_count}",
+            "--members-per-pool=3",
+            "--cluster-resources",
+            "--repeat=1",
+            "--json",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    results = {result["command"]: result for result in json.loads(output)}
+
+    # Log in, '/pools' and '/cluster/resources'
+
+    assert results["run"]["api_calls_count"] == 3
+    assert results["run"]["sql_queries_count"] == 1
+    assert results["zones list"]["api_calls_count"] == 0
+    assert results["zones list"]["sql_queries_count"] == 2
+    assert results["nodes list"]["sql_queries_count"] == 1
+    assert results["nodes list"]["api_calls_count"] == 0
+
+
+def test_benchmarks_run_pools_concurrently() -> None:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks",
+            "--zones=2",
+            "--nodes=4",
+            "--pools=20",
+            "--members-per-pool=3",
+            "--max-concurrency=4",
+            "--latency=1",
+            "--repeat=1",
+            "--json",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    results = {result["command"]: result for result in json.loads(output)}
+
+    # Log in, '/pools' and a call per pool
+
+    assert results["run"]["api_calls_count"] == 2 + 20
+
+    # Logging in uses its own connection, other calls keep one per worker
+
+    assert results["run"]["api_connections_count"] <= 1 + 4
+
+
+def test_benchmarks_members() -> None:
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.members",
+            "--members=100",
+            "--repeat=1",
+            "--json",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    results = {result["operation"]: result for result in json.loads(output)}
+
+    assert set(results) == {
+        "get_by_pool",
+        "get_models_by_pool",
+        "get_spread",
+        "get_spreads",
+        "get_weighted_spread",
+    }
+    assert results["get_spread"]["members_count"] == 100
@@ -0,0 +1,256 @@
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+from proxmoxer import ProxmoxAPI
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+from requests_mock.mocker import Mocker
+
+from virtualisation_resource_distributor import crud
+from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.crud import database_node
+from virtualisation_resource_distributor.daemon import Daemon
+from virtualisation_resource_distributor.database import DatabaseSession
+from virtualisation_resource_distributor.schemas import (
+    DatabaseNode,
+    ProxmoxMember,
+    ProxmoxMemberStatusEnum,
+    ProxmoxPool,
+)
+
+
+def get_members_data(proxmox_members: List[ProxmoxMember]) -> List[dict]:
+    return [
+        {
+            "id": f"qemu/{member.vm_id}",
+            "maxcpu": member.maxcpu,
+            "maxdisk": member.maxdisk,
+            "maxmem": member.maxmem,
+            "name": member.name,
+            "node": member.node_name,
+            "pool": member.pool_name,
+            "status": member.status.value,
+            "type": "qemu",
+            "vmid": member.vm_id,
+        }
+        for member in proxmox_members
+    ]
+
+
+def test_daemon_poll(
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+) -> None:
+    path = tmp_path / "result.json"
+
+    daemon = Daemon(database_session, proxmox_connection, str(path))
+
+    assert daemon.poll() == [proxmox_pools[0].name]
+
+    result = json.loads(path.read_text())
+
+    assert result["pools_names_with_members_to_migrate"] == [
+        proxmox_pools[0].name
+    ]
+    assert result["pools_names_with_members_to_migrate_between_nodes"] == [
+        proxmox_pools[0].name
+    ]
+    assert "updated_at" in result
+
+    assert path.stat().st_mode & 0o777 == 0o644
+
+
+def test_daemon_poll_writes_metrics(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+) -> None:
+    path = tmp_path / "metrics.prom"
+
+    mocker.patch.object(settings, "METRICS_PATH", str(path))
+
+    daemon = Daemon(
+        database_session, proxmox_connection, str(tmp_path / "result.json")
+    )
+
+    daemon.poll()
+
+    assert (
+        f'virtualisation_resource_distributor_pool_has_members_to_migrate{{pool="{proxmox_pools[0].name}"}} 1'
+        in path.read_text().splitlines()
+    )
+
+
+def test_daemon_poll_excludes_pools(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+) -> None:
+    mocker.patch(
+        "virtualisation_resource_distributor.daemon.get_exclude_pools_names",
+        return_value=[proxmox_pools[0].name],
+    )
+
+    daemon = Daemon(
+        database_session, proxmox_connection, str(tmp_path / "result.json")
+    )
+
+    assert daemon.poll() == []
+
+
+def test_daemon_poll_only_evaluates_changed_pools(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    database_session: DatabaseSession,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+) -> None:
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", True)
+
+    spy = mocker.spy(crud.proxmox_pool, "get_spreads")
+
+    daemon = Daemon(
+        database_session, proxmox_connection, str(tmp_path / "result.json")
+    )
+
+    # First poll evaluates all pools
+
+    daemon.poll()
+
+    assert spy.call_args.args[2] == [
+        proxmox_pools[0].name,
+        proxmox_pools[1].name,
+    ]
+
+    # Nothing changed
+
+    assert daemon.poll() == [proxmox_pools[0].name]
+
+    assert spy.call_args.args[2] == []
+
+    # Member of pool 1 started, so pool 1 has members to migrate
+
+    proxmox_members[3].status = ProxmoxMemberStatusEnum.RUNNING
+
+    requests_mock.get(
+        f"{proxmox_api_mock}/cluster/resources",
+        json={"data": get_members_data(proxmox_members)},
+    )
+
+    assert daemon.poll() == [proxmox_pools[0].name, proxmox_pools[1].name]
+
+    assert spy.call_args.args[2] == [proxmox_pools[1].name]
+
+    # Member of pool 0 was resized
+
+    proxmox_members[0].maxmem *= 2
+
+    requests_mock.get(
+        f"{proxmox_api_mock}/cluster/resources",
+        json={"data": get_members_data(proxmox_members)},
+    )
+
+    daemon.poll()
+
+    assert spy.call_args.args[2] == [proxmox_pools[0].name]
+
+
+def test_daemon_poll_evaluates_all_pools_when_topology_changed(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+    database_nodes: List[DatabaseNode],
+) -> None:
+    spy = mocker.spy(crud.proxmox_pool, "get_spreads")
+
+    daemon = Daemon(
+        database_session, proxmox_connection, str(tmp_path / "result.json")
+    )
+
+    daemon.poll()
+
+    assert len(spy.call_args.args[2]) == 2
+
+    # Unused node is removed, in another session (like the CLI would)
+
+    database_node.delete(DatabaseSession(), id=database_nodes[2].id)
+
+    daemon.poll()
+
+    assert len(spy.call_args.args[2]) == 2
+
+
+def test_daemon_run(
+    mocker: MockerFixture,
+    capsys: pytest.CaptureFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+) -> None:
+    requests_mock.get(f"{proxmox_api_mock}/pools", status_code=500)
+
+    sleep = mocker.patch(
+        "virtualisation_resource_distributor.daemon.time.sleep",
+        side_effect=[None, KeyboardInterrupt],
+    )
+
+    daemon = Daemon(
+        database_session, proxmox_connection, str(tmp_path / "result.json")
+    )
+
+    with pytest.raises(KeyboardInterrupt):
+        daemon.run(30)
+
+    sleep.assert_called_with(30)
+
+    # Failed polls don't stop the daemon
+
+    assert (
+        capsys.readouterr().err.count("Polling failed: ResourceException: 500")
+        == 2
+    )
+
+
+def test_daemon_run_unexpected_error(
+    mocker: MockerFixture,
+    capsys: pytest.CaptureFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    proxmox_connection: ProxmoxAPI,
+) -> None:
+    mocker.patch.object(Daemon, "poll", side_effect=KeyError("maxmem"))
+    mocker.patch(
+        "virtualisation_resource_distributor.daemon.time.sleep",
+        side_effect=[None, KeyboardInterrupt],
+    )
+
+    daemon = Daemon(
+        database_session, proxmox_connection, str(tmp_path / "result.json")
+    )
+
+    with pytest.raises(KeyboardInterrupt):
+        daemon.run(30)
+
+    assert (
+        capsys.readouterr().err.count("Polling failed: KeyError: 'maxmem'")
+        == 2
+    )
@@ -0,0 +1,44 @@
+import pytest
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+from sqlalchemy.exc import OperationalError
+
+from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.crud import database_zone
+from virtualisation_resource_distributor.database import (
+    ReadOnlyDatabaseSession,
+    engine,
+    read_only_engine,
+)
+from virtualisation_resource_distributor.schemas import DatabaseZoneCreate
+
+
+def test_engine_pragmas() -> None:
+    with engine.connect() as connection:
+        assert connection.execute("PRAGMA journal_mode").scalar() == "delete"
+        assert connection.execute("PRAGMA synchronous").scalar() == 1
+        assert connection.execute("PRAGMA cache_size").scalar() == -8000
+
+
+def test_engine_journal_mode(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "DATABASE_JOURNAL_MODE", "wal")
+
+    with engine.connect() as connection:
+        assert connection.execute("PRAGMA journal_mode").scalar() == "wal"
+
+    # Journal mode is stored in the database
+
+    with read_only_engine.connect() as connection:
+        assert connection.execute("PRAGMA journal_mode").scalar() == "wal"
+
+
+def test_read_only_engine_pragmas() -> None:
+    with read_only_engine.connect() as connection:
+        assert connection.execute("PRAGMA synchronous").scalar() == 1
+        assert connection.execute("PRAGMA mmap_size").scalar() == 268435456
+
+
+def test_read_only_database_session_cannot_write() -> None:
+    with pytest.raises(OperationalError, match="readonly database"):
+        database_zone.create(
+            ReadOnlyDatabaseSession(), obj_in=DatabaseZoneCreate(name="BIT-1")
+        )
@@ -0,0 +1,76 @@
+from virtualisation_resource_distributor.metrics import (
+    Histogram,
+    Metrics,
+    escape_label_value,
+)
+from virtualisation_resource_distributor.schemas import ProxmoxPoolSpread
+
+
+def test_escape_label_value() -> None:
+    assert escape_label_value('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+def test_histogram_buckets_are_cumulative() -> None:
+    histogram = Histogram("test", "Test.", [1.0, 2.0])
+
+    histogram.observe(0.5)
+    histogram.observe(1.5)
+    histogram.observe(3.0)
+
+    assert histogram.get_lines() == [
+        "# TYPE test histogram",
+        "# HELP test Test.",
+        'test_bucket{le="1.0"} 1',
+        'test_bucket{le="2.0"} 2',
+        'test_bucket{le="+Inf"} 3',
+        "test_sum 5.0",
+        "test_count 3",
+    ]
+
+
+def test_metrics_get_text() -> None:
+    metrics = Metrics()
+
+    metrics.run_duration.observe(0.2)
+
+    text = metrics.get_text(
+        [
+            ProxmoxPoolSpread(
+                name="db.dmz.cyberfusion.cloud",
+                members_count=3,
+                zones_members_counts={"BIT-1": 3},
+                nodes_members_counts={"proxmox01": 2, "proxmox02": 1},
+                unused_zones_count=1,
+                unused_nodes_count=1,
+                has_members_to_migrate=True,
+                has_members_to_migrate_between_nodes=True,
+            )
+        ]
+    )
+    lines = text.splitlines()
+
+    assert (
+        'virtualisation_resource_distributor_pool_members{pool="db.dmz.cyberfusion.cloud"} 3'
+        in lines
+    )
+    assert (
+        'virtualisation_resource_distributor_pool_used_zones{pool="db.dmz.cyberfusion.cloud"} 1'
+        in lines
+    )
+    assert (
+        'virtualisation_resource_distributor_pool_used_nodes{pool="db.dmz.cyberfusion.cloud"} 2'
+        in lines
+    )
+    assert (
+        'virtualisation_resource_distributor_pool_has_members_to_migrate{pool="db.dmz.cyberfusion.cloud"} 1'
+        in lines
+    )
+    assert (
+        "virtualisation_resource_distributor_run_duration_seconds_count 1"
+        in lines
+    )
+    assert (
+        "virtualisation_resource_distributor_proxmox_request_duration_seconds_count 0"
+        in lines
+    )
+    assert lines[-1] == "# EOF"
@@ -0,0 +1,43 @@
+from typing import Any, Dict, Iterator
+
+from _pytest.capture import CaptureFixture
+
+from virtualisation_resource_distributor.output import (
+    FORMAT_CSV,
+    FORMAT_JSON,
+    FORMAT_NDJSON,
+    write_records,
+)
+
+
+def test_write_records_json(capsys: CaptureFixture) -> None:
+    write_records([{"a": 1}, {"a": 2}], FORMAT_JSON, ["a"])
+
+    assert capsys.readouterr().out == '[{"a": 1}, {"a": 2}]\n'
+
+
+def test_write_records_ndjson_streams(capsys: CaptureFixture) -> None:
+    def get_records() -> Iterator[Dict[str, Any]]:
+        yield {"a": 1}
+
+        # Previous record is written before the next one is produced
+
+        assert capsys.readouterr().out == '{"a": 1}\n'
+
+        yield {"a": 2}
+
+    write_records(get_records(), FORMAT_NDJSON, ["a"])
+
+    assert capsys.readouterr().out == '{"a": 2}\n'
+
+
+def test_write_records_csv(capsys: CaptureFixture) -> None:
+    write_records(
+        [{"a": 1, "b": ["x"]}, {"a": 2, "c": 3}], FORMAT_CSV, ["a", "b"]
+    )
+
+    assert capsys.readouterr().out.splitlines() == [
+        "a,b",
+        '1,"[""x""]"',
+        "2,",
+    ]
@@ -0,0 +1,63 @@
+import json
+
+import requests
+from _pytest.capture import CaptureFixture
+
+from virtualisation_resource_distributor.database import engine
+from virtualisation_resource_distributor.profiling import FORMAT_JSON, Profiler
+
+
+def test_profiler_records_nothing_when_disabled() -> None:
+    profiler = Profiler()
+
+    with profiler.phase("decision"):
+        pass
+
+    profiler.record_request(requests.Response())
+
+    assert profiler.phases == {}
+    assert profiler.requests_count == 0
+
+
+def test_profiler_adds_up_phases_with_same_name() -> None:
+    profiler = Profiler()
+
+    profiler.enable(engine)
+
+    with profiler.phase("decision"):
+        pass
+
+    time = profiler.phases["decision"]
+
+    with profiler.phase("decision"):
+        pass
+
+    assert list(profiler.phases) == ["decision"]
+    assert profiler.phases["decision"] > time
+
+
+def test_profiler_records_queries() -> None:
+    profiler = Profiler()
+
+    profiler.enable(engine)
+
+    with engine.connect() as connection:
+        connection.execute("SELECT 1")
+
+    assert profiler.queries_count == 1
+    assert profiler.queries_time > 0
+
+
+def test_profiler_print_summary_json(capsys: CaptureFixture) -> None:
+    profiler = Profiler()
+
+    profiler.enable(engine)
+
+    profiler.record_request(requests.Response())
+    profiler.print_summary(FORMAT_JSON)
+
+    assert json.loads(capsys.readouterr().err) == {
+        "phases": {},
+        "proxmox_requests": {"count": 1, "time": 0.0},
+        "sql_queries": {"count": 0, "time": 0.0},
+    }
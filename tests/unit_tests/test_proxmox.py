@@ -0,0 +1,581 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Optional
+
+import pytest
+import requests
+from proxmoxer import ProxmoxAPI
+from proxmoxer.core import ResourceException
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+from requests.adapters import HTTPAdapter
+from requests_mock.mocker import Mocker
+
+from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.proxmox import (
+    API,
+    ClusterSnapshot,
+    get_transport_adapter,
+)
+from virtualisation_resource_distributor.schemas import (
+    ProxmoxMember,
+    ProxmoxPool,
+)
+
+
+def test_cluster_snapshot_members(
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+) -> None:
+    cluster_snapshot = ClusterSnapshot(proxmox_connection)
+
+    assert cluster_snapshot.pools_names == [
+        proxmox_pools[0].name,
+        proxmox_pools[1].name,
+    ]
+
+    assert [
+        member["vmid"]
+        for member in cluster_snapshot.get_members(proxmox_pools[0].name)
+    ] == [proxmox_members[0].vm_id, proxmox_members[1].vm_id]
+
+    # Stopped member is left out
+
+    assert [
+        member["vmid"]
+        for member in cluster_snapshot.get_members(proxmox_pools[1].name)
+    ] == [proxmox_members[2].vm_id]
+
+
+def test_cluster_snapshot_skips_resources_without_pool(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+) -> None:
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", True)
+
+    requests_mock.get(
+        f"{proxmox_api_mock}/cluster/resources",
+        json={
+            "data": [
+                {
+                    "id": "qemu/100",
+                    "maxcpu": 4,
+                    "maxdisk": 34359738368,
+                    "maxmem": 8589934592,
+                    "name": "vm01.example.com",
+                    "node": "proxmox01",
+                    "status": "running",
+                    "type": "qemu",
+                    "vmid": 100,
+                }
+            ]
+        },
+    )
+
+    cluster_snapshot = ClusterSnapshot(proxmox_connection)
+
+    assert cluster_snapshot.get_members(proxmox_pools[0].name) == []
+    assert cluster_snapshot.get_members(proxmox_pools[1].name) == []
+
+
+def test_cluster_snapshot_skips_not_running_resources(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+) -> None:
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", True)
+
+    requests_mock.get(
+        f"{proxmox_api_mock}/cluster/resources",
+        json={
+            "data": [
+                {
+                    "id": "qemu/100",
+                    "maxcpu": 4,
+                    "maxdisk": 34359738368,
+                    "maxmem": 8589934592,
+                    "name": "vm01.example.com",
+                    "node": "proxmox01",
+                    "pool": proxmox_pools[0].name,
+                    "status": "running",
+                    "template": 0,
+                    "type": "qemu",
+                    "vmid": 100,
+                },
+                {
+                    "id": "lxc/101",
+                    "name": "ct01.example.com",
+                    "node": "proxmox02",
+                    "pool": proxmox_pools[0].name,
+                    "status": "stopped",
+                    "template": 0,
+                    "type": "lxc",
+                    "vmid": 101,
+                },
+                {
+                    "id": "qemu/102",
+                    "name": "template01.example.com",
+                    "node": "proxmox02",
+                    "pool": proxmox_pools[0].name,
+                    "status": "stopped",
+                    "template": 1,
+                    "type": "qemu",
+                    "vmid": 102,
+                },
+            ]
+        },
+    )
+
+    cluster_snapshot = ClusterSnapshot(proxmox_connection)
+
+    assert [
+        member["vmid"]
+        for member in cluster_snapshot.get_members(proxmox_pools[0].name)
+    ] == [100]
+
+
+def test_cluster_snapshot_api_calls(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_members: List[ProxmoxMember],
+) -> None:
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", True)
+
+    call_count = requests_mock.call_count
+
+    ClusterSnapshot(proxmox_connection)
+
+    # Pools and members are fetched with one call each, regardless of the
+    # amount of pools
+
+    assert requests_mock.call_count - call_count == 2
+
+
+def test_cluster_snapshot_members_from_pools(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+    proxmox_members: List[ProxmoxMember],
+) -> None:
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", False)
+
+    call_count = requests_mock.call_count
+
+    cluster_snapshot = ClusterSnapshot(proxmox_connection)
+
+    # Pools are listed with one call, then fetched with one call each
+
+    assert requests_mock.call_count - call_count == 3
+
+    # Results are in order of pools, regardless of order of completion
+
+    assert cluster_snapshot.pools_names == [
+        proxmox_pools[0].name,
+        proxmox_pools[1].name,
+    ]
+    assert [
+        member["vmid"]
+        for member in cluster_snapshot.get_members(proxmox_pools[0].name)
+    ] == [proxmox_members[0].vm_id, proxmox_members[1].vm_id]
+    assert [
+        member["vmid"]
+        for member in cluster_snapshot.get_members(proxmox_pools[1].name)
+    ] == [proxmox_members[2].vm_id]
+
+
+def test_cluster_snapshot_members_from_pools_skips_storages(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+    proxmox_connection: ProxmoxAPI,
+    proxmox_pools: List[ProxmoxPool],
+) -> None:
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", False)
+
+    requests_mock.get(
+        f"{proxmox_api_mock}/pools/{proxmox_pools[0].name}",
+        json={
+            "data": {
+                "members": [
+                    {
+                        "id": "storage/proxmox01/local",
+                        "node": "proxmox01",
+                        "status": "available",
+                        "storage": "local",
+                        "type": "storage",
+                    }
+                ]
+            }
+        },
+    )
+
+    cluster_snapshot = ClusterSnapshot(proxmox_connection)
+
+    assert cluster_snapshot.get_members(proxmox_pools[0].name) == []
+
+
+def test_api_session_pool_size(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "PROXMOX_MAX_CONCURRENCY", 16)
+
+    session = API()._store["session"]
+
+    assert (
+        session.get_adapter("https://pve-test").poolmanager.connection_pool_kw[
+            "maxsize"
+        ]
+        == 16
+    )
+
+
+def test_api_token(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    proxmox_pools: List[ProxmoxPool],
+) -> None:
+    mocker.patch.object(settings, "PROXMOX_TOKEN_NAME", "monitoring")
+    mocker.patch.object(settings, "PROXMOX_TOKEN_VALUE", "secret")
+
+    proxmox_connection = API()
+
+    assert requests_mock.call_count == 0
+
+    proxmox_connection.pools.get()
+
+    assert (
+        requests_mock.request_history[0].headers["Authorization"]
+        == "PVEAPIToken=guest@pve!monitoring=secret"
+    )
+
+
+def test_api_ticket_cache(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    requests_mock: Mocker,
+    proxmox_pools: List[ProxmoxPool],
+) -> None:
+    path = tmp_path / "ticket.json"
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", str(path))
+
+    # Log in, and cache ticket
+
+    API()
+
+    assert requests_mock.call_count == 1
+    assert requests_mock.request_history[0].method == "POST"
+
+    assert path.stat().st_mode & 0o777 == 0o600
+
+    cache = json.loads(path.read_text())
+
+    assert cache["username"] == "guest@pve"
+    assert cache["ticket"] == "ticket"
+    assert cache["csrf_prevention_token"] == "CSRFPreventionToken"
+
+    # Use cached ticket
+
+    proxmox_connection = API()
+    proxmox_connection.pools.get()
+
+    assert requests_mock.call_count == 2
+    assert requests_mock.request_history[1].method == "GET"
+    assert (
+        requests_mock.request_history[1].headers["Cookie"]
+        == "PVEAuthCookie=ticket"
+    )
+
+
+def test_api_ticket_cache_renews_ticket(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    requests_mock: Mocker,
+    proxmox_pools: List[ProxmoxPool],
+) -> None:
+    path = tmp_path / "ticket.json"
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", str(path))
+
+    API()
+
+    # Age ticket past renew age, but not past maximum age of cache
+
+    cache = json.loads(path.read_text())
+    cache["created_at"] -= 4000
+    path.write_text(json.dumps(cache))
+
+    proxmox_connection = API()
+
+    assert requests_mock.call_count == 1
+
+    proxmox_connection.pools.get()
+
+    assert requests_mock.call_count == 3
+    assert requests_mock.request_history[1].method == "POST"
+    assert "password=ticket" in requests_mock.request_history[1].text
+
+    assert json.loads(path.read_text())["created_at"] > cache["created_at"]
+
+
+@pytest.mark.parametrize(
+    "key,value,mode",
+    [
+        ("created_at", 0, 0o600),
+        ("created_at", None, 0o600),
+        ("ticket", None, 0o600),
+        ("username", "root@pam", 0o600),
+        ("base_url", "https://pve-other:8006/api2/json", 0o600),
+        (None, None, 0o644),
+    ],
+)
+def test_api_ticket_cache_not_used(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    requests_mock: Mocker,
+    key: Optional[str],
+    value: Any,
+    mode: int,
+) -> None:
+    path = tmp_path / "ticket.json"
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", str(path))
+
+    API()
+
+    cache = json.loads(path.read_text())
+
+    # Keys without value are left out
+
+    if key and value is None:
+        del cache[key]
+    elif key:
+        cache[key] = value
+
+    path.write_text(json.dumps(cache))
+    path.chmod(mode)
+
+    API()
+
+    assert [request.method for request in requests_mock.request_history] == [
+        "POST",
+        "POST",
+    ]
+
+
+@pytest.mark.parametrize("content", ["", "[]", "null", '"ticket"'])
+def test_api_ticket_cache_invalid(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    requests_mock: Mocker,
+    content: str,
+) -> None:
+    path = tmp_path / "ticket.json"
+    path.write_text(content)
+    path.chmod(0o600)
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", str(path))
+
+    API()
+
+    assert requests_mock.call_count == 1
+    assert json.loads(path.read_text())["ticket"] == "ticket"
+
+
+def get_pools_response(request: Any, context: Any) -> Dict[str, Any]:
+    """Reject tickets other than the one that login returns."""
+    if request.headers["Cookie"] != "PVEAuthCookie=ticket":
+        context.status_code = 401
+
+        return {"data": None}
+
+    return {"data": []}
+
+
+def test_api_ticket_cache_rejected(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+) -> None:
+    path = tmp_path / "ticket.json"
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", str(path))
+
+    requests_mock.get(f"{proxmox_api_mock}/pools", json=get_pools_response)
+
+    API()
+
+    # Cached ticket was revoked
+
+    cache = json.loads(path.read_text())
+    cache["ticket"] = "revoked"
+    path.write_text(json.dumps(cache))
+
+    assert API().pools.get() == []
+
+    assert [request.method for request in requests_mock.request_history] == [
+        "POST",
+        "GET",
+        "POST",
+        "GET",
+    ]
+    assert "password=guest" in requests_mock.request_history[2].text
+    assert json.loads(path.read_text())["ticket"] == "ticket"
+
+
+def test_api_ticket_cache_rejected_once(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    requests_mock: Mocker,
+    proxmox_api_mock: str,
+) -> None:
+    path = tmp_path / "ticket.json"
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", str(path))
+
+    requests_mock.get(f"{proxmox_api_mock}/pools", status_code=401)
+
+    proxmox_connection = API()
+
+    with pytest.raises(ResourceException):
+        proxmox_connection.pools.get()
+
+    assert [request.method for request in requests_mock.request_history] == [
+        "POST",
+        "GET",
+        "POST",
+        "GET",
+    ]
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """Count connections, and fail the first requests if asked to."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def setup(self) -> None:
+        super().setup()
+
+        with self.server.lock:  # type: ignore[attr-defined]
+            self.server.connections += 1  # type: ignore[attr-defined]
+
+    def do_GET(self) -> None:
+        with self.server.lock:  # type: ignore[attr-defined]
+            fail = self.server.failures > 0  # type: ignore[attr-defined]
+            self.server.failures -= 1  # type: ignore[attr-defined]
+
+        body = b'{"data": []}'
+
+        self.send_response(503 if fail else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def keep_alive_server() -> Generator[ThreadingHTTPServer, None, None]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    server.lock = threading.Lock()  # type: ignore[attr-defined]
+    server.connections = 0  # type: ignore[attr-defined]
+    server.failures = 0  # type: ignore[attr-defined]
+
+    thread = threading.Thread(
+        target=server.serve_forever, args=(0.01,), daemon=True
+    )
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_transport_adapter(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "PROXMOX_CONNECTION_POOL_SIZE", 4)
+    mocker.patch.object(settings, "PROXMOX_RETRIES", 5)
+
+    adapter = get_transport_adapter()
+
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == 4
+    assert adapter.max_retries.total == 5
+    assert adapter.max_retries.status_forcelist == [500, 502, 503, 504]
+
+
+def test_transport_adapter_default_timeout(mocker: MockerFixture) -> None:
+    send = mocker.patch.object(HTTPAdapter, "send")
+
+    adapter = get_transport_adapter()
+    request = requests.Request("GET", "https://pve-test:8006/").prepare()
+
+    adapter.send(request, timeout=None)
+    adapter.send(request, timeout=1)
+
+    assert send.call_args_list[0].kwargs["timeout"] == (5, 30)
+    assert send.call_args_list[1].kwargs["timeout"] == 1
+
+
+def test_api_keep_alive(mocker: MockerFixture) -> None:
+    assert API()._store["session"].headers["Connection"] == "keep-alive"
+
+    mocker.patch.object(settings, "PROXMOX_KEEP_ALIVE", False)
+
+    assert API()._store["session"].headers["Connection"] == "close"
+
+
+def test_transport_adapter_connections_per_worker(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    keep_alive_server: ThreadingHTTPServer,
+) -> None:
+    requests_mock.real_http = True
+
+    mocker.patch.object(settings, "PROXMOX_MAX_CONCURRENCY", 4)
+
+    session = requests.Session()
+    session.mount("http://", get_transport_adapter())
+
+    url = f"http://127.0.0.1:{keep_alive_server.server_address[1]}/"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(lambda _: session.get(url), range(20)))
+
+    assert all(response.status_code == 200 for response in responses)
+
+    # Connections (and so handshakes) are reused, so there is at most one per
+    # worker instead of one per request
+
+    assert keep_alive_server.connections <= 4  # type: ignore[attr-defined]
+
+
+def test_transport_adapter_retries(
+    mocker: MockerFixture,
+    requests_mock: Mocker,
+    keep_alive_server: ThreadingHTTPServer,
+) -> None:
+    requests_mock.real_http = True
+
+    mocker.patch.object(settings, "PROXMOX_RETRY_BACKOFF_FACTOR", 0)
+
+    keep_alive_server.failures = 2  # type: ignore[attr-defined]
+
+    session = requests.Session()
+    session.mount("http://", get_transport_adapter())
+
+    response = session.get(
+        f"http://127.0.0.1:{keep_alive_server.server_address[1]}/"
+    )
+
+    assert response.status_code == 200
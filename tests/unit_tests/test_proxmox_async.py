@@ -0,0 +1,511 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Generator, List, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from pytest_mock import MockerFixture  # type: ignore[attr-defined]
+
+from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.crud import proxmox_member
+from virtualisation_resource_distributor.daemon import Daemon
+from virtualisation_resource_distributor.database import DatabaseSession
+from virtualisation_resource_distributor.profiling import Profiler
+from virtualisation_resource_distributor.proxmox import (
+    read_ticket_cache,
+    write_ticket_cache,
+)
+
+httpx = pytest.importorskip("httpx")
+
+from virtualisation_resource_distributor.proxmox_async import (  # noqa: E402
+    TICKET_RENEW_AGE,
+    AsyncAPI,
+    get_base_url,
+    get_cluster_snapshot,
+)
+
+MEMBERS = [
+    {
+        "id": "qemu/100",
+        "maxcpu": 4,
+        "maxdisk": 34359738368,
+        "maxmem": 8589934592,
+        "name": "vm01.example.com",
+        "node": "proxmox01",
+        "pool": "important",
+        "status": "running",
+        "type": "qemu",
+        "vmid": 100,
+    },
+    {
+        "id": "lxc/101",
+        "maxcpu": 4,
+        "maxdisk": 34359738368,
+        "maxmem": 8589934592,
+        "name": "ct01.example.com",
+        "node": "proxmox02",
+        "pool": "critical",
+        "status": "running",
+        "type": "lxc",
+        "vmid": 101,
+    },
+    {
+        "id": "qemu/102",
+        "maxcpu": 4,
+        "maxdisk": 34359738368,
+        "maxmem": 8589934592,
+        "name": "vm02.example.com",
+        "node": "proxmox02",
+        "status": "running",
+        "type": "qemu",
+        "vmid": 102,
+    },
+]
+
+
+class ProxmoxStubHandler(BaseHTTPRequestHandler):
+    """Mimic the parts of the Proxmox API that are used."""
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _respond(self, status: int, data: Any) -> None:
+        body = json.dumps({"data": data}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        length = int(self.headers["Content-Length"])
+        data = parse_qs(self.rfile.read(length).decode())
+
+        self.server.requests.append(("POST", self.path, data))  # type: ignore[attr-defined]
+
+        if data["password"][0] not in ("guest", "ticket"):
+            self._respond(401, None)
+
+            return
+
+        self._respond(
+            200,
+            {
+                "ticket": "ticket",
+                "CSRFPreventionToken": "CSRFPreventionToken",
+                "username": data["username"][0],
+            },
+        )
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        path = url.path[len("/api2/json/") :]
+
+        self.server.requests.append(("GET", self.path, parse_qs(url.query)))  # type: ignore[attr-defined]
+
+        if "PVEAuthCookie=ticket" not in self.headers.get(
+            "Cookie", ""
+        ) and self.headers.get("Authorization") != (
+            "PVEAPIToken=guest@pve!monitoring=secret"
+        ):
+            self._respond(401, None)
+
+            return
+
+        # Fails twice, like a node that is restarting
+
+        if (
+            path == "pools/unstable"
+            and [
+                request[1] for request in self.server.requests  # type: ignore[attr-defined]
+            ].count(self.path)
+            <= 2
+        ):
+            self._respond(503, None)
+        elif path == "pools":
+            self._respond(
+                200, [{"poolid": "important"}, {"poolid": "critical"}]
+            )
+        elif path == "cluster/resources":
+            self._respond(200, MEMBERS)
+        elif path.startswith("pools/"):
+            pool_name = path[len("pools/") :]
+
+            self._respond(
+                200,
+                {
+                    "members": [
+                        m for m in MEMBERS if m.get("pool") == pool_name
+                    ]
+                    + [
+                        {
+                            "id": "storage/proxmox01/local",
+                            "node": "proxmox01",
+                            "storage": "local",
+                            "type": "storage",
+                        }
+                    ]
+                },
+            )
+        else:
+            self._respond(404, None)
+
+
+@pytest.fixture
+def proxmox_stub_server() -> Generator[
+    Tuple[str, List[Tuple[str, str, Dict[str, List[str]]]]], None, None
+]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProxmoxStubHandler)
+    server.requests = []  # type: ignore[attr-defined]
+
+    thread = threading.Thread(
+        target=server.serve_forever, args=(0.01,), daemon=True
+    )
+    thread.start()
+
+    yield (
+        f"http://127.0.0.1:{server.server_address[1]}/api2/json",
+        server.requests,  # type: ignore[attr-defined]
+    )
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_base_url(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "PROXMOX_HOST", "pve-test")
+
+    assert get_base_url() == "https://pve-test:8006/api2/json"
+
+    mocker.patch.object(settings, "PROXMOX_HOST", "pve-test:443")
+
+    assert get_base_url() == "https://pve-test:443/api2/json"
+
+
+def test_get_cluster_snapshot_from_cluster_resources(
+    mocker: MockerFixture,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", True)
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            return await get_cluster_snapshot(api)
+
+    cluster_snapshot = asyncio.run(main())
+
+    assert [method for method, _, _ in requests] == ["POST", "GET", "GET"]
+    assert requests[2][2] == {"type": ["vm"]}
+
+    assert cluster_snapshot.pools_names == ["important", "critical"]
+
+    members = proxmox_member.get_by_pool(cluster_snapshot, "important")
+
+    assert [member.vm_id for member in members] == [100]
+    assert [
+        member["vmid"] for member in cluster_snapshot.get_members("critical")
+    ] == [101]
+
+
+def test_get_cluster_snapshot_from_pools(
+    mocker: MockerFixture,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    mocker.patch.object(settings, "PROXMOX_USE_CLUSTER_RESOURCES", False)
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            return await get_cluster_snapshot(api)
+
+    cluster_snapshot = asyncio.run(main())
+
+    assert sorted(path for _, path, _ in requests[2:]) == [
+        "/api2/json/pools/critical",
+        "/api2/json/pools/important",
+    ]
+
+    assert [
+        member["vmid"] for member in cluster_snapshot.get_members("important")
+    ] == [100]
+    assert [
+        member["vmid"] for member in cluster_snapshot.get_members("critical")
+    ] == [101]
+
+
+def test_async_api_renews_ticket(
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]]
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    async def main() -> None:
+        async with AsyncAPI(base_url) as api:
+            api._ticket_time = time.monotonic() - TICKET_RENEW_AGE
+
+            await api.get_pools()
+
+    asyncio.run(main())
+
+    assert [method for method, _, _ in requests] == ["POST", "POST", "GET"]
+    assert requests[1][2]["password"] == ["ticket"]
+
+
+def test_async_api_renews_ticket_once_for_concurrent_requests(
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]]
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    async def main() -> None:
+        async with AsyncAPI(base_url) as api:
+            api._ticket_time = time.monotonic() - TICKET_RENEW_AGE
+
+            await asyncio.gather(
+                *(api.get_pool("important") for _ in range(50))
+            )
+
+    asyncio.run(main())
+
+    # Logging in, then one renewal
+
+    assert [method for method, _, _ in requests[1:]].count("POST") == 1
+    assert [method for method, _, _ in requests[1:]].count("GET") == 50
+
+
+def test_async_api_login_failed(
+    mocker: MockerFixture,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, _ = proxmox_stub_server
+
+    mocker.patch.object(settings, "PROXMOX_PASSWORD", "wrong")
+
+    async def main() -> None:
+        async with AsyncAPI(base_url):
+            pass
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main())
+
+
+def test_async_api_logs_in_on_first_request(
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]]
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    async def main() -> Any:
+        api = AsyncAPI(base_url)
+
+        try:
+            return await api.get_pool("important")
+        finally:
+            await api.__aexit__(None, None, None)
+
+    pool = asyncio.run(main())
+
+    assert [method for method, _, _ in requests] == ["POST", "GET"]
+    assert [member["vmid"] for member in pool["members"][:1]] == [100]
+
+
+def test_async_api_token(
+    mocker: MockerFixture,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    mocker.patch.object(settings, "PROXMOX_TOKEN_NAME", "monitoring")
+    mocker.patch.object(settings, "PROXMOX_TOKEN_VALUE", "secret")
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            return await api.get_pools()
+
+    pools = asyncio.run(main())
+
+    assert [method for method, _, _ in requests] == ["GET"]
+    assert [pool["poolid"] for pool in pools] == ["important", "critical"]
+
+
+def test_async_api_retries_server_errors(
+    mocker: MockerFixture,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    mocker.patch.object(settings, "PROXMOX_RETRY_BACKOFF_FACTOR", 0)
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            return await api.get_pool("unstable")
+
+    pool = asyncio.run(main())
+
+    assert [member["type"] for member in pool["members"]] == ["storage"]
+
+    assert [path for _, path, _ in requests[1:]] == [
+        "/api2/json/pools/unstable"
+    ] * 3
+
+
+def test_async_api_retries_server_errors_limited(
+    mocker: MockerFixture,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    mocker.patch.object(settings, "PROXMOX_RETRIES", 1)
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            return await api.get_pool("unstable")
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main())
+
+    assert len(requests[1:]) == 2
+
+
+def test_async_api_logs_in_when_ticket_rejected(
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]]
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            api.set_ticket("rejected", time.monotonic())
+
+            return await api.get_pools()
+
+    pools = asyncio.run(main())
+
+    assert [method for method, _, _ in requests] == [
+        "POST",
+        "GET",
+        "POST",
+        "GET",
+    ]
+    assert requests[2][2]["password"] == ["guest"]
+    assert [pool["poolid"] for pool in pools] == ["important", "critical"]
+
+
+def test_async_api_uses_ticket_cache(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    path = str(tmp_path / "ticket.json")
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", path)
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            return await api.get_pools()
+
+    asyncio.run(main())
+
+    cache = read_ticket_cache(path, base_url)
+
+    assert cache is not None
+    assert cache["ticket"] == "ticket"
+
+    # Second connection uses cached ticket
+
+    asyncio.run(main())
+
+    assert [method for method, _, _ in requests] == ["POST", "GET", "GET"]
+
+
+def test_async_api_deletes_rejected_ticket_cache(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    path = str(tmp_path / "ticket.json")
+
+    mocker.patch.object(settings, "PROXMOX_TICKET_CACHE_PATH", path)
+
+    write_ticket_cache(
+        path, base_url, "rejected", "CSRFPreventionToken", time.time()
+    )
+
+    async def main() -> Any:
+        async with AsyncAPI(base_url) as api:
+            return await api.get_pools()
+
+    asyncio.run(main())
+
+    assert [method for method, _, _ in requests] == ["GET", "POST", "GET"]
+    assert requests[1][2]["password"] == ["guest"]
+
+    cache = read_ticket_cache(path, base_url)
+
+    assert cache is not None
+    assert cache["ticket"] == "ticket"
+
+
+def test_async_api_records_requests(
+    mocker: MockerFixture,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, _ = proxmox_stub_server
+
+    profiler = Profiler()
+    profiler.enabled = True
+
+    mocker.patch(
+        "virtualisation_resource_distributor.proxmox_async.profiler", profiler
+    )
+
+    async def main() -> None:
+        async with AsyncAPI(base_url) as api:
+            await get_cluster_snapshot(api)
+
+    asyncio.run(main())
+
+    # Logging in is not recorded, like with the synchronous client
+
+    assert profiler.requests_count == 3
+    assert set(profiler.phases) == {"pool listing", "member fetch"}
+
+
+def test_daemon_poll_async(
+    mocker: MockerFixture,
+    tmp_path: Path,
+    database_session: DatabaseSession,
+    proxmox_stub_server: Tuple[str, List[Tuple[str, str, Dict]]],
+) -> None:
+    base_url, requests = proxmox_stub_server
+
+    mocker.patch.object(settings, "DAEMON_ASYNC", True)
+    mocker.patch(
+        "virtualisation_resource_distributor.proxmox_async.get_base_url",
+        return_value=base_url,
+    )
+
+    path = tmp_path / "result.json"
+
+    daemon = Daemon(database_session, None, str(path))
+
+    assert daemon.poll() == []
+
+    assert sorted(path for _, path, _ in requests[2:]) == [
+        "/api2/json/pools/critical",
+        "/api2/json/pools/important",
+    ]
+    assert daemon.pools_fingerprints.keys() == {"important", "critical"}
+    assert (
+        json.loads(path.read_text())["pools_names_with_members_to_migrate"]
+        == []
+    )
@@ -0,0 +1,63 @@
+import subprocess
+import sys
+from typing import Dict, List
+
+import pytest
+
+PROXMOX_MODULES_NAMES = ["proxmoxer", "requests", "urllib3"]
+
+
+def get_imports_times(args: List[str]) -> Dict[str, int]:
+    """Call CLI with '-X importtime', and get cumulative import time (in us) per module."""
+    stderr = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            "import sys\n"
+            "from virtualisation_resource_distributor import CLI\n"
+            "sys.argv = ['virtualisation-resource-distributor', *sys.argv[1:]]\n"
+            "CLI.main()",
+            *args,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+
+    imports_times = {}
+
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+
+        imports_times[name.strip()] = int(cumulative)
+
+    return imports_times
+
+
+def test_startup_help_imports_nothing_heavy() -> None:
+    imports_times = get_imports_times(["--help"])
+
+    for name in ["sqlalchemy", "pydantic", *PROXMOX_MODULES_NAMES]:
+        assert name not in imports_times
+
+
+@pytest.mark.parametrize(
+    "args", [["zones", "list"], ["nodes", "list", "--format=json"]]
+)
+def test_startup_database_commands_do_not_import_proxmox(
+    args: List[str],
+) -> None:
+    imports_times = get_imports_times(args)
+
+    assert "sqlalchemy" in imports_times
+
+    for name in [
+        "virtualisation_resource_distributor.proxmox",
+        *PROXMOX_MODULES_NAMES,
+    ]:
+        assert name not in imports_times
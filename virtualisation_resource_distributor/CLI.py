@@ -1,30 +1,62 @@
 """Virtualisation Resource Distributor.
 
 Usage:
-   virtualisation-resource-distributor run
-   virtualisation-resource-distributor nodes list
+   virtualisation-resource-distributor run [--format=<format>] [--profile] [--profile-format=<format>]
+   virtualisation-resource-distributor daemon
+   virtualisation-resource-distributor plan [--profile] [--profile-format=<format>]
+   virtualisation-resource-distributor nodes list [--format=<format>]
    virtualisation-resource-distributor nodes create --name=<name> --zone-name=<zone-name>
    virtualisation-resource-distributor nodes delete --name=<name>
-   virtualisation-resource-distributor zones list
+   virtualisation-resource-distributor nodes sync [--zone-name=<zone-name>]
+   virtualisation-resource-distributor zones list [--format=<format>]
    virtualisation-resource-distributor zones create --name=<name>
    virtualisation-resource-distributor zones delete --name=<name>
+   virtualisation-resource-distributor topology export
+   virtualisation-resource-distributor topology import --path=<path>
 
 Options:
-  -h --help     Show this screen.
+  -h --help                  Show this screen.
+  --format=<format>          Output format: text, json, ndjson or csv [default: text].
+  --profile                  Print time and calls per phase to stderr.
+  --profile-format=<format>  Format of profile: table or json [default: table].
 """
 
+import json
 import sys
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List
 
 import docopt
 from schema import Or, Schema
 
-from virtualisation_resource_distributor import crud, proxmox
-from virtualisation_resource_distributor.config import get_exclude_pools_names
-from virtualisation_resource_distributor.database import DatabaseSession
-from virtualisation_resource_distributor.schemas import (
-    DatabaseNodeCreate,
-    DatabaseZoneCreate,
+from virtualisation_resource_distributor import crud
+from virtualisation_resource_distributor.output import (
+    FORMAT_CSV,
+    FORMAT_NDJSON,
+    FORMAT_TEXT,
+    write_records,
 )
+from virtualisation_resource_distributor.profiling import (
+    FORMAT_JSON,
+    FORMAT_TABLE,
+    profiler,
+)
+
+# Other modules are imported by the commands that use them, so that
+# commands don't import (and set up) what they don't need, such as the
+# Proxmox API client for database-only commands
+
+if TYPE_CHECKING:
+    from virtualisation_resource_distributor import proxmox
+    from virtualisation_resource_distributor.schemas import (
+        DatabaseTopology,
+        DatabaseTopologyChanges,
+        DatabaseTopologyDefinition,
+        ProxmoxPoolSpread,
+    )
+
+NODE_FIELDS = ["id", "name", "zone_id", "zone_name"]
+ZONE_FIELDS = ["id", "name", "nodes_names"]
 
 """Program to distribute Virtual Machines and Containers over Proxmox zones."""
 
@@ -34,6 +66,84 @@ def get_args() -> docopt.Dict:
     return docopt.docopt(__doc__)
 
 
+def read_topology_definition(path: str) -> "DatabaseTopologyDefinition":
+    """Read topology definition from JSON file, or YAML file if the extension is '.yaml' or '.yml'."""
+    from virtualisation_resource_distributor.schemas import (
+        DatabaseTopologyDefinition,
+    )
+
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            # Requires the 'yaml' extra
+
+            import yaml
+
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    return DatabaseTopologyDefinition.parse_obj(data)
+
+
+def print_topology_changes(changes: "DatabaseTopologyChanges") -> None:
+    """Print created, moved and deleted zones and nodes."""
+    for name in changes.created_zones_names:
+        print(f"Created zone '{name}'")
+
+    for name in changes.created_nodes_names:
+        print(f"Created node '{name}'")
+
+    for name in changes.updated_nodes_names:
+        print(f"Moved node '{name}' to other zone")
+
+    for name in changes.deleted_nodes_names:
+        print(f"Deleted node '{name}'")
+
+    for name in changes.deleted_zones_names:
+        print(f"Deleted zone '{name}'")
+
+
+def get_pools_records(
+    database_topology: "DatabaseTopology",
+    cluster_snapshot: "proxmox.ClusterSnapshot",
+    pools_spreads: List["ProxmoxPoolSpread"],
+) -> Iterator[Dict[str, Any]]:
+    """Evaluate pools at once, and yield record per pool.
+
+    Spreads of pools that are not excluded are appended to 'pools_spreads'.
+    """
+    from virtualisation_resource_distributor.config import (
+        get_exclude_pools_names,
+        settings,
+    )
+
+    pools = crud.proxmox_pool.get_multiple(cluster_snapshot)
+    spreads = iter(
+        crud.proxmox_pool.get_spreads(
+            database_topology,
+            cluster_snapshot,
+            [
+                pool.name
+                for pool in pools
+                if pool.name not in get_exclude_pools_names()
+            ],
+            settings.SPREAD_WEIGHT,
+        )
+    )
+
+    for pool in pools:
+        if pool.name in get_exclude_pools_names():
+            yield {"name": pool.name, "excluded": True}
+
+            continue
+
+        spread = next(spreads)
+
+        pools_spreads.append(spread)
+
+        yield {**spread.dict(), "excluded": False}
+
+
 def main() -> None:
     """Spawn relevant class for CLI function."""
 
@@ -43,65 +153,208 @@ def main() -> None:
     schema = Schema(
         {
             "run": bool,
+            "daemon": bool,
+            "plan": bool,
             "nodes": bool,
             "zones": bool,
             "list": bool,
             "create": bool,
             "delete": bool,
+            "sync": bool,
             "--name": Or(str, None),
             "--zone-name": Or(str, None),
+            "topology": bool,
+            "export": bool,
+            "import": bool,
+            "--path": Or(str, None),
+            "--format": Or(
+                FORMAT_TEXT, FORMAT_JSON, FORMAT_NDJSON, FORMAT_CSV
+            ),
+            "--profile": bool,
+            "--profile-format": Or(FORMAT_TABLE, FORMAT_JSON),
         }
     )
     args = schema.validate(args)
 
+    # Settings are read, and engines are created, on import
+
+    from virtualisation_resource_distributor.config import settings
+    from virtualisation_resource_distributor.database import (
+        DatabaseSession,
+        ReadOnlyDatabaseSession,
+        engine,
+        read_only_engine,
+    )
+
     # Run classes
+    # Commands that only read use a read-only connection, so they never
+    # contend for the write lock
+
+    if args["run"] or args["plan"] or args["daemon"]:
+        database_session = ReadOnlyDatabaseSession()
+    else:
+        database_session = DatabaseSession()
 
-    database_session = DatabaseSession()
+    if args["--profile"]:
+        profiler.enable(engine, read_only_engine)
 
     if args["run"]:
-        proxmox_api = proxmox.API()
+        from virtualisation_resource_distributor import proxmox
+        from virtualisation_resource_distributor.schemas import (
+            ProxmoxPoolSpread,
+            ProxmoxPoolWeightedSpread,
+        )
+
+        start_time = time.perf_counter()
+
+        cluster_snapshot = proxmox.ClusterSnapshot(proxmox.API())
+
+        with profiler.phase("zone resolution"):
+            database_topology = crud.database_topology.get(database_session)
+
+        pools_spreads: List[ProxmoxPoolSpread] = []
+        pools_records = get_pools_records(
+            database_topology, cluster_snapshot, pools_spreads
+        )
+
+        with profiler.phase("decision"):
+            if args["--format"] == FORMAT_TEXT:
+                for record in pools_records:
+                    if record["excluded"]:
+                        print(
+                            f"Pool '{record['name']}' has members to migrate, but is excluded"
+                        )
+            else:
+                write_records(
+                    pools_records,
+                    args["--format"],
+                    [
+                        *(
+                            ProxmoxPoolWeightedSpread
+                            if settings.SPREAD_WEIGHT
+                            else ProxmoxPoolSpread
+                        ).__fields__,
+                        "excluded",
+                    ],
+                )
 
-        pools = crud.proxmox_pool.get_multiple(proxmox_api)
-        pools_names_with_members_to_migrate = []
+        pools_names_with_members_to_migrate = [
+            spread.name
+            for spread in pools_spreads
+            if spread.has_members_to_migrate
+        ]
+        pools_names_with_members_to_migrate_between_nodes = [
+            spread.name
+            for spread in pools_spreads
+            if spread.has_members_to_migrate_between_nodes
+        ]
+        unknown_nodes_names = {
+            node_name
+            for spread in pools_spreads
+            for node_name in spread.unknown_nodes_names
+        }
 
-        for pool in pools:
-            if pool.name in get_exclude_pools_names():
+        for node_name in sorted(unknown_nodes_names):
+            print(
+                f"Node '{node_name}' is unknown, so its members are left out. Add it with 'nodes create' or 'nodes sync'",
+                file=sys.stderr,
+            )
+
+        if args["--format"] == FORMAT_TEXT:
+            for pool_name in pools_names_with_members_to_migrate:
+                print(f"Pool '{pool_name}' has members to migrate")
+
+            for pool_name in pools_names_with_members_to_migrate_between_nodes:
                 print(
-                    f"Pool '{pool.name}' has members to migrate, but is excluded"
+                    f"Pool '{pool_name}' has members to migrate between nodes"
                 )
 
-                continue
+        if settings.METRICS_PATH:
+            from virtualisation_resource_distributor.metrics import metrics
 
-            if not crud.proxmox_pool.get_has_members_to_migrate(
-                database_session, proxmox_api, pool.name
-            ):
-                continue
+            metrics.run_duration.observe(time.perf_counter() - start_time)
+            metrics.write(settings.METRICS_PATH, pools_spreads)
 
-            pools_names_with_members_to_migrate.append(pool.name)
+        if args["--profile"]:
+            profiler.print_summary(args["--profile-format"])
 
-        if not pools_names_with_members_to_migrate:
+        if (
+            not pools_names_with_members_to_migrate
+            and not pools_names_with_members_to_migrate_between_nodes
+        ):
             sys.exit(0)
 
-        for pool_name in pools_names_with_members_to_migrate:
-            print(f"Pool '{pool_name}' has members to migrate")
-
         sys.exit(78)
 
-    if args["nodes"]:
-        if args["list"]:
-            nodes = crud.database_node.get_multiple(database_session)
+    if args["daemon"]:
+        from virtualisation_resource_distributor import proxmox
+        from virtualisation_resource_distributor.daemon import Daemon
+
+        Daemon(
+            database_session,
+            None if settings.DAEMON_ASYNC else proxmox.API(),
+            settings.DAEMON_RESULT_PATH,
+        ).run(settings.DAEMON_INTERVAL)
+
+    if args["plan"]:
+        from virtualisation_resource_distributor import proxmox
+        from virtualisation_resource_distributor.config import (
+            get_exclude_pools_names,
+        )
+
+        cluster_snapshot = proxmox.ClusterSnapshot(proxmox.API())
 
-            for node in nodes:
-                zone = crud.database_zone.get(
-                    database_session, id=node.zone_id
+        with profiler.phase("zone resolution"):
+            database_topology = crud.database_topology.get(database_session)
+
+        migrations = []
+
+        with profiler.phase("decision"):
+            for pool in crud.proxmox_pool.get_multiple(cluster_snapshot):
+                if pool.name in get_exclude_pools_names():
+                    continue
+
+                migrations.extend(
+                    crud.proxmox_pool.get_migrations(
+                        database_topology, cluster_snapshot, pool.name
+                    )
                 )
 
-                print(f"- {node.name} (ID {node.id})")
-                print(f"\tZone: {zone.name} (ID {zone.id})")
+        print(json.dumps([migration.dict() for migration in migrations]))
 
-                print("")
+        if args["--profile"]:
+            profiler.print_summary(args["--profile-format"])
+
+    if args["nodes"]:
+        if args["list"]:
+            nodes = crud.database_node.get_multiple_with_zone(database_session)
+
+            if args["--format"] != FORMAT_TEXT:
+                write_records(
+                    (
+                        {
+                            "id": node.id,
+                            "name": node.name,
+                            "zone_id": node.zone.id,
+                            "zone_name": node.zone.name,
+                        }
+                        for node in nodes
+                    ),
+                    args["--format"],
+                    NODE_FIELDS,
+                )
+            else:
+                for node in nodes:
+                    print(f"- {node.name} (ID {node.id})")
+                    print(f"\tZone: {node.zone.name} (ID {node.zone.id})")
+
+                    print("")
 
         if args["create"]:
+            from virtualisation_resource_distributor.schemas import (
+                DatabaseNodeCreate,
+            )
+
             name = args["--name"]
             zone_name = args["--zone-name"]
 
@@ -124,24 +377,72 @@ def main() -> None:
                 )[0].id,
             )
 
+        if args["sync"]:
+            from virtualisation_resource_distributor import proxmox
+
+            database_topology = crud.database_topology.get(database_session)
+            nodes_zones_names = {}
+
+            for proxmox_node in crud.proxmox_node.get_multiple(proxmox.API()):
+                zone_name = crud.proxmox_node.get_zone_name(proxmox_node.name)
+                is_new = proxmox_node.name not in database_topology.nodes_zones
+
+                # Zone name option only applies to new nodes
+
+                if zone_name is None and is_new:
+                    zone_name = args["--zone-name"]
+
+                if zone_name is None:
+                    if is_new:
+                        print(
+                            f"Node '{proxmox_node.name}' is skipped, as its zone is unknown",
+                            file=sys.stderr,
+                        )
+
+                    continue
+
+                nodes_zones_names[proxmox_node.name] = zone_name
+
+            print_topology_changes(
+                crud.database_topology.update_nodes(
+                    database_session, nodes_zones_names=nodes_zones_names
+                )
+            )
+
     if args["zones"]:
         if args["list"]:
-            zones = crud.database_zone.get_multiple(database_session)
+            zones = crud.database_zone.get_multiple_with_nodes(
+                database_session
+            )
 
-            for zone in zones:
-                nodes = crud.database_node.get_multiple(
-                    database_session, filter_parameters=[("zone_id", zone.id)]
+            if args["--format"] != FORMAT_TEXT:
+                write_records(
+                    (
+                        {
+                            "id": zone.id,
+                            "name": zone.name,
+                            "nodes_names": [node.name for node in zone.nodes],
+                        }
+                        for zone in zones
+                    ),
+                    args["--format"],
+                    ZONE_FIELDS,
                 )
+            else:
+                for zone in zones:
+                    print(f"- {zone.name} (ID {zone.id})")
+                    print("\tNodes:")
 
-                print(f"- {zone.name} (ID {zone.id})")
-                print("\tNodes:")
+                    for zone_node in zone.nodes:
+                        print(f"\t{zone_node.name} (ID {zone_node.id})")
 
-                for node in nodes:
-                    print(f"\t{node.name} (ID {node.id})")
-
-                print("")
+                    print("")
 
         if args["create"]:
+            from virtualisation_resource_distributor.schemas import (
+                DatabaseZoneCreate,
+            )
+
             name = args["--name"]
 
             crud.database_zone.create(
@@ -157,3 +458,19 @@ def main() -> None:
                     database_session, filter_parameters=[("name", name)]
                 )[0].id,
             )
+
+    if args["topology"]:
+        if args["export"]:
+            print(
+                crud.database_topology.get_definition(database_session).json(
+                    indent=2
+                )
+            )
+
+        if args["import"]:
+            print_topology_changes(
+                crud.database_topology.update(
+                    database_session,
+                    obj_in=read_topology_definition(args["--path"]),
+                )
+            )
@@ -1,24 +1,53 @@
 """App configuration."""
 
 import os
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseSettings
 
+from virtualisation_resource_distributor.schemas import ProxmoxMemberWeightEnum
+
 
 class Settings(BaseSettings):
     """Settings."""
 
     DATABASE_PATH: str = "/var/lib/virtualisation-resource-distributor.sqlite3"
+    DATABASE_JOURNAL_MODE: Optional[str] = None
+    DATABASE_SYNCHRONOUS: str = "normal"
+    DATABASE_MMAP_SIZE: int = 268435456
+    DATABASE_CACHE_SIZE: int = -8000
 
     PROXMOX_HOST: str = "pve-test:8006"
     PROXMOX_USERNAME: str = "guest"
     PROXMOX_REALM: str = "pve"
     PROXMOX_PASSWORD: str = "guest"
+    PROXMOX_TOKEN_NAME: Optional[str] = None
+    PROXMOX_TOKEN_VALUE: Optional[str] = None
+    PROXMOX_TICKET_CACHE_PATH: Optional[str] = None
     PROXMOX_VERIFY_SSL: bool = True
+    PROXMOX_USE_CLUSTER_RESOURCES: bool = False
+    PROXMOX_MAX_CONCURRENCY: int = 8
+    PROXMOX_CONNECTION_POOL_SIZE: Optional[int] = None
+    PROXMOX_CONNECT_TIMEOUT: float = 5
+    PROXMOX_READ_TIMEOUT: float = 30
+    PROXMOX_RETRIES: int = 3
+    PROXMOX_RETRY_BACKOFF_FACTOR: float = 0.5
+    PROXMOX_KEEP_ALIVE: bool = True
 
     EXCLUDE_POOLS_NAMES: List[str] = []
 
+    NODES_ZONE_NAME_REGEX: Optional[str] = None
+
+    SPREAD_WEIGHT: Optional[ProxmoxMemberWeightEnum] = None
+
+    METRICS_PATH: Optional[str] = None
+
+    DAEMON_INTERVAL: int = 60
+    DAEMON_ASYNC: bool = False
+    DAEMON_RESULT_PATH: str = (
+        "/var/lib/virtualisation-resource-distributor-result.json"
+    )
+
     class Config:
         """Pydantic configuration."""
 
@@ -1,8 +1,48 @@
-"""Import all CRUD objects and override __all__ for easy imports."""
+"""Import CRUD objects on first access and override __all__ for easy imports.
 
-from .crud_database_node import database_node
-from .crud_database_zone import database_zone
-from .crud_proxmox_member import proxmox_member
-from .crud_proxmox_pool import proxmox_pool
+CRUD objects are only imported when used, so commands that only use the
+database don't import the Proxmox API client (and the other way around).
+"""
 
-__all__ = ["database_node", "database_zone", "proxmox_pool", "proxmox_member"]
+import importlib
+from typing import TYPE_CHECKING, Any, Dict
+
+if TYPE_CHECKING:
+    from .crud_database_node import database_node
+    from .crud_database_topology import database_topology
+    from .crud_database_zone import database_zone
+    from .crud_proxmox_member import proxmox_member
+    from .crud_proxmox_node import proxmox_node
+    from .crud_proxmox_pool import proxmox_pool
+
+MODULES_NAMES: Dict[str, str] = {
+    "database_node": "crud_database_node",
+    "database_topology": "crud_database_topology",
+    "database_zone": "crud_database_zone",
+    "proxmox_pool": "crud_proxmox_pool",
+    "proxmox_member": "crud_proxmox_member",
+    "proxmox_node": "crud_proxmox_node",
+}
+
+__all__ = [
+    "database_node",
+    "database_topology",
+    "database_zone",
+    "proxmox_pool",
+    "proxmox_member",
+    "proxmox_node",
+]
+
+
+def __getattr__(name: str) -> Any:
+    """Import CRUD object, and keep it, so later accesses don't get here."""
+    if name not in MODULES_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(
+        importlib.import_module(f".{MODULES_NAMES[name]}", __name__), name
+    )
+
+    globals()[name] = value
+
+    return value
@@ -1,10 +1,9 @@
 """Collection of base CRUD classes for database."""
 
-from typing import Any, Generic, List, Optional, Tuple, Type, TypeVar
+from typing import Any, Generic, Iterable, List, Optional, Tuple, Type, TypeVar
 
 from pydantic import BaseModel
-from sqlalchemy import String, cast, or_
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Query, Session
 
 from virtualisation_resource_distributor.database import Base
 
@@ -12,6 +11,10 @@ ModelType = TypeVar("ModelType", bound=Base)
 SchemaType = TypeVar("SchemaType", bound=BaseModel)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 
+# Amount of objects to load at once when yielding objects
+
+YIELD_PER = 1000
+
 
 class CRUDBaseDatabase(Generic[ModelType, SchemaType, CreateSchemaType]):
     """CRUD object with basic CRUD methods."""
@@ -36,6 +39,44 @@ class CRUDBaseDatabase(Generic[ModelType, SchemaType, CreateSchemaType]):
 
         return self.schema.from_orm(db_obj)
 
+    def create_multiple(
+        self,
+        database_session: Session,
+        *,
+        objs_in: List[CreateSchemaType],
+    ) -> List[SchemaType]:
+        """Create objects in one transaction.
+
+        Objects are loaded with one query after committing, instead of being
+        refreshed one by one.
+        """
+        db_objs = [self.model(**obj_in.dict()) for obj_in in objs_in]
+
+        database_session.add_all(db_objs)
+        database_session.flush()
+
+        ids = [db_obj.id for db_obj in db_objs]
+
+        database_session.commit()
+
+        return self.get_multiple_by_ids(database_session, ids=ids)
+
+    def bulk_create(
+        self,
+        database_session: Session,
+        *,
+        objs_in: List[CreateSchemaType],
+    ) -> None:
+        """Insert objects in one statement, without committing.
+
+        Objects are not loaded, so use this when they are not needed
+        afterwards. The caller commits, so multiple bulk inserts can be done
+        in one transaction.
+        """
+        database_session.bulk_insert_mappings(
+            self.model, [obj_in.dict() for obj_in in objs_in]
+        )
+
     def delete(
         self,
         database_session: Session,
@@ -48,25 +89,75 @@ class CRUDBaseDatabase(Generic[ModelType, SchemaType, CreateSchemaType]):
         database_session.delete(obj)
         database_session.commit()
 
+    def delete_multiple(
+        self,
+        database_session: Session,
+        *,
+        ids: Iterable[int],
+    ) -> None:
+        """Delete objects in one statement and transaction.
+
+        Objects that are already loaded in the session are not expired.
+        """
+        self._get_multiple_query(
+            database_session, filter_parameters=[("id", list(ids))]
+        ).delete(synchronize_session=False)
+
+        database_session.commit()
+
     def get(self, database_session: Session, id: int) -> SchemaType:
         """Get object."""
         return self.schema.from_orm(database_session.query(self.model).get(id))
 
-    def get_multiple(
+    def _get_multiple_query(
         self,
         database_session: Session,
         *,
         filter_parameters: Optional[List[Tuple[Any, Any]]] = None,
-    ) -> List[SchemaType]:
-        """Get objects."""
+    ) -> Query:
+        """Get query for objects.
+
+        Columns are compared without casting them, so that indexes on them are
+        used. A list, tuple or set value matches any of its items. Multiple
+        filter parameters must all match.
+        """
         query = database_session.query(self.model)
 
         if filter_parameters:
             for filter_parameter in filter_parameters:
                 key, value = filter_parameter
 
-                query = query.filter(
-                    or_(cast(self.model.__dict__[key], String) == value)
-                )
+                column = getattr(self.model, key)
+
+                if isinstance(value, (list, tuple, set)):
+                    query = query.filter(column.in_(value))
+                else:
+                    query = query.filter(column == value)
+
+        return query
+
+    def get_multiple(
+        self,
+        database_session: Session,
+        *,
+        filter_parameters: Optional[List[Tuple[Any, Any]]] = None,
+    ) -> List[SchemaType]:
+        """Get objects."""
+        query = self._get_multiple_query(
+            database_session, filter_parameters=filter_parameters
+        )
+
+        return [self.schema.from_orm(i) for i in query]
+
+    def get_multiple_by_ids(
+        self,
+        database_session: Session,
+        *,
+        ids: Iterable[int],
+    ) -> List[SchemaType]:
+        """Get objects in one query, ordered by ID. Non-existent IDs are skipped."""
+        query = self._get_multiple_query(
+            database_session, filter_parameters=[("id", list(ids))]
+        ).order_by(self.model.id)
 
         return [self.schema.from_orm(i) for i in query]
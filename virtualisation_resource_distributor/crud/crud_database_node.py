@@ -1,6 +1,11 @@
 """Collection of object CRUD classes."""
 
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, joinedload
+
 from virtualisation_resource_distributor.crud.base_database import (
+    YIELD_PER,
     CRUDBaseDatabase,
 )
 from virtualisation_resource_distributor.models import (
@@ -10,6 +15,9 @@ from virtualisation_resource_distributor.schemas import (
     DatabaseNode as DatabaseNodeSchema,
 )
 from virtualisation_resource_distributor.schemas import DatabaseNodeCreate
+from virtualisation_resource_distributor.schemas import (
+    DatabaseNodeWithZone as DatabaseNodeWithZoneSchema,
+)
 
 
 class CRUDDatabaseNode(
@@ -17,7 +25,22 @@ class CRUDDatabaseNode(
 ):
     """CRUD methods for object."""
 
-    pass
+    def get_multiple_with_zone(
+        self,
+        database_session: Session,
+        *,
+        filter_parameters: Optional[List[Tuple[Any, Any]]] = None,
+    ) -> Iterator[DatabaseNodeWithZoneSchema]:
+        """Yield objects with their zone, as they are loaded.
+
+        Nodes are loaded in batches, from one query.
+        """
+        query = self._get_multiple_query(
+            database_session, filter_parameters=filter_parameters
+        ).options(joinedload(DatabaseNodeOrm.zone))
+
+        for i in query.yield_per(YIELD_PER):
+            yield DatabaseNodeWithZoneSchema.from_orm(i)
 
 
 database_node = CRUDDatabaseNode(DatabaseNodeOrm, DatabaseNodeSchema)
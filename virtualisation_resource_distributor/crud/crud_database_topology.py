@@ -0,0 +1,309 @@
+"""Collection of object CRUD classes."""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from virtualisation_resource_distributor.crud.crud_database_node import (
+    database_node,
+)
+from virtualisation_resource_distributor.crud.crud_database_zone import (
+    database_zone,
+)
+from virtualisation_resource_distributor.models import (
+    DatabaseNode as DatabaseNodeOrm,
+)
+from virtualisation_resource_distributor.models import (
+    DatabaseZone as DatabaseZoneOrm,
+)
+from virtualisation_resource_distributor.schemas import DatabaseNodeCreate
+from virtualisation_resource_distributor.schemas import (
+    DatabaseTopology as DatabaseTopologySchema,
+)
+from virtualisation_resource_distributor.schemas import (
+    DatabaseTopologyChanges as DatabaseTopologyChangesSchema,
+)
+from virtualisation_resource_distributor.schemas import (
+    DatabaseTopologyDefinition as DatabaseTopologyDefinitionSchema,
+)
+from virtualisation_resource_distributor.schemas import (
+    DatabaseTopologyDefinitionZone as DatabaseTopologyDefinitionZoneSchema,
+)
+from virtualisation_resource_distributor.schemas import (
+    DatabaseZone as DatabaseZoneSchema,
+)
+from virtualisation_resource_distributor.schemas import DatabaseZoneCreate
+
+DatabaseTopologyFingerprint = Tuple[Any, ...]
+
+
+class CRUDDatabaseTopology:
+    """CRUD methods for object.
+
+    The topology is cached in-process, and loaded again when zones or nodes
+    changed. Changes are detected by the amounts of zones and nodes, and
+    their latest 'updated_at', which is set on creation and update.
+    """
+
+    def __init__(self) -> None:
+        """Set attributes."""
+        self._cache: Optional[
+            Tuple[DatabaseTopologyFingerprint, DatabaseTopologySchema]
+        ] = None
+
+    def _get_fingerprint(
+        self, database_session: Session
+    ) -> DatabaseTopologyFingerprint:
+        """Get amounts of zones and nodes, and their latest 'updated_at', in one query."""
+        zones = database_session.query(
+            func.count(DatabaseZoneOrm.id),
+            func.max(DatabaseZoneOrm.updated_at),
+        ).subquery()
+        nodes = (
+            database_session.query(
+                func.count(DatabaseNodeOrm.id),
+                func.max(DatabaseNodeOrm.updated_at),
+            )
+            .join(
+                DatabaseZoneOrm, DatabaseNodeOrm.zone_id == DatabaseZoneOrm.id
+            )
+            .subquery()
+        )
+
+        return tuple(database_session.query(zones, nodes).one())
+
+    def get(self, database_session: Session) -> DatabaseTopologySchema:
+        """Get all zones and the zone of every node.
+
+        When cached, this costs one query that doesn't load rows. Otherwise,
+        zones and nodes are loaded in one query.
+        """
+        if self._cache:
+            fingerprint, database_topology = self._cache
+
+            if self._get_fingerprint(database_session) == fingerprint:
+                return database_topology
+
+        zones: Dict[int, DatabaseZoneSchema] = {}
+        nodes_zones: Dict[str, DatabaseZoneSchema] = {}
+        nodes_updated_ats = []
+
+        query = (
+            database_session.query(
+                DatabaseZoneOrm,
+                DatabaseNodeOrm.name,
+                DatabaseNodeOrm.updated_at,
+            )
+            .outerjoin(
+                DatabaseNodeOrm, DatabaseNodeOrm.zone_id == DatabaseZoneOrm.id
+            )
+            .order_by(DatabaseZoneOrm.id)
+        )
+
+        for zone, node_name, node_updated_at in query:
+            if zone.id not in zones:
+                zones[zone.id] = DatabaseZoneSchema.from_orm(zone)
+
+            # Zones without nodes are joined with NULL
+
+            if node_name is None:
+                continue
+
+            nodes_zones[node_name] = zones[zone.id]
+            nodes_updated_ats.append(node_updated_at)
+
+        database_topology = DatabaseTopologySchema(
+            zones=list(zones.values()), nodes_zones=nodes_zones
+        )
+
+        fingerprint = (
+            len(zones),
+            max((zone.updated_at for zone in zones.values()), default=None),
+            len(nodes_zones),
+            max(nodes_updated_ats, default=None),
+        )
+
+        # 'updated_at' has a resolution of seconds, so changes later in the
+        # current second would not change the fingerprint. Don't cache until
+        # the second has passed.
+
+        if any(
+            updated_at is not None
+            and updated_at >= datetime.utcnow().replace(microsecond=0)
+            for updated_at in (fingerprint[1], fingerprint[3])
+        ):
+            self._cache = None
+        else:
+            self._cache = (fingerprint, database_topology)
+
+        return database_topology
+
+    def get_definition(
+        self, database_session: Session
+    ) -> DatabaseTopologyDefinitionSchema:
+        """Get all zones with names of their nodes, as accepted by 'update'."""
+        database_topology = self.get(database_session)
+
+        zones_nodes_names: Dict[int, List[str]] = {
+            zone.id: [] for zone in database_topology.zones
+        }
+
+        for node_name, zone in database_topology.nodes_zones.items():
+            zones_nodes_names[zone.id].append(node_name)
+
+        return DatabaseTopologyDefinitionSchema(
+            zones=[
+                DatabaseTopologyDefinitionZoneSchema(
+                    name=zone.name,
+                    nodes_names=sorted(zones_nodes_names[zone.id]),
+                )
+                for zone in database_topology.zones
+            ]
+        )
+
+    def update_nodes(
+        self,
+        database_session: Session,
+        *,
+        nodes_zones_names: Dict[str, str],
+    ) -> DatabaseTopologyChangesSchema:
+        """Create nodes (and their zones), or move them to other zones, in one transaction.
+
+        Nodes and zones that are not passed are kept, also nodes that are
+        left in deleted zones (which 'get_definition' leaves out).
+        """
+        definition = self.get_definition(database_session)
+        zones = {zone.name: zone for zone in definition.zones}
+
+        for zone in definition.zones:
+            zone.nodes_names = [
+                node_name
+                for node_name in zone.nodes_names
+                if node_name not in nodes_zones_names
+            ]
+
+        for node_name, zone_name in nodes_zones_names.items():
+            if zone_name not in zones:
+                zones[zone_name] = DatabaseTopologyDefinitionZoneSchema(
+                    name=zone_name
+                )
+
+                definition.zones.append(zones[zone_name])
+
+            zones[zone_name].nodes_names.append(node_name)
+
+        return self.update(database_session, obj_in=definition, delete=False)
+
+    def update(
+        self,
+        database_session: Session,
+        *,
+        obj_in: DatabaseTopologyDefinitionSchema,
+        delete: bool = True,
+    ) -> DatabaseTopologyChangesSchema:
+        """Create, update and delete zones and nodes to match definition, in one transaction.
+
+        Zones and nodes are matched by name, so updating with the same
+        definition again changes nothing. Zones and nodes that are not in the
+        definition are deleted, unless delete is false.
+        """
+        changes = DatabaseTopologyChangesSchema()
+
+        zones_ids: Dict[str, int] = {
+            name: id_
+            for id_, name in database_session.query(
+                DatabaseZoneOrm.id, DatabaseZoneOrm.name
+            )
+        }
+        nodes_ids_zones_ids = {
+            name: (id_, zone_id)
+            for id_, name, zone_id in database_session.query(
+                DatabaseNodeOrm.id,
+                DatabaseNodeOrm.name,
+                DatabaseNodeOrm.zone_id,
+            )
+        }
+
+        # Create zones first, as nodes need their IDs
+
+        changes.created_zones_names = [
+            zone.name for zone in obj_in.zones if zone.name not in zones_ids
+        ]
+
+        if changes.created_zones_names:
+            database_zone.bulk_create(
+                database_session,
+                objs_in=[
+                    DatabaseZoneCreate(name=name)
+                    for name in changes.created_zones_names
+                ],
+            )
+
+            zones_ids.update(
+                database_session.query(
+                    DatabaseZoneOrm.name, DatabaseZoneOrm.id
+                ).filter(DatabaseZoneOrm.name.in_(changes.created_zones_names))
+            )
+
+        nodes_zones_ids = {
+            node_name: zones_ids[zone.name]
+            for zone in obj_in.zones
+            for node_name in zone.nodes_names
+        }
+
+        # Create nodes, and move nodes to other zones
+
+        nodes_to_create = []
+        nodes_to_update = []
+
+        for node_name, zone_id in nodes_zones_ids.items():
+            if node_name not in nodes_ids_zones_ids:
+                nodes_to_create.append(
+                    DatabaseNodeCreate(name=node_name, zone_id=zone_id)
+                )
+                changes.created_nodes_names.append(node_name)
+
+                continue
+
+            node_id, current_zone_id = nodes_ids_zones_ids[node_name]
+
+            if current_zone_id != zone_id:
+                nodes_to_update.append({"id": node_id, "zone_id": zone_id})
+                changes.updated_nodes_names.append(node_name)
+
+        database_node.bulk_create(database_session, objs_in=nodes_to_create)
+        database_session.bulk_update_mappings(DatabaseNodeOrm, nodes_to_update)
+
+        if not delete:
+            database_session.commit()
+
+            return changes
+
+        # Delete nodes before zones, so that no nodes are left in deleted
+        # zones
+
+        changes.deleted_nodes_names = sorted(
+            set(nodes_ids_zones_ids) - set(nodes_zones_ids)
+        )
+        changes.deleted_zones_names = sorted(
+            set(zones_ids) - {zone.name for zone in obj_in.zones}
+        )
+
+        if changes.deleted_nodes_names:
+            database_session.query(DatabaseNodeOrm).filter(
+                DatabaseNodeOrm.name.in_(changes.deleted_nodes_names)
+            ).delete(synchronize_session=False)
+
+        if changes.deleted_zones_names:
+            database_session.query(DatabaseZoneOrm).filter(
+                DatabaseZoneOrm.name.in_(changes.deleted_zones_names)
+            ).delete(synchronize_session=False)
+
+        database_session.commit()
+
+        return changes
+
+
+database_topology = CRUDDatabaseTopology()
@@ -1,6 +1,11 @@
 """Collection of object CRUD classes."""
 
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
 from virtualisation_resource_distributor.crud.base_database import (
+    YIELD_PER,
     CRUDBaseDatabase,
 )
 from virtualisation_resource_distributor.models import (
@@ -10,6 +15,9 @@ from virtualisation_resource_distributor.schemas import (
     DatabaseZone as DatabaseZoneSchema,
 )
 from virtualisation_resource_distributor.schemas import DatabaseZoneCreate
+from virtualisation_resource_distributor.schemas import (
+    DatabaseZoneWithNodes as DatabaseZoneWithNodesSchema,
+)
 
 
 class CRUDDatabaseZone(
@@ -17,7 +25,23 @@ class CRUDDatabaseZone(
 ):
     """CRUD methods for object."""
 
-    pass
+    def get_multiple_with_nodes(
+        self,
+        database_session: Session,
+        *,
+        filter_parameters: Optional[List[Tuple[Any, Any]]] = None,
+    ) -> Iterator[DatabaseZoneWithNodesSchema]:
+        """Yield objects with their nodes, as they are loaded.
+
+        Zones are loaded in batches, with one extra query per batch for
+        their nodes.
+        """
+        query = self._get_multiple_query(
+            database_session, filter_parameters=filter_parameters
+        ).options(selectinload(DatabaseZoneOrm.nodes))
+
+        for i in query.yield_per(YIELD_PER):
+            yield DatabaseZoneWithNodesSchema.from_orm(i)
 
 
 database_zone = CRUDDatabaseZone(DatabaseZoneOrm, DatabaseZoneSchema)
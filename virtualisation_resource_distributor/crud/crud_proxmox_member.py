@@ -2,18 +2,16 @@
 
 from typing import List
 
-from proxmoxer import ProxmoxAPI
-
 from virtualisation_resource_distributor.crud.base_proxmox import (
     CRUDBaseProxmox,
 )
 from virtualisation_resource_distributor.models import (
     ProxmoxMember as ProxmoxMemberOrm,
 )
+from virtualisation_resource_distributor.proxmox import ClusterSnapshot
 from virtualisation_resource_distributor.schemas import (
     ProxmoxMember as ProxmoxMemberSchema,
 )
-from virtualisation_resource_distributor.schemas import ProxmoxMemberStatusEnum
 
 
 class CRUDProxmoxMember(
@@ -22,25 +20,35 @@ class CRUDProxmoxMember(
     """CRUD methods for object."""
 
     def get_by_pool(
-        self, proxmox_connection: ProxmoxAPI, pool_name: str
+        self, cluster_snapshot: ClusterSnapshot, pool_name: str
     ) -> List[ProxmoxMemberSchema]:
         """Get object."""
-        members = []
-
-        pool = proxmox_connection.pools(pool_name).get()
-
-        for member in pool["members"]:
-            members.append(
-                ProxmoxMemberSchema(
-                    node_name=member["node"],
-                    name=member["name"],
-                    vm_id=member["vmid"],
-                    pool_name=pool_name,
-                    status=ProxmoxMemberStatusEnum(member["status"]),
-                )
+        return [
+            self.schema(**member._asdict())
+            for member in self.get_models_by_pool(cluster_snapshot, pool_name)
+        ]
+
+    def get_models_by_pool(
+        self, cluster_snapshot: ClusterSnapshot, pool_name: str
+    ) -> List[ProxmoxMemberOrm]:
+        """Get objects as models, which are not validated.
+
+        Used when evaluating pools, where validating every member would
+        dominate.
+        """
+        return [
+            ProxmoxMemberOrm(
+                member["node"],
+                member["name"],
+                member["vmid"],
+                pool_name,
+                member["status"],
+                member["maxmem"],
+                member["maxcpu"],
+                member["maxdisk"],
             )
-
-        return members
+            for member in cluster_snapshot.get_members(pool_name)
+        ]
 
 
 proxmox_member = CRUDProxmoxMember(ProxmoxMemberOrm, ProxmoxMemberSchema)
@@ -0,0 +1,48 @@
+"""Collection of object CRUD classes."""
+
+import re
+from typing import List, Optional
+
+from proxmoxer import ProxmoxAPI
+
+from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.crud.base_proxmox import (
+    CRUDBaseProxmox,
+)
+from virtualisation_resource_distributor.models import (
+    ProxmoxNode as ProxmoxNodeOrm,
+)
+from virtualisation_resource_distributor.schemas import (
+    ProxmoxNode as ProxmoxNodeSchema,
+)
+
+
+class CRUDProxmoxNode(CRUDBaseProxmox[ProxmoxNodeOrm, ProxmoxNodeSchema]):
+    """CRUD methods for object."""
+
+    def get_multiple(
+        self, proxmox_connection: ProxmoxAPI
+    ) -> List[ProxmoxNodeSchema]:
+        """Get objects from '/nodes', in one call."""
+        return [
+            self.schema(name=node["node"])
+            for node in proxmox_connection.nodes.get()
+        ]
+
+    def get_zone_name(self, name: str) -> Optional[str]:
+        """Get zone name from node name, using the first group of NODES_ZONE_NAME_REGEX.
+
+        Returns None if the regex is not set or does not match.
+        """
+        if not settings.NODES_ZONE_NAME_REGEX:
+            return None
+
+        match = re.match(settings.NODES_ZONE_NAME_REGEX, name)
+
+        if not match:
+            return None
+
+        return match.group(1)
+
+
+proxmox_node = CRUDProxmoxNode(ProxmoxNodeOrm, ProxmoxNodeSchema)
@@ -1,103 +1,619 @@
 """Collection of object CRUD classes."""
 
-from typing import List
-
-from proxmoxer import ProxmoxAPI
-from sqlalchemy.orm import Session
+import operator
+from math import inf
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TypeVar,
+)
 
 from virtualisation_resource_distributor import crud
 from virtualisation_resource_distributor.crud.base_proxmox import (
     CRUDBaseProxmox,
 )
+from virtualisation_resource_distributor.models import (
+    ProxmoxMember as ProxmoxMemberOrm,
+)
 from virtualisation_resource_distributor.models import (
     ProxmoxPool as ProxmoxPoolOrm,
 )
+from virtualisation_resource_distributor.proxmox import ClusterSnapshot
+from virtualisation_resource_distributor.schemas import (
+    DatabaseTopology as DatabaseTopologySchema,
+)
 from virtualisation_resource_distributor.schemas import (
     DatabaseZone as DatabaseZoneSchema,
 )
-from virtualisation_resource_distributor.schemas import ProxmoxMemberStatusEnum
+from virtualisation_resource_distributor.schemas import ProxmoxMemberWeightEnum
+from virtualisation_resource_distributor.schemas import (
+    ProxmoxMigration as ProxmoxMigrationSchema,
+)
 from virtualisation_resource_distributor.schemas import (
     ProxmoxPool as ProxmoxPoolSchema,
 )
+from virtualisation_resource_distributor.schemas import (
+    ProxmoxPoolSpread as ProxmoxPoolSpreadSchema,
+)
+from virtualisation_resource_distributor.schemas import (
+    ProxmoxPoolWeightedSpread as ProxmoxPoolWeightedSpreadSchema,
+)
+
+T = TypeVar("T", int, float)
+
+
+class NodesMembers(NamedTuple):
+    """Members of pool per node, as taken by 'CRUDProxmoxPool._get_nodes_members'."""
+
+    counts: Dict[str, int]
+    weights: Dict[str, float]
+    smallest_weights: Dict[str, float]
+    unknown_nodes_names: Set[str]
 
 
 class CRUDProxmoxPool(CRUDBaseProxmox[ProxmoxPoolOrm, ProxmoxPoolSchema]):
     """CRUD methods for object."""
 
     def get(
-        self, proxmox_connection: ProxmoxAPI, name: str
+        self, cluster_snapshot: ClusterSnapshot, name: str
     ) -> ProxmoxPoolSchema:
         """Get object."""
         return self.schema(name=name)
 
     def get_multiple(
-        self, proxmox_connection: ProxmoxAPI
+        self, cluster_snapshot: ClusterSnapshot
     ) -> List[ProxmoxPoolSchema]:
         """Get objects."""
         results = []
 
-        for pool in proxmox_connection.pools.get():
-            results.append(self.get(proxmox_connection, pool["poolid"]))
+        for pool_name in cluster_snapshot.pools_names:
+            results.append(self.get(cluster_snapshot, pool_name))
 
         return results
 
     def get_members_zones(
         self,
-        database_session: Session,
-        proxmox_connection: ProxmoxAPI,
+        database_topology: DatabaseTopologySchema,
+        cluster_snapshot: ClusterSnapshot,
         name: str,
     ) -> List[DatabaseZoneSchema]:
         """Get zones that members are in."""
         zones = []
+        zones_ids = set()
 
-        members = crud.proxmox_member.get_by_pool(proxmox_connection, name)
+        members = crud.proxmox_member.get_models_by_pool(
+            cluster_snapshot, name
+        )
 
         for member in members:
-            node = crud.database_node.get_multiple(
-                database_session,
-                filter_parameters=[("name", member.node_name)],
-            )[0]
-            zone = crud.database_zone.get_multiple(
-                database_session, filter_parameters=[("id", node.zone_id)]
-            )[0]
-
-            if zone in zones:
+            # Members on unknown nodes are in unknown zones
+
+            if member.node_name not in database_topology.nodes_zones:
+                continue
+
+            zone = database_topology.nodes_zones[member.node_name]
+
+            if zone.id in zones_ids:
                 continue
 
             zones.append(zone)
+            zones_ids.add(zone.id)
 
         return zones
 
-    def get_has_members_to_migrate(
+    def _get_nodes_members(
+        self,
+        database_topology: DatabaseTopologySchema,
+        cluster_snapshot: ClusterSnapshot,
+        name: str,
+        weight: Optional[ProxmoxMemberWeightEnum] = None,
+    ) -> NodesMembers:
+        """Get amount of members per node, and names of unknown nodes, in one pass over members.
+
+        Members on unknown nodes are left out, instead of failing the whole
+        run. If weight is passed, the total and smallest weight of members
+        per node are also taken.
+        """
+        counts: Dict[str, int] = {}
+        weights: Dict[str, float] = {}
+        smallest_weights: Dict[str, float] = {}
+        unknown_nodes_names = set()
+        nodes_zones = database_topology.nodes_zones
+        weight_name = weight.value if weight else None
+
+        for member in crud.proxmox_member.get_models_by_pool(
+            cluster_snapshot, name
+        ):
+            node_name = member.node_name
+
+            if node_name not in nodes_zones:
+                unknown_nodes_names.add(node_name)
+
+                continue
+
+            counts[node_name] = counts.get(node_name, 0) + 1
+
+            if weight_name is None:
+                continue
+
+            member_weight = getattr(member, weight_name)
+
+            weights[node_name] = weights.get(node_name, 0) + member_weight
+
+            # Moving members without weight changes nothing
+
+            if member_weight > 0 and member_weight < (
+                smallest_weights.get(node_name, inf)
+            ):
+                smallest_weights[node_name] = member_weight
+
+        return NodesMembers(
+            counts, weights, smallest_weights, unknown_nodes_names
+        )
+
+    def _get_zones_values(
+        self,
+        database_topology: DatabaseTopologySchema,
+        nodes_values: Dict[str, T],
+        combine: Callable[[T, T], T],
+    ) -> Dict[str, T]:
+        """Get values per zone, by combining the values of its nodes."""
+        zones_values: Dict[str, T] = {}
+
+        for node_name, value in nodes_values.items():
+            zone_name = database_topology.nodes_zones[node_name].name
+
+            zones_values[zone_name] = (
+                combine(zones_values[zone_name], value)
+                if zone_name in zones_values
+                else value
+            )
+
+        return zones_values
+
+    def get_spread(
         self,
-        database_session: Session,
-        proxmox_connection: ProxmoxAPI,
+        database_topology: DatabaseTopologySchema,
+        cluster_snapshot: ClusterSnapshot,
         name: str,
+    ) -> ProxmoxPoolSpreadSchema:
+        """Get spread of members over zones and nodes, in one pass over members."""
+        nodes_members = self._get_nodes_members(
+            database_topology, cluster_snapshot, name
+        )
+        nodes_members_counts = nodes_members.counts
+        zones_members_counts = self._get_zones_values(
+            database_topology, nodes_members_counts, operator.add
+        )
+        members_count = sum(nodes_members_counts.values())
+
+        unused_zones_count = len(database_topology.zones) - len(
+            zones_members_counts
+        )
+        unused_nodes_count = len(database_topology.nodes_zones) - len(
+            nodes_members_counts
+        )
+
+        # More members than used zones (or nodes) are only allowed when there
+        # are no unused zones (or nodes). Values already have the right
+        # types, so validation is skipped.
+
+        return ProxmoxPoolSpreadSchema.construct(
+            name=name,
+            members_count=members_count,
+            zones_members_counts=zones_members_counts,
+            nodes_members_counts=nodes_members_counts,
+            unused_zones_count=unused_zones_count,
+            unused_nodes_count=unused_nodes_count,
+            unknown_nodes_names=sorted(nodes_members.unknown_nodes_names),
+            has_members_to_migrate=members_count > len(zones_members_counts)
+            and unused_zones_count > 0,
+            has_members_to_migrate_between_nodes=members_count
+            > len(nodes_members_counts)
+            and unused_nodes_count > 0,
+        )
+
+    def get_weighted_spread(
+        self,
+        database_topology: DatabaseTopologySchema,
+        cluster_snapshot: ClusterSnapshot,
+        name: str,
+        weight: ProxmoxMemberWeightEnum,
+    ) -> ProxmoxPoolWeightedSpreadSchema:
+        """Get spread of members over zones and nodes, weighted by size of members, in one pass over members."""
+        nodes_members = self._get_nodes_members(
+            database_topology, cluster_snapshot, name, weight
+        )
+        zones_members_counts = self._get_zones_values(
+            database_topology, nodes_members.counts, operator.add
+        )
+        zones_members_weights = self._get_zones_values(
+            database_topology, nodes_members.weights, operator.add
+        )
+        zones_smallest_weights = self._get_zones_values(
+            database_topology, nodes_members.smallest_weights, min
+        )
+
+        unused_zones_count = len(database_topology.zones) - len(
+            zones_members_counts
+        )
+        unused_nodes_count = len(database_topology.nodes_zones) - len(
+            nodes_members.counts
+        )
+
+        # Values already have the right types, so validation is skipped
+
+        has_members_to_migrate = self._get_is_unbalanced(
+            len(database_topology.zones),
+            zones_members_weights,
+            zones_smallest_weights,
+        )
+        has_members_to_migrate_between_nodes = self._get_is_unbalanced(
+            len(database_topology.nodes_zones),
+            nodes_members.weights,
+            nodes_members.smallest_weights,
+        )
+
+        return ProxmoxPoolWeightedSpreadSchema.construct(
+            name=name,
+            members_count=sum(nodes_members.counts.values()),
+            zones_members_counts=zones_members_counts,
+            nodes_members_counts=nodes_members.counts,
+            unused_zones_count=unused_zones_count,
+            unused_nodes_count=unused_nodes_count,
+            unknown_nodes_names=sorted(nodes_members.unknown_nodes_names),
+            has_members_to_migrate=has_members_to_migrate,
+            has_members_to_migrate_between_nodes=(
+                has_members_to_migrate_between_nodes
+            ),
+            weight=weight.value,
+            members_weight=sum(nodes_members.weights.values()),
+            zones_members_weights=zones_members_weights,
+            nodes_members_weights=nodes_members.weights,
+        )
+
+    def _get_is_unbalanced(
+        self,
+        labels_count: int,
+        weights: Dict[str, float],
+        smallest_weights: Dict[str, float],
     ) -> bool:
-        """Check if pool has members to migrate (members are not in as many different zones as possible)."""
-        members = [
-            m
-            for m in crud.proxmox_member.get_by_pool(proxmox_connection, name)
-            if m.status == ProxmoxMemberStatusEnum.RUNNING
-        ]
-        used_zones = self.get_members_zones(
-            database_session, proxmox_connection, name
+        """Check if labels (zone or node names) are unbalanced: a member can be moved to the lightest label, while that label stays lighter than the label of the member was.
+
+        Only labels with members are in weights, so when some labels are
+        not, the lightest label has no weight.
+        """
+        if len(weights) < labels_count:
+            lightest_weight: float = 0
+        else:
+            lightest_weight = min(weights.values(), default=0)
+
+        return any(
+            lightest_weight + smallest_weight < weights[label]
+            for label, smallest_weight in smallest_weights.items()
+        )
+
+    def get_spreads(
+        self,
+        database_topology: DatabaseTopologySchema,
+        cluster_snapshot: ClusterSnapshot,
+        names: List[str],
+        weight: Optional[ProxmoxMemberWeightEnum] = None,
+    ) -> List[ProxmoxPoolSpreadSchema]:
+        """Get spreads of pools, like 'get_spread', evaluating all pools at once.
+
+        Members of all pools are put in arrays, and counted per pool with a
+        few NumPy operations. Requires the 'numpy' extra; without it, pools
+        are evaluated one by one.
+
+        If weight is passed, pools are evaluated one by one with
+        'get_weighted_spread'.
+        """
+        if weight is not None:
+            return [
+                self.get_weighted_spread(
+                    database_topology, cluster_snapshot, name, weight
+                )
+                for name in names
+            ]
+
+        try:
+            import numpy as np
+        except ImportError:
+            return [
+                self.get_spread(database_topology, cluster_snapshot, name)
+                for name in names
+            ]
+
+        zones_names = [zone.name for zone in database_topology.zones]
+        zones_indexes = {
+            zone.id: index
+            for index, zone in enumerate(database_topology.zones)
+        }
+        nodes_names = list(database_topology.nodes_zones)
+        nodes_indexes = {
+            node_name: index for index, node_name in enumerate(nodes_names)
+        }
+        nodes_zones_indexes = np.array(
+            [
+                zones_indexes[database_topology.nodes_zones[node_name].id]
+                for node_name in nodes_names
+            ],
+            dtype=np.int64,
+        )
+
+        zones_count = len(zones_names)
+        nodes_count = len(nodes_names)
+        pools_count = len(names)
+
+        # Members are read from the snapshot directly, as creating models
+        # would cost more than evaluating. Members on unknown nodes get node
+        # index -1.
+
+        pools_members = [cluster_snapshot.get_members(name) for name in names]
+        members = [member for members in pools_members for member in members]
+
+        members_pools = np.repeat(
+            np.arange(pools_count, dtype=np.int64),
+            [len(members) for members in pools_members],
+        )
+        members_nodes = np.fromiter(
+            (nodes_indexes.get(member["node"], -1) for member in members),
+            dtype=np.int64,
+            count=len(members),
+        )
+
+        # Members on unknown nodes are left out, like in '_get_nodes_members'
+
+        unknown_nodes_names: List[Set[str]] = [set() for _ in names]
+
+        for member_index in np.flatnonzero(members_nodes < 0).tolist():
+            unknown_nodes_names[members_pools[member_index]].add(
+                members[member_index]["node"]
+            )
+
+        known = members_nodes >= 0
+
+        members_pools = members_pools[known]
+        members_nodes = members_nodes[known]
+        members_zones = nodes_zones_indexes[members_nodes]
+
+        members_counts = np.bincount(members_pools, minlength=pools_count)
+
+        # Every pair of pool and zone (or node) is encoded as one integer,
+        # so the amount of members per pair is counted by 'unique'
+
+        pools_zones, pools_zones_members_counts = np.unique(
+            members_pools * zones_count + members_zones,
+            return_counts=True,
+        )
+        pools_nodes, pools_nodes_members_counts = np.unique(
+            members_pools * nodes_count + members_nodes, return_counts=True
+        )
+
+        used_zones_counts = np.bincount(
+            pools_zones // max(zones_count, 1), minlength=pools_count
+        )
+        used_nodes_counts = np.bincount(
+            pools_nodes // max(nodes_count, 1), minlength=pools_count
+        )
+        unused_zones_counts = zones_count - used_zones_counts
+        unused_nodes_counts = nodes_count - used_nodes_counts
+
+        has_members_to_migrate = (members_counts > used_zones_counts) & (
+            unused_zones_counts > 0
+        )
+        has_members_to_migrate_between_nodes = (
+            members_counts > used_nodes_counts
+        ) & (unused_nodes_counts > 0)
+
+        zones_members_counts = self._get_pools_labels_counts(
+            pools_zones, pools_zones_members_counts, zones_names, pools_count
+        )
+        nodes_members_counts = self._get_pools_labels_counts(
+            pools_nodes, pools_nodes_members_counts, nodes_names, pools_count
         )
-        unused_zones = [
-            zone
-            for zone in crud.database_zone.get_multiple(database_session)
-            if zone not in used_zones
+
+        return [
+            ProxmoxPoolSpreadSchema.construct(
+                name=name,
+                members_count=members_count,
+                zones_members_counts=zones_members_counts[pool_index],
+                nodes_members_counts=nodes_members_counts[pool_index],
+                unused_zones_count=unused_zones_count,
+                unused_nodes_count=unused_nodes_count,
+                unknown_nodes_names=sorted(unknown_nodes_names[pool_index]),
+                has_members_to_migrate=pool_has_members_to_migrate,
+                has_members_to_migrate_between_nodes=pool_has_members_to_migrate_between_nodes,
+            )
+            for pool_index, (
+                name,
+                members_count,
+                unused_zones_count,
+                unused_nodes_count,
+                pool_has_members_to_migrate,
+                pool_has_members_to_migrate_between_nodes,
+            ) in enumerate(
+                zip(
+                    names,
+                    members_counts.tolist(),
+                    unused_zones_counts.tolist(),
+                    unused_nodes_counts.tolist(),
+                    has_members_to_migrate.tolist(),
+                    has_members_to_migrate_between_nodes.tolist(),
+                )
+            )
+        ]
+
+    def _get_pools_labels_counts(
+        self, pairs: Any, counts: Any, labels: List[str], pools_count: int
+    ) -> List[Dict[str, int]]:
+        """Get amount of members per label (zone or node name) per pool.
+
+        Pairs of pool and label are encoded like in 'get_spreads', and are
+        sorted, so the pairs of every pool are a slice.
+        """
+        width = max(len(labels), 1)
+        pairs_labels = [labels[index] for index in (pairs % width).tolist()]
+        pairs_counts = counts.tolist()
+        boundaries = (pairs // width).searchsorted(range(pools_count + 1))
+
+        return [
+            dict(zip(pairs_labels[start:end], pairs_counts[start:end]))
+            for start, end in zip(
+                boundaries[:-1].tolist(), boundaries[1:].tolist()
+            )
         ]
 
-        # More members than used zones are only allowed when there are no unused
-        # zones
+    def get_has_members_to_migrate(
+        self,
+        database_topology: DatabaseTopologySchema,
+        cluster_snapshot: ClusterSnapshot,
+        name: str,
+    ) -> bool:
+        """Check if pool has members to migrate (members are not in as many different zones as possible)."""
+        return self.get_spread(
+            database_topology, cluster_snapshot, name
+        ).has_members_to_migrate
+
+    def get_migrations(
+        self,
+        database_topology: DatabaseTopologySchema,
+        cluster_snapshot: ClusterSnapshot,
+        name: str,
+    ) -> List[ProxmoxMigrationSchema]:
+        """Get the least migrations that spread running members over as many different zones and nodes as possible.
+
+        Every migration moves a member from a node with multiple members (or
+        from a zone with multiple members) to a node without members, so every
+        migration uses one more node and/or zone. Members are first migrated
+        to unused zones, taken from the nodes with the most members. Then,
+        members are migrated to unused nodes, preferably in the same zone.
+        """
+        migrations = []
+
+        nodes_members: Dict[str, List[ProxmoxMemberOrm]] = {
+            node_name: []
+            for node_name in sorted(database_topology.nodes_zones)
+        }
+        zones_nodes_names: Dict[int, List[str]] = {}
+        zones_members_counts: Dict[int, int] = {}
+
+        for node_name in nodes_members:
+            zone = database_topology.nodes_zones[node_name]
+
+            zones_nodes_names.setdefault(zone.id, []).append(node_name)
+            zones_members_counts[zone.id] = 0
+
+        for member in crud.proxmox_member.get_models_by_pool(
+            cluster_snapshot, name
+        ):
+            # Members on unknown nodes can't be migrated, as their zones are
+            # unknown
+
+            if member.node_name not in nodes_members:
+                continue
+
+            nodes_members[member.node_name].append(member)
+            zones_members_counts[
+                database_topology.nodes_zones[member.node_name].id
+            ] += 1
+
+        def migrate(source_node_name: str, destination_node_name: str) -> None:
+            member = nodes_members[source_node_name].pop()
+            source_zone = database_topology.nodes_zones[source_node_name]
+            destination_zone = database_topology.nodes_zones[
+                destination_node_name
+            ]
+
+            nodes_members[destination_node_name].append(member)
+            zones_members_counts[source_zone.id] -= 1
+            zones_members_counts[destination_zone.id] += 1
+
+            migrations.append(
+                ProxmoxMigrationSchema(
+                    vm_id=member.vm_id,
+                    name=member.name,
+                    pool_name=name,
+                    source_node_name=source_node_name,
+                    source_zone_name=source_zone.name,
+                    destination_node_name=destination_node_name,
+                    destination_zone_name=destination_zone.name,
+                )
+            )
+
+        # Use as many zones as possible. Taking members from the nodes with
+        # the most members uses more nodes as well.
+
+        for zone_id in sorted(zones_nodes_names):
+            if zones_members_counts[zone_id]:
+                continue
+
+            sources_nodes_names = [
+                node_name
+                for node_name, members in nodes_members.items()
+                if members
+                and zones_members_counts[
+                    database_topology.nodes_zones[node_name].id
+                ]
+                > 1
+            ]
+
+            if not sources_nodes_names:
+                break
+
+            migrate(
+                max(
+                    sources_nodes_names,
+                    key=lambda node_name: len(nodes_members[node_name]),
+                ),
+                zones_nodes_names[zone_id][0],
+            )
+
+        # Use as many nodes as possible
+
+        while True:
+            sources_nodes_names = [
+                node_name
+                for node_name, members in nodes_members.items()
+                if len(members) > 1
+            ]
+            destinations_nodes_names = [
+                node_name
+                for node_name, members in nodes_members.items()
+                if not members
+            ]
+
+            if not sources_nodes_names or not destinations_nodes_names:
+                break
+
+            source_node_name = max(
+                sources_nodes_names,
+                key=lambda node_name: len(nodes_members[node_name]),
+            )
+            source_zone_id = database_topology.nodes_zones[source_node_name].id
+
+            # Prefer the same zone, then the zone with the least members
 
-        if len(members) > len(used_zones):
-            return bool(unused_zones)
+            destination_node_name = min(
+                destinations_nodes_names,
+                key=lambda node_name: (
+                    database_topology.nodes_zones[node_name].id
+                    != source_zone_id,
+                    zones_members_counts[
+                        database_topology.nodes_zones[node_name].id
+                    ],
+                ),
+            )
 
-        # There are not more members than used zones
+            migrate(source_node_name, destination_node_name)
 
-        return False
+        return migrations
 
 
 proxmox_pool = CRUDProxmoxPool(ProxmoxPoolOrm, ProxmoxPoolSchema)
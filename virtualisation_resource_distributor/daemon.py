@@ -0,0 +1,191 @@
+"""Long-running mode, that keeps state between polls."""
+
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from proxmoxer import ProxmoxAPI
+from sqlalchemy.orm import Session
+
+from virtualisation_resource_distributor import crud, proxmox
+from virtualisation_resource_distributor.config import (
+    get_exclude_pools_names,
+    settings,
+)
+from virtualisation_resource_distributor.metrics import metrics
+from virtualisation_resource_distributor.schemas import (
+    DatabaseTopology as DatabaseTopologySchema,
+)
+from virtualisation_resource_distributor.schemas import (
+    ProxmoxPoolSpread as ProxmoxPoolSpreadSchema,
+)
+from virtualisation_resource_distributor.utilities import write_file_atomically
+
+PoolFingerprint = Tuple[Tuple[int, str, str, int, float, int], ...]
+
+
+def get_pool_fingerprint(
+    cluster_snapshot: proxmox.ClusterSnapshot, pool_name: str
+) -> PoolFingerprint:
+    """Get the properties of members that evaluating pool depends on."""
+    return tuple(
+        sorted(
+            (
+                member["vmid"],
+                member["node"],
+                member["status"],
+                member["maxmem"],
+                member["maxcpu"],
+                member["maxdisk"],
+            )
+            for member in cluster_snapshot.get_members(pool_name)
+        )
+    )
+
+
+class Daemon:
+    """Poll Proxmox on an interval, and write result to a file.
+
+    Pools are only evaluated again when their members, or the nodes,
+    statuses or sizes of their members, changed since the last poll, or when
+    the topology changed.
+
+    If DAEMON_ASYNC is enabled, pools are fetched with the asynchronous
+    client, and no Proxmox API connection has to be passed.
+    """
+
+    def __init__(
+        self,
+        database_session: Session,
+        proxmox_connection: Optional[ProxmoxAPI],
+        result_path: str,
+    ) -> None:
+        """Set attributes."""
+        self.database_session = database_session
+        self.proxmox_connection = proxmox_connection
+        self.result_path = result_path
+
+        self.database_topology: Optional[DatabaseTopologySchema] = None
+        self.pools_fingerprints: Dict[str, PoolFingerprint] = {}
+        self.pools_spreads: Dict[str, ProxmoxPoolSpreadSchema] = {}
+
+    def get_cluster_snapshot(self) -> proxmox.ClusterSnapshot:
+        """Fetch pools and members, with the asynchronous client if enabled."""
+        if settings.DAEMON_ASYNC:
+            from virtualisation_resource_distributor import proxmox_async
+
+            return asyncio.run(proxmox_async.fetch_cluster_snapshot())
+
+        return proxmox.ClusterSnapshot(self.proxmox_connection)
+
+    def poll(self) -> List[str]:
+        """Evaluate changed pools, write result, and return names of pools with members to migrate."""
+        start_time = time.perf_counter()
+
+        cluster_snapshot = self.get_cluster_snapshot()
+
+        # Don't use objects loaded by previous polls
+
+        self.database_session.expire_all()
+
+        database_topology = crud.database_topology.get(self.database_session)
+
+        if database_topology != self.database_topology:
+            self.pools_fingerprints = {}
+
+        self.database_topology = database_topology
+
+        pools_fingerprints = {}
+        changed_pools_names = []
+
+        for pool_name in cluster_snapshot.pools_names:
+            if pool_name in get_exclude_pools_names():
+                continue
+
+            fingerprint = get_pool_fingerprint(cluster_snapshot, pool_name)
+
+            if self.pools_fingerprints.get(pool_name) != fingerprint:
+                changed_pools_names.append(pool_name)
+
+            pools_fingerprints[pool_name] = fingerprint
+
+        # Changed pools are evaluated at once, other pools keep their spread
+
+        changed_pools_spreads = dict(
+            zip(
+                changed_pools_names,
+                crud.proxmox_pool.get_spreads(
+                    database_topology,
+                    cluster_snapshot,
+                    changed_pools_names,
+                    settings.SPREAD_WEIGHT,
+                ),
+            )
+        )
+        pools_spreads = {
+            pool_name: changed_pools_spreads[pool_name]
+            if pool_name in changed_pools_spreads
+            else self.pools_spreads[pool_name]
+            for pool_name in pools_fingerprints
+        }
+
+        # Pools that no longer exist are dropped
+
+        self.pools_fingerprints = pools_fingerprints
+        self.pools_spreads = pools_spreads
+
+        pools_names_with_members_to_migrate = [
+            spread.name
+            for spread in pools_spreads.values()
+            if spread.has_members_to_migrate
+        ]
+
+        self.write_result()
+
+        if settings.METRICS_PATH:
+            metrics.run_duration.observe(time.perf_counter() - start_time)
+            metrics.write(settings.METRICS_PATH, pools_spreads.values())
+
+        return pools_names_with_members_to_migrate
+
+    def write_result(self) -> None:
+        """Write result, readable by monitoring."""
+        write_file_atomically(
+            self.result_path,
+            json.dumps(
+                {
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                    "pools_names_with_members_to_migrate": [
+                        spread.name
+                        for spread in self.pools_spreads.values()
+                        if spread.has_members_to_migrate
+                    ],
+                    "pools_names_with_members_to_migrate_between_nodes": [
+                        spread.name
+                        for spread in self.pools_spreads.values()
+                        if spread.has_members_to_migrate_between_nodes
+                    ],
+                }
+            ),
+            0o644,
+        )
+
+    def run(self, interval: int) -> None:
+        """Poll forever.
+
+        When polling fails, the last result is kept, so its age shows that it
+        is stale. Any error fails the poll (e.g. failed logins, database
+        errors and unexpected responses), not the daemon.
+        """
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(
+                    f"Polling failed: {type(e).__name__}: {e}", file=sys.stderr
+                )
+
+            time.sleep(interval)
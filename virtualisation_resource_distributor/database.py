@@ -1,15 +1,61 @@
 """Database helpers."""
 
-from sqlalchemy import create_engine
+from typing import Any
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from virtualisation_resource_distributor.config import settings
 
-engine = create_engine(
-    f"sqlite:///{settings.DATABASE_PATH}", pool_pre_ping=True
+# Connections to a local file don't go stale, so no pre-ping is needed
+
+engine = create_engine(f"sqlite:///{settings.DATABASE_PATH}")
+
+# Connections of this engine can't write, so they never wait for (or hold)
+# the write lock
+
+read_only_engine = create_engine(
+    f"sqlite:///file:{settings.DATABASE_PATH}?mode=ro&uri=true"
 )
 
+
+def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    """Set pragmas on new read-only connection."""
+    cursor = dbapi_connection.cursor()
+
+    cursor.execute(f"PRAGMA synchronous={settings.DATABASE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.DATABASE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size={settings.DATABASE_CACHE_SIZE}")
+
+    cursor.close()
+
+
+def set_writable_pragmas(
+    dbapi_connection: Any, connection_record: Any
+) -> None:
+    """Set pragmas on new writable connection.
+
+    The journal mode is stored in the database file, so it can only be set
+    by writable connections, and applies to read-only connections as well.
+    If no journal mode is set, the database keeps its journal mode.
+    """
+    if settings.DATABASE_JOURNAL_MODE:
+        cursor = dbapi_connection.cursor()
+
+        cursor.execute(f"PRAGMA journal_mode={settings.DATABASE_JOURNAL_MODE}")
+
+        cursor.close()
+
+    set_pragmas(dbapi_connection, connection_record)
+
+
+event.listen(engine, "connect", set_writable_pragmas)
+event.listen(read_only_engine, "connect", set_pragmas)
+
 DatabaseSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadOnlyDatabaseSession = sessionmaker(
+    autocommit=False, autoflush=False, bind=read_only_engine
+)
 
 Base = declarative_base()
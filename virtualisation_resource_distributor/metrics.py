@@ -0,0 +1,191 @@
+"""OpenMetrics textfile exporter."""
+
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Iterable, List, Sequence, Union
+
+from virtualisation_resource_distributor.utilities import write_file_atomically
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+    from virtualisation_resource_distributor.schemas import (
+        ProxmoxPoolSpread as ProxmoxPoolSpreadSchema,
+    )
+
+PREFIX = "virtualisation_resource_distributor"
+
+REQUEST_DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+RUN_DURATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+POOL_GAUGES = [
+    ("pool_members", "Running members of pool."),
+    ("pool_used_zones", "Zones that members of pool are in."),
+    ("pool_unused_zones", "Zones that no members of pool are in."),
+    (
+        "pool_has_members_to_migrate",
+        "Whether pool has members to migrate between zones.",
+    ),
+    ("pool_used_nodes", "Nodes that members of pool are on."),
+    ("pool_unused_nodes", "Nodes that no members of pool are on."),
+    (
+        "pool_has_members_to_migrate_between_nodes",
+        "Whether pool has members to migrate between nodes.",
+    ),
+]
+
+
+def escape_label_value(value: str) -> str:
+    """Escape label value for the OpenMetrics text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def get_pool_gauges_values(spread: "ProxmoxPoolSpreadSchema") -> List[int]:
+    """Get values of pool gauges, in the order of 'POOL_GAUGES'."""
+    return [
+        spread.members_count,
+        len(spread.zones_members_counts),
+        spread.unused_zones_count,
+        int(spread.has_members_to_migrate),
+        len(spread.nodes_members_counts),
+        spread.unused_nodes_count,
+        int(spread.has_members_to_migrate_between_nodes),
+    ]
+
+
+class Histogram:
+    """Histogram with fixed buckets.
+
+    Only counts are kept, so memory usage does not grow with observations.
+    """
+
+    def __init__(self, name: str, help_: str, buckets: Sequence[float]):
+        """Set attributes."""
+        self.name = name
+        self.help = help_
+        self.buckets = buckets
+
+        self.buckets_counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add observation."""
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.buckets_counts[index] += 1
+
+        self.sum += value
+        self.count += 1
+
+    def get_lines(self) -> List[str]:
+        """Get lines in the OpenMetrics text format.
+
+        Buckets counts are cumulative, as they already include smaller
+        observations.
+        """
+        lines = [
+            f"# TYPE {self.name} histogram",
+            f"# HELP {self.name} {self.help}",
+        ]
+
+        for bucket, bucket_count in zip(self.buckets, self.buckets_counts):
+            lines.append(f'{self.name}_bucket{{le="{bucket}"}} {bucket_count}')
+
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+
+        return lines
+
+
+class Metrics:
+    """Latency of Proxmox API requests and runs, exported with spreads of pools.
+
+    Observations are kept for the lifetime of the process, so long-running
+    modes export histograms over all polls.
+    """
+
+    def __init__(self) -> None:
+        """Set attributes."""
+        self.request_duration = Histogram(
+            f"{PREFIX}_proxmox_request_duration_seconds",
+            "Duration of Proxmox API requests.",
+            REQUEST_DURATION_BUCKETS,
+        )
+        self.run_duration = Histogram(
+            f"{PREFIX}_run_duration_seconds",
+            "Duration of evaluating all pools.",
+            RUN_DURATION_BUCKETS,
+        )
+
+        # Requests may be sent by concurrent workers
+
+        self._lock = threading.Lock()
+
+    def record_request(
+        self,
+        response: Union["requests.Response", "httpx.Response"],
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        """Record Proxmox API request. Used as 'response' hook of session, and by the asynchronous client."""
+        with self._lock:
+            self.request_duration.observe(response.elapsed.total_seconds())
+
+    def get_text(
+        self, pools_spreads: Iterable["ProxmoxPoolSpreadSchema"]
+    ) -> str:
+        """Get metrics in the OpenMetrics text format."""
+        pools_gauges_values = [
+            (escape_label_value(spread.name), get_pool_gauges_values(spread))
+            for spread in pools_spreads
+        ]
+
+        lines = []
+
+        for index, (name, help_) in enumerate(POOL_GAUGES):
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"# HELP {PREFIX}_{name} {help_}")
+
+            for pool_name, gauges_values in pools_gauges_values:
+                lines.append(
+                    f'{PREFIX}_{name}{{pool="{pool_name}"}} '
+                    f"{gauges_values[index]}"
+                )
+
+        lines.append(f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(
+            f"# HELP {PREFIX}_last_run_timestamp_seconds Time of last run."
+        )
+        lines.append(f"{PREFIX}_last_run_timestamp_seconds {time.time()}")
+
+        with self._lock:
+            lines.extend(self.request_duration.get_lines())
+
+        lines.extend(self.run_duration.get_lines())
+        lines.append("# EOF")
+
+        return "\n".join(lines) + "\n"
+
+    def write(
+        self, path: str, pools_spreads: Iterable["ProxmoxPoolSpreadSchema"]
+    ) -> None:
+        """Write metrics, e.g. for the textfile collector of node exporter."""
+        write_file_atomically(path, self.get_text(pools_spreads), 0o644)
+
+
+metrics = Metrics()
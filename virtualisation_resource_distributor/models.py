@@ -1,6 +1,9 @@
 """Database models."""
 
+from typing import NamedTuple
+
 from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.types import TIMESTAMP
 
@@ -36,6 +39,16 @@ class DatabaseZone(AuditBaseInDatabase):
 
     name = Column(String(255), nullable=False, unique=True)
 
+    # Deleting nodes is left to the database, like before relationships were
+    # added
+
+    nodes = relationship(
+        "DatabaseNode",
+        back_populates="zone",
+        order_by="DatabaseNode.id",
+        passive_deletes="all",
+    )
+
 
 class DatabaseNode(AuditBaseInDatabase):
     """SQLAlchemy table."""
@@ -48,8 +61,11 @@ class DatabaseNode(AuditBaseInDatabase):
         ForeignKey("zones.id", ondelete="CASCADE"),
         nullable=False,
         unique=False,
+        index=True,
     )
 
+    zone = relationship("DatabaseZone", back_populates="nodes")
+
 
 # Proxmox
 
@@ -60,10 +76,24 @@ class ProxmoxPool:
     name: str
 
 
-class ProxmoxMember:
-    """Proxmox API model."""
+class ProxmoxMember(NamedTuple):
+    """Proxmox API model.
+
+    Created for every member on every run, so it is a tuple, without
+    validation. The status is the string that Proxmox returns.
+    """
 
     node_name: str
     name: str
     vm_id: int
     pool_name: str
+    status: str
+    maxmem: int
+    maxcpu: float
+    maxdisk: int
+
+
+class ProxmoxNode:
+    """Proxmox API model."""
+
+    name: str
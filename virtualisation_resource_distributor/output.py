@@ -0,0 +1,61 @@
+"""Machine-readable output of records."""
+
+import csv
+import json
+import sys
+from typing import Any, Dict, Iterable, List
+
+FORMAT_TEXT = "text"
+FORMAT_JSON = "json"
+FORMAT_NDJSON = "ndjson"
+FORMAT_CSV = "csv"
+
+
+def get_csv_value(value: Any) -> Any:
+    """Get value for CSV cell. Lists and dicts are JSON-encoded."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+
+    return value
+
+
+def write_records(
+    records: Iterable[Dict[str, Any]], format_: str, fields: List[str]
+) -> None:
+    """Write records to stdout as JSON, NDJSON or CSV.
+
+    Every record is written as soon as it is produced, so consumers can start
+    before all records are produced, and records are not kept in memory. For
+    JSON, the list is written around the records.
+
+    Fields are only used for CSV, as its header.
+    """
+    if format_ == FORMAT_NDJSON:
+        for record in records:
+            sys.stdout.write(json.dumps(record) + "\n")
+
+        return
+
+    if format_ == FORMAT_CSV:
+        writer = csv.DictWriter(
+            sys.stdout, fields, extrasaction="ignore", lineterminator="\n"
+        )
+        writer.writeheader()
+
+        for record in records:
+            writer.writerow(
+                {key: get_csv_value(value) for key, value in record.items()}
+            )
+
+        return
+
+    separator = ""
+
+    sys.stdout.write("[")
+
+    for record in records:
+        sys.stdout.write(separator + json.dumps(record))
+
+        separator = ", "
+
+    sys.stdout.write("]\n")
@@ -0,0 +1,142 @@
+"""Instrumentation of phases, Proxmox API requests and SQL queries."""
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Union
+
+# Only needed when profiling, so not imported on startup
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from sqlalchemy.engine import Engine
+
+FORMAT_TABLE = "table"
+FORMAT_JSON = "json"
+
+
+class Profiler:
+    """Count and time phases, Proxmox API requests and SQL queries.
+
+    Nothing is recorded until enabled, so hooks can be registered
+    unconditionally.
+    """
+
+    def __init__(self) -> None:
+        """Set attributes."""
+        self.enabled = False
+
+        self.phases: Dict[str, float] = {}
+        self.requests_count = 0
+        self.requests_time = 0.0
+        self.queries_count = 0
+        self.queries_time = 0.0
+
+        self._query_start_time = 0.0
+
+        # Requests may be sent by concurrent workers
+
+        self._lock = threading.Lock()
+
+    def enable(self, *engines: "Engine") -> None:
+        """Start recording, and listen to SQL queries on engines."""
+        from sqlalchemy import event
+
+        self.enabled = True
+
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before_query)
+            event.listen(engine, "after_cursor_execute", self._after_query)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time phase. Time of phases with the same name is added up."""
+        if not self.enabled:
+            yield
+
+            return
+
+        start_time = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.phases[name] = (
+                self.phases.get(name, 0.0) + time.perf_counter() - start_time
+            )
+
+    def record_request(
+        self,
+        response: Union["requests.Response", "httpx.Response"],
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        """Record Proxmox API request. Used as 'response' hook of session, and by the asynchronous client."""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.requests_count += 1
+            self.requests_time += response.elapsed.total_seconds()
+
+    def _before_query(
+        self, conn: Any, cursor: Any, *args: Any, **kwargs: Any
+    ) -> None:
+        """Store start time of SQL query."""
+        self._query_start_time = time.perf_counter()
+
+    def _after_query(
+        self, conn: Any, cursor: Any, *args: Any, **kwargs: Any
+    ) -> None:
+        """Record SQL query."""
+        self.queries_count += 1
+        self.queries_time += time.perf_counter() - self._query_start_time
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Get recorded times (in seconds) and counts."""
+        return {
+            "phases": self.phases,
+            "proxmox_requests": {
+                "count": self.requests_count,
+                "time": self.requests_time,
+            },
+            "sql_queries": {
+                "count": self.queries_count,
+                "time": self.queries_time,
+            },
+        }
+
+    def print_summary(self, format_: str = FORMAT_TABLE) -> None:
+        """Print summary as table or JSON.
+
+        Printed to stderr, so output of commands is unaffected.
+        """
+        if format_ == FORMAT_JSON:
+            print(json.dumps(self.get_summary()), file=sys.stderr)
+
+            return
+
+        print(f"{'Phase':<24} {'Count':>6} {'Time (ms)':>10}", file=sys.stderr)
+
+        for name, phase_time in self.phases.items():
+            print(
+                f"{name:<24} {'':>6} {phase_time * 1000:>10.1f}",
+                file=sys.stderr,
+            )
+
+        print(
+            f"{'Proxmox API requests':<24} {self.requests_count:>6} "
+            f"{self.requests_time * 1000:>10.1f}",
+            file=sys.stderr,
+        )
+        print(
+            f"{'SQL queries':<24} {self.queries_count:>6} "
+            f"{self.queries_time * 1000:>10.1f}",
+            file=sys.stderr,
+        )
+
+
+profiler = Profiler()
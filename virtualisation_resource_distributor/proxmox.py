@@ -1,15 +1,384 @@
 """Proxmox API helpers."""
 
-import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from proxmoxer import ProxmoxAPI
+from proxmoxer.backends.https import ProxmoxHTTPAuth
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.metrics import metrics
+from virtualisation_resource_distributor.profiling import profiler
+from virtualisation_resource_distributor.schemas import ProxmoxMemberStatusEnum
+from virtualisation_resource_distributor.utilities import write_file_atomically
 
-API = functools.partial(
-    ProxmoxAPI,
-    settings.PROXMOX_HOST,
-    user=settings.PROXMOX_USERNAME + "@" + settings.PROXMOX_REALM,
-    password=settings.PROXMOX_PASSWORD,
-    verify_ssl=settings.PROXMOX_VERIFY_SSL,
-)
+MEMBERS_TYPES = ["qemu", "lxc"]
+MEMBERS_STATUSES = [ProxmoxMemberStatusEnum.RUNNING.value]
+
+RETRY_STATUSES = [500, 502, 503, 504]
+
+# Tickets are valid for 2 hours. Stop using cached tickets a bit before that,
+# so that they don't expire during a run.
+
+TICKET_CACHE_MAX_AGE = 7200 - 300
+
+
+class TransportAdapter(HTTPAdapter):
+    """HTTP adapter with default timeouts."""
+
+    def send(  # type: ignore[override]
+        self, request: PreparedRequest, **kwargs: Any
+    ) -> Response:
+        """Send request, with default timeouts if none are passed."""
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = get_timeout()
+
+        return super().send(request, **kwargs)
+
+
+def get_timeout() -> Tuple[float, float]:
+    """Get connect and read timeout."""
+    return settings.PROXMOX_CONNECT_TIMEOUT, settings.PROXMOX_READ_TIMEOUT
+
+
+def get_transport_adapter() -> TransportAdapter:
+    """Get HTTP adapter according to transport settings.
+
+    The connection pool keeps a connection per worker, as the session is
+    shared by all workers. Idempotent requests are retried on connection
+    errors and server errors.
+    """
+    return TransportAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.PROXMOX_CONNECTION_POOL_SIZE
+        or settings.PROXMOX_MAX_CONCURRENCY,
+        max_retries=Retry(
+            total=settings.PROXMOX_RETRIES,
+            backoff_factor=settings.PROXMOX_RETRY_BACKOFF_FACTOR,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+        ),
+    )
+
+
+def get_user() -> str:
+    """Get Proxmox user, including realm."""
+    return settings.PROXMOX_USERNAME + "@" + settings.PROXMOX_REALM
+
+
+def read_ticket_cache(path: str, base_url: str) -> Optional[Dict[str, Any]]:
+    """Get cached ticket, if it is valid and the cache file is secure."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    # Don't trust a ticket that others could have written or read
+
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+        return None
+
+    with open(path, "r") as f:
+        try:
+            cache = json.load(f)
+        except ValueError:
+            return None
+
+    # Caches without the expected keys are ignored, like malformed caches
+
+    if (
+        not isinstance(cache, dict)
+        or not isinstance(cache.get("created_at"), (int, float))
+        or not isinstance(cache.get("ticket"), str)
+        or not isinstance(cache.get("csrf_prevention_token"), str)
+    ):
+        return None
+
+    if (
+        cache.get("username") != get_user()
+        or cache.get("base_url") != base_url
+    ):
+        return None
+
+    if time.time() - cache["created_at"] >= TICKET_CACHE_MAX_AGE:
+        return None
+
+    return cache
+
+
+def delete_ticket_cache(path: str) -> None:
+    """Delete cached ticket, if any."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def write_ticket_cache(
+    path: str,
+    base_url: str,
+    ticket: str,
+    csrf_prevention_token: str,
+    created_at: float,
+) -> None:
+    """Cache ticket, readable by the current user only."""
+    write_file_atomically(
+        path,
+        json.dumps(
+            {
+                "username": get_user(),
+                "base_url": base_url,
+                "ticket": ticket,
+                "csrf_prevention_token": csrf_prevention_token,
+                "created_at": created_at,
+            }
+        ),
+        0o600,
+    )
+
+
+class CachedTicketAuth(ProxmoxHTTPAuth):
+    """Ticket authentication, with the ticket cached in a file.
+
+    A valid cached ticket is used instead of logging in. New and renewed
+    tickets are cached.
+
+    When the ticket is rejected (e.g. after a password change), the cache is
+    deleted, and the request is sent again once after logging in.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        verify_ssl: bool,
+        cache_path: str,
+    ) -> None:
+        """Use cached ticket, or log in."""
+        self.base_url = base_url
+        self.username = username
+        self.verify_ssl = verify_ssl
+        self.timeout = get_timeout()
+        self.cache_path = cache_path
+        self.password = password
+        self.pve_auth_ticket = ""
+
+        cache = read_ticket_cache(cache_path, base_url)
+
+        if not cache:
+            self._getNewTokens(password=password)
+
+            return
+
+        self.pve_auth_ticket = cache["ticket"]
+        self.csrf_prevention_token = cache["csrf_prevention_token"]
+
+        # Age is kept with a monotonic clock, which can't be stored
+
+        self.birth_time = time.monotonic() - (
+            time.time() - cache["created_at"]
+        )
+
+    def _getNewTokens(self, password: Optional[str] = None) -> None:
+        """Get ticket, and cache it."""
+        super()._getNewTokens(password=password)
+
+        write_ticket_cache(
+            self.cache_path,
+            self.base_url,
+            self.pve_auth_ticket,
+            self.csrf_prevention_token,
+            time.time(),
+        )
+
+    def __call__(self, r: PreparedRequest) -> PreparedRequest:
+        """Renew ticket if needed, and handle rejected tickets."""
+        r = super().__call__(r)
+        r.register_hook("response", self.handle_401)  # type: ignore[no-untyped-call]
+
+        return r
+
+    def handle_401(self, r: Response, **kwargs: Any) -> Response:
+        """Log in, and send request again, when ticket was rejected."""
+        if r.status_code != 401:
+            return r
+
+        delete_ticket_cache(self.cache_path)
+
+        self._getNewTokens(password=self.password)
+
+        # Release connection of rejected response, before sending again
+
+        r.content
+        r.close()
+
+        request = r.request.copy()
+
+        request.headers.pop("Cookie", None)
+        request.prepare_cookies(self.get_cookies())
+
+        if request.method != "GET":
+            request.headers["CSRFPreventionToken"] = self.csrf_prevention_token
+
+        # The adapter doesn't call hooks, so this is only done once
+
+        response: Response = r.connection.send(  # type: ignore[attr-defined]
+            request, **kwargs
+        )
+        response.history.append(r)
+        response.request = request
+
+        return response
+
+
+def API() -> ProxmoxAPI:
+    """Get Proxmox API connection.
+
+    When an API token is set, it is used instead of logging in. Otherwise,
+    the ticket is cached when a cache path is set.
+    """
+    if settings.PROXMOX_TOKEN_NAME:
+        proxmox_connection = ProxmoxAPI(
+            settings.PROXMOX_HOST,
+            user=get_user(),
+            token_name=settings.PROXMOX_TOKEN_NAME,
+            token_value=settings.PROXMOX_TOKEN_VALUE,
+            verify_ssl=settings.PROXMOX_VERIFY_SSL,
+            timeout=get_timeout(),
+        )
+    elif settings.PROXMOX_TICKET_CACHE_PATH:
+        # Passing token arguments prevents proxmoxer from logging in, which
+        # is left to the authentication set on the session
+
+        proxmox_connection = ProxmoxAPI(
+            settings.PROXMOX_HOST,
+            user=get_user(),
+            token_name="",
+            verify_ssl=settings.PROXMOX_VERIFY_SSL,
+            timeout=get_timeout(),
+        )
+        proxmox_connection._store["session"].auth = CachedTicketAuth(
+            proxmox_connection._store["base_url"],
+            get_user(),
+            settings.PROXMOX_PASSWORD,
+            settings.PROXMOX_VERIFY_SSL,
+            settings.PROXMOX_TICKET_CACHE_PATH,
+        )
+    else:
+        proxmox_connection = ProxmoxAPI(
+            settings.PROXMOX_HOST,
+            user=get_user(),
+            password=settings.PROXMOX_PASSWORD,
+            verify_ssl=settings.PROXMOX_VERIFY_SSL,
+            timeout=get_timeout(),
+        )
+
+    session = proxmox_connection._store["session"]
+
+    session.mount("https://", get_transport_adapter())
+    session.hooks["response"].append(profiler.record_request)
+    session.hooks["response"].append(metrics.record_request)
+
+    if not settings.PROXMOX_KEEP_ALIVE:
+        session.headers["Connection"] = "close"
+
+    return proxmox_connection
+
+
+class ClusterSnapshot:
+    """Pools and their members, fetched from the Proxmox API once.
+
+    By default, pools are fetched by concurrent workers. If
+    PROXMOX_USE_CLUSTER_RESOURCES is enabled, members are taken from
+    '/cluster/resources' instead, so the amount of API calls does not depend
+    on the amount of pools. That requires 'VM.Audit', as Proxmox leaves out
+    members that the user can't audit, without an error.
+
+    Only running virtual machines and containers are kept, as only they are
+    spread (templates are never running). '/cluster/resources' is filtered
+    by type by Proxmox; filtering by status is left to 'add_members', as
+    Proxmox can't.
+
+    If no connection is passed, the snapshot is empty. Fill it with
+    'add_pools' and 'add_members' (used by the asynchronous client).
+    """
+
+    def __init__(
+        self, proxmox_connection: Optional[ProxmoxAPI] = None
+    ) -> None:
+        """Fetch pools and members."""
+        self.pools_names: List[str] = []
+        self.members: Dict[str, List[Dict[str, Any]]] = {}
+
+        if proxmox_connection is None:
+            return
+
+        with profiler.phase("pool listing"):
+            self.add_pools(proxmox_connection.pools.get())
+
+        with profiler.phase("member fetch"):
+            if settings.PROXMOX_USE_CLUSTER_RESOURCES:
+                self.add_members(
+                    proxmox_connection.cluster.resources.get(type="vm")
+                )
+            else:
+                self._fetch_members_from_pools(proxmox_connection)
+
+    def _fetch_members_from_pools(
+        self, proxmox_connection: ProxmoxAPI
+    ) -> None:
+        """Fetch members with one call per pool, spread over workers."""
+        with ThreadPoolExecutor(
+            max_workers=settings.PROXMOX_MAX_CONCURRENCY
+        ) as executor:
+            pools = executor.map(
+                lambda pool_name: proxmox_connection.pools(pool_name).get(),
+                self.pools_names,
+            )
+
+            # Results are in the same order as pools names
+
+            for pool_name, pool in zip(self.pools_names, pools):
+                self.add_members(pool["members"], pool_name=pool_name)
+
+    def add_pools(self, pools: List[Dict[str, Any]]) -> None:
+        """Add pools from '/pools'."""
+        for pool in pools:
+            self.pools_names.append(pool["poolid"])
+            self.members[pool["poolid"]] = []
+
+    def add_members(
+        self,
+        members: List[Dict[str, Any]],
+        *,
+        pool_name: Optional[str] = None,
+    ) -> None:
+        """Add members from '/cluster/resources', or from '/pools/{poolid}' when pool name is passed."""
+        for member in members:
+            # Pools may contain storages as well
+
+            if member["type"] not in MEMBERS_TYPES:
+                continue
+
+            if member["status"] not in MEMBERS_STATUSES:
+                continue
+
+            # Resources that are not in a pool have no 'pool' key
+
+            member_pool_name = pool_name or member.get("pool")
+
+            if member_pool_name not in self.members:
+                continue
+
+            self.members[member_pool_name].append(member)
+
+    def get_members(self, pool_name: str) -> List[Dict[str, Any]]:
+        """Get members of pool."""
+        return self.members[pool_name]
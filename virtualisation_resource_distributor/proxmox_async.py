@@ -0,0 +1,259 @@
+"""Asynchronous Proxmox API helpers, used by the daemon when DAEMON_ASYNC is enabled.
+
+Requires the 'async' extra.
+"""
+
+import asyncio
+import time
+from types import TracebackType
+from typing import Any, Dict, List, Optional, Type
+
+import httpx
+
+from virtualisation_resource_distributor.config import settings
+from virtualisation_resource_distributor.metrics import metrics
+from virtualisation_resource_distributor.profiling import profiler
+from virtualisation_resource_distributor.proxmox import (
+    RETRY_STATUSES,
+    ClusterSnapshot,
+    delete_ticket_cache,
+    get_timeout,
+    get_user,
+    read_ticket_cache,
+    write_ticket_cache,
+)
+
+# Tickets are valid for 2 hours, renew them well before that
+
+TICKET_RENEW_AGE = 3600
+
+
+def get_base_url() -> str:
+    """Get base URL from Proxmox host, like the synchronous client."""
+    host = settings.PROXMOX_HOST
+
+    if ":" not in host:
+        host += ":8006"
+
+    return f"https://{host}/api2/json"
+
+
+class AsyncAPI:
+    """Asynchronous Proxmox API connection.
+
+    Authenticates like 'proxmox.API': with the API token when it is set,
+    otherwise with a ticket, which is cached when a cache path is set. When
+    the ticket is rejected, the cache is deleted, and the request is sent
+    again once after logging in.
+
+    Use as an asynchronous context manager, within a running event loop.
+    Requests are limited to PROXMOX_MAX_CONCURRENCY in flight, over a single
+    connection pool. Requests are retried on connection errors and server
+    errors, and recorded by the profiler and metrics.
+    """
+
+    def __init__(self, base_url: Optional[str] = None) -> None:
+        """Set attributes."""
+        self.base_url = base_url or get_base_url()
+
+        pool_size = (
+            settings.PROXMOX_CONNECTION_POOL_SIZE
+            or settings.PROXMOX_MAX_CONCURRENCY
+        )
+        connect_timeout, read_timeout = get_timeout()
+
+        # httpx only retries on connection errors, server errors are retried
+        # by 'get'
+
+        self._client = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                verify=settings.PROXMOX_VERIFY_SSL,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=(
+                        pool_size if settings.PROXMOX_KEEP_ALIVE else 0
+                    ),
+                ),
+                retries=settings.PROXMOX_RETRIES,
+            ),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        )
+        self._semaphore = asyncio.Semaphore(settings.PROXMOX_MAX_CONCURRENCY)
+        self._login_lock = asyncio.Lock()
+        self._ticket: Optional[str] = None
+        self._ticket_time: Optional[float] = None
+
+        if settings.PROXMOX_TOKEN_NAME:
+            self._client.headers["Authorization"] = (
+                f"PVEAPIToken={get_user()}!{settings.PROXMOX_TOKEN_NAME}"
+                f"={settings.PROXMOX_TOKEN_VALUE}"
+            )
+
+    async def __aenter__(self) -> "AsyncAPI":
+        """Log in."""
+        await self.login()
+
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close connections."""
+        await self._client.aclose()
+
+    def set_ticket(self, ticket: str, ticket_time: float) -> None:
+        """Use ticket for requests."""
+        self._client.cookies.set("PVEAuthCookie", ticket)
+
+        self._ticket = ticket
+        self._ticket_time = ticket_time
+
+    async def login(self) -> None:
+        """Get ticket (from the cache, if any), or renew it when there is one."""
+        if settings.PROXMOX_TOKEN_NAME:
+            return
+
+        if self._ticket is None and settings.PROXMOX_TICKET_CACHE_PATH:
+            cache = read_ticket_cache(
+                settings.PROXMOX_TICKET_CACHE_PATH, self.base_url
+            )
+
+            if cache:
+                # Age is kept with a monotonic clock, which can't be stored
+
+                self.set_ticket(
+                    cache["ticket"],
+                    time.monotonic() - (time.time() - cache["created_at"]),
+                )
+
+                return
+
+        response = await self._client.post(
+            f"{self.base_url}/access/ticket",
+            data={
+                "username": get_user(),
+                "password": self._ticket or settings.PROXMOX_PASSWORD,
+            },
+        )
+        response.raise_for_status()
+
+        data = response.json()["data"]
+
+        self.set_ticket(data["ticket"], time.monotonic())
+
+        if settings.PROXMOX_TICKET_CACHE_PATH:
+            write_ticket_cache(
+                settings.PROXMOX_TICKET_CACHE_PATH,
+                self.base_url,
+                data["ticket"],
+                data["CSRFPreventionToken"],
+                time.time(),
+            )
+
+    def get_ticket_is_expired(self) -> bool:
+        """Check if there is no ticket, or if it must be renewed."""
+        return (
+            self._ticket_time is None
+            or time.monotonic() - self._ticket_time >= TICKET_RENEW_AGE
+        )
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        """Get path, retried on server errors like the synchronous client."""
+        for retry in range(settings.PROXMOX_RETRIES + 1):
+            # The first retry is immediate
+
+            if retry > 1:
+                await asyncio.sleep(
+                    settings.PROXMOX_RETRY_BACKOFF_FACTOR * 2 ** (retry - 1)
+                )
+
+            async with self._semaphore:
+                response = await self._client.get(
+                    f"{self.base_url}/{path}", params=params
+                )
+
+            profiler.record_request(response)
+            metrics.record_request(response)
+
+            if response.status_code not in RETRY_STATUSES:
+                break
+
+        return response
+
+    async def get(self, path: str, **params: Any) -> Any:
+        """Get path, and return its data.
+
+        When the ticket must be renewed, or was rejected, requests in flight
+        wait for one login, instead of all logging in.
+        """
+        if not settings.PROXMOX_TOKEN_NAME and self.get_ticket_is_expired():
+            async with self._login_lock:
+                if self.get_ticket_is_expired():
+                    await self.login()
+
+        ticket = self._ticket
+
+        response = await self._get(path, params)
+
+        if response.status_code == 401 and not settings.PROXMOX_TOKEN_NAME:
+            async with self._login_lock:
+                if self._ticket == ticket:
+                    if settings.PROXMOX_TICKET_CACHE_PATH:
+                        delete_ticket_cache(settings.PROXMOX_TICKET_CACHE_PATH)
+
+                    self._ticket = None
+
+                    await self.login()
+
+            response = await self._get(path, params)
+
+        response.raise_for_status()
+
+        return response.json()["data"]
+
+    async def get_pools(self) -> List[Dict[str, Any]]:
+        """Get pools."""
+        return await self.get("pools")
+
+    async def get_pool(self, name: str) -> Dict[str, Any]:
+        """Get pool with members."""
+        return await self.get(f"pools/{name}")
+
+    async def get_cluster_resources(self) -> List[Dict[str, Any]]:
+        """Get virtual machines and containers."""
+        return await self.get("cluster/resources", type="vm")
+
+
+async def get_cluster_snapshot(api: AsyncAPI) -> ClusterSnapshot:
+    """Get snapshot, like 'ClusterSnapshot' does with the synchronous client."""
+    cluster_snapshot = ClusterSnapshot()
+
+    with profiler.phase("pool listing"):
+        cluster_snapshot.add_pools(await api.get_pools())
+
+    with profiler.phase("member fetch"):
+        if settings.PROXMOX_USE_CLUSTER_RESOURCES:
+            cluster_snapshot.add_members(await api.get_cluster_resources())
+        else:
+            pools = await asyncio.gather(
+                *(
+                    api.get_pool(pool_name)
+                    for pool_name in cluster_snapshot.pools_names
+                )
+            )
+
+            for pool_name, pool in zip(cluster_snapshot.pools_names, pools):
+                cluster_snapshot.add_members(
+                    pool["members"], pool_name=pool_name
+                )
+
+    return cluster_snapshot
+
+
+async def fetch_cluster_snapshot() -> ClusterSnapshot:
+    """Log in, and get snapshot. Used by the daemon."""
+    async with AsyncAPI() as api:
+        return await get_cluster_snapshot(api)
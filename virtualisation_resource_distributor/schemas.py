@@ -2,8 +2,9 @@
 
 from datetime import datetime
 from enum import Enum
+from typing import Dict, List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 
 
 class ProxmoxMemberStatusEnum(Enum):
@@ -18,6 +19,17 @@ class ProxmoxMemberStatusEnum(Enum):
     PAUSED = "paused"
 
 
+class ProxmoxMemberWeightEnum(Enum):
+    """Sizes of members that spreads can be weighted by.
+
+    Maximum memory and disk are in bytes, maximum CPU is in cores.
+    """
+
+    MAXMEM = "maxmem"
+    MAXCPU = "maxcpu"
+    MAXDISK = "maxdisk"
+
+
 # Database
 
 
@@ -63,6 +75,69 @@ class DatabaseNodeCreate(BaseModel):
     zone_id: int
 
 
+class DatabaseZoneWithNodes(DatabaseZone):
+    """Shared properties, and nodes in zone."""
+
+    nodes: List[DatabaseNode]
+
+
+class DatabaseNodeWithZone(DatabaseNode):
+    """Shared properties, and zone of node."""
+
+    zone: DatabaseZone
+
+
+class DatabaseTopology(BaseModel):
+    """Shared properties."""
+
+    zones: List[DatabaseZone]
+    nodes_zones: Dict[str, DatabaseZone]
+
+
+class DatabaseTopologyDefinitionZone(BaseModel):
+    """Shared properties."""
+
+    name: str
+    nodes_names: List[str] = []
+
+
+class DatabaseTopologyDefinition(BaseModel):
+    """Shared properties.
+
+    Every node must be in one zone.
+    """
+
+    zones: List[DatabaseTopologyDefinitionZone]
+
+    @validator("zones")
+    def names_must_be_unique(
+        cls, v: List[DatabaseTopologyDefinitionZone]
+    ) -> List[DatabaseTopologyDefinitionZone]:
+        """Check that zones names and nodes names are unique."""
+        zones_names = [zone.name for zone in v]
+        nodes_names = [
+            node_name for zone in v for node_name in zone.nodes_names
+        ]
+
+        if len(set(zones_names)) != len(zones_names):
+            raise ValueError("zones names must be unique")
+
+        if len(set(nodes_names)) != len(nodes_names):
+            raise ValueError("nodes names must be unique")
+
+        return v
+
+
+class DatabaseTopologyChanges(BaseModel):
+    """Shared properties."""
+
+    created_zones_names: List[str] = []
+    deleted_zones_names: List[str] = []
+    created_nodes_names: List[str] = []
+    updated_nodes_names: List[str] = []
+    deleted_nodes_names: List[str] = []
+
+
 # Proxmox
 
 
@@ -74,9 +149,64 @@ class ProxmoxMember(BaseModel):
     vm_id: int
     pool_name: str
     status: ProxmoxMemberStatusEnum
+    maxmem: int
+    maxcpu: float
+    maxdisk: int
 
 
 class ProxmoxPool(BaseModel):
     """Shared properties."""
 
     name: str
+
+
+class ProxmoxNode(BaseModel):
+    """Shared properties."""
+
+    name: str
+
+
+class ProxmoxPoolSpread(BaseModel):
+    """Shared properties.
+
+    Only running members are counted, as other members are not kept in the
+    cluster snapshot. Members on nodes that are not in the database are only
+    included in unknown nodes names.
+    """
+
+    name: str
+    members_count: int
+    zones_members_counts: Dict[str, int]
+    nodes_members_counts: Dict[str, int]
+    unused_zones_count: int
+    unused_nodes_count: int
+    unknown_nodes_names: List[str] = []
+    has_members_to_migrate: bool
+    has_members_to_migrate_between_nodes: bool
+
+
+class ProxmoxPoolWeightedSpread(ProxmoxPoolSpread):
+    """Shared properties.
+
+    Members are weighted by their size (see 'ProxmoxMemberWeightEnum').
+    Pools have members to migrate when a member can be moved to the lightest
+    zone (or node), while that zone stays lighter than the zone of the
+    member was. Such a move makes the weights of zones more even.
+    """
+
+    weight: str
+    members_weight: float
+    zones_members_weights: Dict[str, float]
+    nodes_members_weights: Dict[str, float]
+
+
+class ProxmoxMigration(BaseModel):
+    """Shared properties."""
+
+    vm_id: int
+    name: str
+    pool_name: str
+    source_node_name: str
+    source_zone_name: str
+    destination_node_name: str
+    destination_zone_name: str
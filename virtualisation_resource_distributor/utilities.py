@@ -0,0 +1,15 @@
+"""Generic utilities."""
+
+import os
+import tempfile
+
+
+def write_file_atomically(path: str, contents: str, mode: int) -> None:
+    """Write file, so that readers never see it partially written."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+
+    with os.fdopen(fd, "w") as f:
+        f.write(contents)
+
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)